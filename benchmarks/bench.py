@@ -0,0 +1,260 @@
+# -*- coding: utf-8 -*-
+#
+#   mete0r.olefilefs : PyFilesystem interface to olefile
+#   Copyright (C) 2015 mete0r <mete0r@sarangbang.or.kr>
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU Lesser General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU Lesser General Public License for more details.
+#
+#   You should have received a copy of the GNU Lesser General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+''' Benchmark OleFileFS over a synthetic corpus.
+
+Generates containers with many entries, deep storages and large
+(fragmented) streams, in both 512-byte and 4096-byte sector versions,
+then times the common operations on each of them and records the peak
+memory they allocate. Results are written as JSON, and can be compared
+against the results of a previous run, from the top of a checkout::
+
+    export PYTHONPATH=.
+    python benchmarks/bench.py --output before.json
+    python benchmarks/bench.py --output after.json --compare before.json
+'''
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import unicode_literals
+import argparse
+import json
+import os
+import os.path
+import platform
+import random
+import sys
+import tempfile
+import time
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+from mete0r_olefilefs import __version__
+from mete0r_olefilefs.fs import OleFileFS
+from mete0r_olefilefs.tests.corpus import deep_tree
+from mete0r_olefilefs.tests.corpus import large_stream_tree
+from mete0r_olefilefs.tests.corpus import many_entries_tree
+from mete0r_olefilefs.tests.corpus import write_container
+
+
+MEGABYTE = 1024 * 1024
+CHUNK_SIZE = 64 * 1024
+HEAD_STREAMS = 1000
+
+
+def make_cases(scale):
+    ''' (name, tree factory, version, fragment) of the corpus.
+    '''
+    entries = max(1, int(200 * scale))
+    size = max(1, int(64 * scale)) * MEGABYTE
+    return [
+        ('many-entries-v3',
+         lambda rng: many_entries_tree(rng, storages=entries), 3, False),
+        ('many-entries-v4',
+         lambda rng: many_entries_tree(rng, storages=entries), 4, False),
+        ('deep-v3', lambda rng: deep_tree(rng, depth=60), 3, False),
+        ('large-contiguous-v3',
+         lambda rng: large_stream_tree(rng, size=size), 3, False),
+        ('large-fragmented-v3',
+         lambda rng: large_stream_tree(rng, size=size), 3, True),
+        ('large-fragmented-v4',
+         lambda rng: large_stream_tree(rng, size=size), 4, True),
+    ]
+
+
+def generate(directory, scale):
+    ''' Write the corpus into `directory`, reusing containers already
+    there. Returns [(case name, path)].
+    '''
+    corpus = []
+    for name, make_tree, version, fragment in make_cases(scale):
+        path = os.path.join(directory, '%s-x%s.cfb' % (name, scale))
+        if not os.path.exists(path):
+            tree = make_tree(random.Random(name))
+            with open(path + '.tmp', 'wb') as f:
+                write_container(f, tree, version=version, fragment=fragment)
+            os.rename(path + '.tmp', path)
+        corpus.append((name, path))
+    return corpus
+
+
+#
+# Operations: each takes an open OleFileFS
+#
+
+def op_listdir(fs):
+    fs.listdir('/')
+
+
+def op_walk(fs):
+    for current_path, files in fs.walk():
+        pass
+
+
+def op_getinfo(fs):
+    for path in fs.walkfiles():
+        fs.getinfo(path)
+
+
+def op_open_head(fs):
+    for index, path in enumerate(fs.walkfiles()):
+        if index == HEAD_STREAMS:
+            break
+        with fs.open(path) as f:
+            f.read(8)
+
+
+def op_open_read(fs):
+    for path in fs.walkfiles():
+        with fs.open(path) as f:
+            while f.read(CHUNK_SIZE):
+                pass
+
+
+OPERATIONS = [
+    ('listdir', op_listdir),
+    ('walk', op_walk),
+    ('getinfo', op_getinfo),
+    ('open_head', op_open_head),
+    ('open_read', op_open_read),
+]
+
+
+def measure(path, operation, repeat, options):
+    ''' Best wall time of `operation` on a freshly opened filesystem, and
+    the peak memory allocated by one run of it.
+
+    `operation` None measures opening the filesystem itself.
+    '''
+    def run():
+        started = time.time()
+        fs = OleFileFS(path, **options)
+        try:
+            if operation is None:
+                return time.time() - started
+            started = time.time()
+            operation(fs)
+            return time.time() - started
+        finally:
+            fs.close()
+
+    peak = None
+    if tracemalloc is not None:
+        tracemalloc.start()
+        try:
+            run()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    seconds = min(run() for _ in range(repeat))
+    return seconds, peak
+
+
+def benchmark(corpus, repeat, options):
+    results = []
+    for case, path in corpus:
+        for metric, operation in [('open', None)] + OPERATIONS:
+            seconds, peak = measure(path, operation, repeat, options)
+            results.append({
+                'case': case,
+                'metric': metric,
+                'seconds': seconds,
+                'peak_bytes': peak,
+            })
+            print('%-22s %-10s %10.4f s %12s B' % (
+                case, metric, seconds, peak), file=sys.stderr)
+    return results
+
+
+def compare(results, baseline):
+    ''' Print the time and memory ratios of results over a baseline.
+    '''
+    previous = dict(((result['case'], result['metric']), result)
+                    for result in baseline['results'])
+    print('%-22s %-10s %8s %8s' % ('case', 'metric', 'time', 'memory'))
+    for result in results:
+        before = previous.get((result['case'], result['metric']))
+        if before is None:
+            continue
+        print('%-22s %-10s %7.2fx %8s' % (
+            result['case'], result['metric'],
+            result['seconds'] / max(before['seconds'], 1e-9),
+            ratio(result['peak_bytes'], before['peak_bytes'])))
+
+
+def ratio(value, before):
+    if value is None or not before:
+        return '-'
+    return '%.2fx' % (float(value) / before)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--corpus', default=os.path.join(
+        tempfile.gettempdir(), 'mete0r.olefilefs-corpus'),
+        help='directory of the generated corpus (default: %(default)s)')
+    parser.add_argument('--scale', type=float, default=1.0,
+                        help='scale the number of entries and the size of '
+                        'large streams (default: 1.0)')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='runs of each measurement; the best one is '
+                        'kept (default: 3)')
+    parser.add_argument('--use-mmap', action='store_true',
+                        help='open containers with use_mmap=True')
+    parser.add_argument('--lazy', action='store_true',
+                        help='open containers with lazy=True')
+    parser.add_argument('--output', help='write JSON results to this file '
+                        'instead of stdout')
+    parser.add_argument('--compare', metavar='BASELINE',
+                        help='compare against the JSON results of a '
+                        'previous run')
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.corpus):
+        os.makedirs(args.corpus)
+    corpus = generate(args.corpus, args.scale)
+    options = {}
+    if args.use_mmap:
+        options['use_mmap'] = True
+    if args.lazy:
+        options['lazy'] = True
+    results = benchmark(corpus, args.repeat, options)
+    report = {
+        'package': 'mete0r.olefilefs',
+        'version': __version__,
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'scale': args.scale,
+        'options': options,
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+    else:
+        json.dump(report, sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write('\n')
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+#
+#   mete0r.olefilefs : PyFilesystem interface to olefile
+#   Copyright (C) 2015 mete0r <mete0r@sarangbang.or.kr>
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU Lesser General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU Lesser General Public License for more details.
+#
+#   You should have received a copy of the GNU Lesser General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+''' asyncio front-end of OleFileFS (Python 3.4+).
+
+Every call runs in an executor, so that parsing a container and reading
+its streams never blocks the event loop, and at most `max_concurrency`
+calls per container run at once::
+
+    afs = await open_fs('document.doc')
+    async with afs:
+        for name in await afs.listdir('/'):
+            ...
+        async with await afs.open('WordDocument') as f:
+            header = await f.read(32)
+
+Calls return futures (``yield from`` them on Python 3.4). They are chained
+with callbacks rather than written as coroutines, so that this module
+still compiles where the package is installed on Python 2.
+'''
+from __future__ import absolute_import
+from __future__ import unicode_literals
+import asyncio
+import functools
+
+from .fs import OleFileFS
+
+
+DEFAULT_MAX_CONCURRENCY = 8
+
+
+def open_fs(path, executor=None, max_concurrency=DEFAULT_MAX_CONCURRENCY,
+            **kwargs):
+    ''' Open an OLE container in `executor` (the loop's default executor
+    if None); return a future of an `AsyncOleFileFS` of it.
+
+    Keyword arguments are those of `OleFileFS`; `thread_safe` defaults to
+    True, so that calls on the container may run concurrently.
+    '''
+    kwargs.setdefault('thread_safe', True)
+    loop = asyncio.get_event_loop()
+    opened = loop.run_in_executor(executor,
+                                  functools.partial(OleFileFS, path,
+                                                    **kwargs))
+    return then(opened, lambda fs: AsyncOleFileFS(
+        fs, executor=executor, max_concurrency=max_concurrency))
+
+
+class AsyncOleFileFS(object):
+    ''' Methods returning futures over an `OleFileFS`.
+
+    Calls run in `executor`, at most `max_concurrency` at once; only one
+    at once if `fs` is not thread-safe.
+    '''
+
+    def __init__(self, fs, executor=None,
+                 max_concurrency=DEFAULT_MAX_CONCURRENCY):
+        if not fs.getmeta('thread_safe'):
+            max_concurrency = 1
+        self.fs = fs
+        self.executor = executor
+        self.max_concurrency = max_concurrency
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    def __aenter__(self):
+        return resolved(self)
+
+    def __aexit__(self, exc_type, exc_value, traceback):
+        return self.close()
+
+    def run(self, func, *args, **kwargs):
+        ''' Run func(*args, **kwargs) in the executor, within the
+        concurrency limit of this container.
+        '''
+        call = functools.partial(func, *args, **kwargs)
+        semaphore = self._semaphore
+
+        def acquired(_):
+            loop = asyncio.get_event_loop()
+            try:
+                done = loop.run_in_executor(self.executor, call)
+            except Exception:
+                semaphore.release()
+                raise
+            done.add_done_callback(lambda _: semaphore.release())
+            return done
+        return then(semaphore.acquire(), acquired)
+
+    def open(self, path, mode='r', buffering=-1):
+        return then(self.run(self.fs.open, path, mode, buffering),
+                    lambda stream: AsyncOleStream(self, stream))
+
+    def getcontents(self, path, mode='rb'):
+        return self.run(self.fs.getcontents, path, mode)
+
+    def exists(self, path):
+        return self.run(self.fs.exists, path)
+
+    def isdir(self, path):
+        return self.run(self.fs.isdir, path)
+
+    def isfile(self, path):
+        return self.run(self.fs.isfile, path)
+
+    def listdir(self, path='./', **kwargs):
+        return self.run(self.fs.listdir, path, **kwargs)
+
+    def listdirinfo(self, path='./', **kwargs):
+        return self.run(self.fs.listdirinfo, path, **kwargs)
+
+    def getinfo(self, path):
+        return self.run(self.fs.getinfo, path)
+
+    def getextents(self, path):
+        return self.run(self.fs.getextents, path)
+
+    def walk(self, path='/', **kwargs):
+        ''' List of the (path, files) pairs of `OleFileFS.walk()`.
+        '''
+        return self.run(lambda: list(self.fs.walk(path, **kwargs)))
+
+    def walkfiles(self, path='/', **kwargs):
+        return self.run(lambda: list(self.fs.walkfiles(path, **kwargs)))
+
+    def close(self):
+        return self.run(self.fs.close)
+
+
+class AsyncOleStream(object):
+    ''' Reads returning futures, of a stream opened by
+    `AsyncOleFileFS.open()`.
+    '''
+
+    def __init__(self, afs, stream):
+        self.afs = afs
+        self.stream = stream
+
+    def __aenter__(self):
+        return resolved(self)
+
+    def __aexit__(self, exc_type, exc_value, traceback):
+        return self.close()
+
+    @property
+    def closed(self):
+        return self.stream.closed
+
+    def tell(self):
+        return self.stream.tell()
+
+    def seek(self, offset, whence=0):
+        return self.stream.seek(offset, whence)
+
+    def read(self, size=-1):
+        return self.afs.run(self.stream.read, size)
+
+    def readinto(self, buffer):
+        return self.afs.run(self.stream.readinto, buffer)
+
+    def close(self):
+        self.stream.close()
+        return resolved(None)
+
+
+def new_future():
+    loop = asyncio.get_event_loop()
+    create_future = getattr(loop, 'create_future', None)
+    if create_future is None:
+        # before Python 3.5.2
+        return asyncio.Future(loop=loop)
+    return create_future()
+
+
+def resolved(result):
+    ''' A future already done with `result`.
+    '''
+    future = new_future()
+    future.set_result(result)
+    return future
+
+
+def then(awaitable, callback):
+    ''' A future of callback(result of `awaitable`), or of the result of
+    the future `callback` returns.
+    '''
+    chained = new_future()
+
+    def done(future):
+        if chained.cancelled():
+            return
+        if future.cancelled():
+            chained.cancel()
+            return
+        try:
+            result = callback(future.result())
+        except Exception as e:
+            chained.set_exception(e)
+            return
+        if isinstance(result, asyncio.Future):
+            result.add_done_callback(functools.partial(copy_result,
+                                                       chained))
+        else:
+            chained.set_result(result)
+    asyncio.ensure_future(awaitable).add_done_callback(done)
+    return chained
+
+
+def copy_result(chained, future):
+    if chained.cancelled():
+        return
+    if future.cancelled():
+        chained.cancel()
+    elif future.exception() is not None:
+        chained.set_exception(future.exception())
+    else:
+        chained.set_result(future.result())
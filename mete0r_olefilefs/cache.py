@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+#
+#   mete0r.olefilefs : PyFilesystem interface to olefile
+#   Copyright (C) 2015 mete0r <mete0r@sarangbang.or.kr>
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU Lesser General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU Lesser General Public License for more details.
+#
+#   You should have received a copy of the GNU Lesser General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+from __future__ import absolute_import
+from __future__ import unicode_literals
+from collections import OrderedDict
+import threading
+import time
+
+
+class LRUCache(object):
+    ''' A bounded mapping which evicts its least recently used items.
+
+    Items weigh 1 each, unless `weigh` is given, a function from a value
+    to its weight (e.g. `len` to bound the cache in bytes). `on_remove`,
+    if given, is called with (key, value) of every item which leaves the
+    cache.
+
+    Not synchronized: callers sharing a cache across threads hold their
+    own lock around it.
+    '''
+
+    def __init__(self, capacity, weigh=None, on_remove=None):
+        self.capacity = capacity
+        self.weight = 0
+        self._weigh = weigh
+        self._on_remove = on_remove
+        self._items = OrderedDict()
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def get(self, key, default=None):
+        try:
+            value = self._items.pop(key)
+        except KeyError:
+            return default
+        self._items[key] = value
+        return value
+
+    def put(self, key, value):
+        self.pop(key)
+        weight = self._weight(value)
+        if weight > self.capacity:
+            return
+        self._items[key] = value
+        self.weight += weight
+        while self.weight > self.capacity:
+            self.popitem()
+
+    def pop(self, key, default=None):
+        try:
+            value = self._items.pop(key)
+        except KeyError:
+            return default
+        self.weight -= self._weight(value)
+        if self._on_remove is not None:
+            self._on_remove(key, value)
+        return value
+
+    def popitem(self):
+        ''' Evict and return the least recently used (key, value).
+        '''
+        key, value = self._items.popitem(last=False)
+        self.weight -= self._weight(value)
+        if self._on_remove is not None:
+            self._on_remove(key, value)
+        return key, value
+
+    def clear(self):
+        if self._on_remove is not None:
+            while self._items:
+                self.popitem()
+        self._items.clear()
+        self.weight = 0
+
+    def _weight(self, value):
+        if self._weigh is None:
+            return 1
+        return self._weigh(value)
+
+
+class MemoryBudget(object):
+    ''' Bytes of memory which buffers and caches may hold, by category.
+
+    Caches give memory back through the evictors they register; a
+    reservation evicts from them before it waits (up to a timeout) for
+    memory to be released. Without a `limit`, only usage is tracked.
+
+    One budget may be shared by many filesystems.
+    '''
+
+    def __init__(self, limit=None):
+        self.limit = limit
+        self.used = 0
+        self._usage = {}
+        self._evictors = []
+        self._condition = threading.Condition()
+
+    def usage(self):
+        ''' Bytes in use, by category.
+        '''
+        with self._condition:
+            return dict(self._usage)
+
+    def add_evictor(self, evict):
+        ''' Register `evict()`, which frees some memory by releasing it,
+        and returns False when it has nothing left to free.
+        '''
+        with self._condition:
+            self._evictors.append(evict)
+
+    def remove_evictor(self, evict):
+        with self._condition:
+            self._evictors.remove(evict)
+
+    def reserve(self, category, size, timeout=0):
+        ''' Reserve `size` bytes, evicting and then waiting up to `timeout`
+        seconds (None: forever) as needed.
+
+        :returns: whether the bytes have been reserved.
+        '''
+        if self.limit is not None and size > self.limit:
+            return False
+        deadline = None
+        if timeout is not None:
+            deadline = time.time() + timeout
+        while True:
+            with self._condition:
+                if self._fits(size):
+                    self._add(category, size)
+                    return True
+            # evictors take their own locks: call them without ours
+            if self._evict():
+                continue
+            with self._condition:
+                if self._fits(size):
+                    continue
+                if deadline is None:
+                    self._condition.wait()
+                    continue
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+
+    def charge(self, category, size):
+        ''' Account for `size` bytes which can not be refused, evicting
+        caches to make up for them.
+        '''
+        with self._condition:
+            self._add(category, size)
+        while not self._fits(0) and self._evict():
+            pass
+
+    def release(self, category, size):
+        with self._condition:
+            self._add(category, -size)
+            self._condition.notify_all()
+
+    def _fits(self, size):
+        return self.limit is None or self.used + size <= self.limit
+
+    def _add(self, category, size):
+        self.used += size
+        self._usage[category] = self._usage.get(category, 0) + size
+
+    def _evict(self):
+        with self._condition:
+            evictors = list(self._evictors)
+        for evict in evictors:
+            if evict():
+                return True
+        return False
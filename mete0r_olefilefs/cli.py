@@ -18,7 +18,582 @@
 #
 from __future__ import absolute_import
 from __future__ import unicode_literals
+from multiprocessing import Pool
+import argparse
+import binascii
+import fnmatch
+import glob
+import json
+import logging
+import os
+import os.path
+import shutil
+import sys
+import time
 
+from .export import FORMATS
+from .export import export_container
+from .export import safe_filename
+from .fs import OleFileFS
+from .hashing import DEFAULT_ALGORITHMS
+from .hashing import DEFAULT_CHUNK_SIZE
+from .hashing import DigestCache
+from .opener import ContainerPool
+from .propset import PROPERTY_SET_STREAMS
+from .propset import property_set_json
+from .search import Matcher
+from .server import ContainerServer
 
-def main():
-    pass
+
+logger = logging.getLogger(__name__)
+
+
+def main(argv=None):
+    parser = make_parser()
+    args = parser.parse_args(argv)
+    if getattr(args, 'func', None) is None:
+        parser.print_help()
+        return 2
+    logging.basicConfig(format=parser.prog + ': %(message)s')
+    return args.func(args)
+
+
+def make_parser():
+    parser = argparse.ArgumentParser(
+        prog='olefilefs',
+        description='Work with OLE containers through mete0r.olefilefs')
+    subparsers = parser.add_subparsers(title='commands')
+
+    extract = subparsers.add_parser(
+        'extract', help='extract streams of OLE containers',
+        description='Extract streams of many OLE containers into a '
+        'directory tree: OUTPUT/<container>/<storage>/.../<stream>')
+    add_containers_arguments(extract)
+    extract.add_argument('-o', '--output', default='.',
+                         help='output directory (default: .)')
+    extract.add_argument('-p', '--pattern', action='append',
+                         dest='patterns', metavar='PATTERN',
+                         help='extract only streams whose path (e.g. '
+                         '/ObjectPool/*) matches this wildcard; may be '
+                         'repeated')
+    extract.set_defaults(func=extract_command)
+
+    hash_parser = subparsers.add_parser(
+        'hash', help='digest streams of OLE containers',
+        description='Print digests of the streams of many OLE containers, '
+        'one line per stream: <digest>... <container>/<stream path>')
+    add_containers_arguments(hash_parser)
+    hash_parser.add_argument('-a', '--algorithm', action='append',
+                             dest='algorithms', metavar='ALGORITHM',
+                             help='hashlib algorithm; may be repeated '
+                             '(default: %s)' % ', '.join(DEFAULT_ALGORITHMS))
+    hash_parser.add_argument('-p', '--pattern', action='append',
+                             dest='patterns', metavar='PATTERN',
+                             help='digest only streams whose path matches '
+                             'this wildcard; may be repeated')
+    hash_parser.add_argument('--cache', metavar='FILE',
+                             help='JSON file of digests computed before, '
+                             'reused for streams of unchanged containers '
+                             'and updated with new ones')
+    hash_parser.set_defaults(func=hash_command)
+
+    grep = subparsers.add_parser(
+        'grep', help='search streams of OLE containers for byte strings',
+        description='Search every stream of many OLE containers for any of '
+        'the given strings at once, printing one line per occurrence: '
+        '<container>/<stream path>:<offset>:<string>')
+    add_containers_arguments(grep)
+    grep.add_argument('-e', '--string', action='append', dest='strings',
+                      default=[], metavar='STRING',
+                      help='text to search for, in each --encoding; may be '
+                      'repeated')
+    grep.add_argument('-x', '--hex', action='append', dest='hex_strings',
+                      default=[], metavar='HEX', type=hex_bytes,
+                      help='bytes to search for, in hexadecimal; may be '
+                      'repeated')
+    grep.add_argument('--encoding', action='append', dest='encodings',
+                      metavar='ENCODING',
+                      help='encoding of the text strings; may be repeated, '
+                      'e.g. utf-8 and utf-16-le (default: utf-8)')
+    grep.add_argument('-p', '--pattern', action='append', dest='patterns',
+                      metavar='PATTERN',
+                      help='search only streams whose path matches this '
+                      'wildcard; may be repeated')
+    grep.set_defaults(func=grep_command)
+
+    export = subparsers.add_parser(
+        'export', help='export an OLE container to a tar or zip archive',
+        description='Write every storage and stream of an OLE container '
+        'into a tar or zip archive, reading streams in sector order')
+    export.add_argument('container', metavar='CONTAINER',
+                        help='container file')
+    export.add_argument('-o', '--output', default='-',
+                        help='archive file, or - for stdout (default: -)')
+    export.add_argument('-f', '--format', choices=FORMATS,
+                        help='archive format (default: guessed from the '
+                        'output file name, tar for stdout)')
+    export.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help='bytes read at a time from a stream (default: '
+                        '%d)' % DEFAULT_CHUNK_SIZE)
+    export.set_defaults(func=export_command)
+
+    props = subparsers.add_parser(
+        'props', help='extract property sets of OLE containers as NDJSON',
+        description='Print the property sets (SummaryInformation and the '
+        'like) of many OLE containers, one JSON object per container and '
+        'line. Only the directory entries and sectors of these streams are '
+        'read.')
+    props.add_argument('containers', nargs='+', metavar='CONTAINER',
+                       help='container file, directory of containers or '
+                       'glob pattern')
+    props.add_argument('-j', '--jobs', type=int, default=None,
+                       help='number of worker processes (default: number '
+                       'of CPUs)')
+    props.add_argument('-s', '--stream', action='append', dest='streams',
+                       metavar='NAME',
+                       help='path of a property set stream, without the '
+                       '\\x05 which starts its name; may be repeated '
+                       '(default: %s)' % ', '.join(
+                           name[1:] for name in PROPERTY_SET_STREAMS))
+    props.set_defaults(func=props_command)
+
+    serve = subparsers.add_parser(
+        'serve', help='serve streams of OLE containers over HTTP',
+        description='Serve the streams of OLE containers over read-only '
+        'HTTP: / and storages are listed as JSON, streams are served with '
+        'byte range support at /<container>/<stream path>')
+    serve.add_argument('containers', nargs='+', metavar='CONTAINER',
+                       help='container file, directory of containers or '
+                       'glob pattern')
+    serve.add_argument('-b', '--bind', default='127.0.0.1',
+                       help='address to listen on (default: 127.0.0.1)')
+    serve.add_argument('--port', type=int, default=8000,
+                       help='port to listen on (default: 8000)')
+    serve.add_argument('--max-open', type=int, default=16,
+                       help='containers to keep open (default: 16)')
+    serve.add_argument('--no-sendfile', dest='use_sendfile',
+                       action='store_false',
+                       help='copy streams instead of sending runs of '
+                       'sectors with sendfile()')
+    serve.set_defaults(func=serve_command)
+    return parser
+
+
+def add_containers_arguments(parser):
+    parser.add_argument('containers', nargs='+', metavar='CONTAINER',
+                        help='container file, directory of containers or '
+                        'glob pattern')
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help='number of worker processes (default: number '
+                        'of CPUs)')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help='bytes read at a time from a stream, which '
+                        'bounds the memory of a worker (default: %d)'
+                        % DEFAULT_CHUNK_SIZE)
+
+
+#
+# extract
+#
+
+def extract_command(args):
+    tasks = [(path, os.path.join(args.output, name), args.patterns,
+              args.chunk_size)
+             for path, name in iter_containers(args.containers)]
+    summary = Summary()
+    for result in run_tasks(extract_container, tasks, args.jobs):
+        summary.add(result)
+    summary.report('extracted')
+    return summary.status
+
+
+def extract_container(task):
+    ''' Extract the selected streams of one container.
+
+    The container is opened once and every selected stream is copied
+    `chunk_size` bytes at a time.
+    '''
+    path, destination, patterns, chunk_size = task
+    streams = 0
+    size = 0
+    try:
+        with OleFileFS(path) as fs:
+            for stream_path in iter_selected_streams(fs, patterns):
+                target = os.path.join(destination, *[
+                    safe_filename(segment)
+                    for segment in stream_path.split('/')[1:]
+                ])
+                makedirs(os.path.dirname(target))
+                with fs.open(stream_path, buffering=0) as f:
+                    with open(target, 'wb') as output:
+                        shutil.copyfileobj(f, output, chunk_size)
+                streams += 1
+                size += fs.getsize(stream_path)
+    except Exception as e:
+        return Result(path, streams, size, e)
+    return Result(path, streams, size)
+
+
+#
+# hash
+#
+
+def hash_command(args, output=None):
+    output = output or sys.stdout
+    algorithms = args.algorithms or list(DEFAULT_ALGORITHMS)
+    cache = DigestCache(args.cache)
+    tasks = [(path, args.patterns, algorithms, args.chunk_size)
+             for path, name in iter_containers(args.containers)]
+    summary = Summary()
+    results = run_tasks(hash_container, tasks, args.jobs,
+                        initializer=init_hash_worker, initargs=(args.cache,))
+    for result in results:
+        summary.add(result)
+        for stream_path, digests in result.records:
+            output.write('%s  %s%s\n' % (
+                ' '.join(digests[algorithm] for algorithm in algorithms),
+                result.path, stream_path))
+        cache.update(result.cache_entries)
+    cache.save()
+    summary.report('hashed')
+    return summary.status
+
+
+worker_cache = None
+
+
+def init_hash_worker(cache_path):
+    ''' Load the digest cache once per worker.
+    '''
+    global worker_cache
+    worker_cache = DigestCache(cache_path)
+
+
+def hash_container(task):
+    ''' Digest the selected streams of one container.
+    '''
+    path, patterns, algorithms, chunk_size = task
+    cache = worker_cache
+    cache.added = {}
+    records = []
+    size = 0
+    try:
+        with OleFileFS(path) as fs:
+            stream_paths = iter_selected_streams(fs, patterns)
+            for stream_path, digests in fs.hashstreams(stream_paths,
+                                                       algorithms, cache,
+                                                       chunk_size):
+                records.append((stream_path, digests))
+                size += fs.getsize(stream_path)
+    except Exception as e:
+        return Result(path, len(records), size, e, records, cache.added)
+    return Result(path, len(records), size, records=records,
+                  cache_entries=cache.added)
+
+
+#
+# grep
+#
+
+def grep_command(args, output=None):
+    output = output or sys.stdout
+    labels = search_labels(args.strings, args.hex_strings,
+                           args.encodings or ['utf-8'])
+    labels.pop(b'', None)
+    if not labels:
+        logger.error('nothing to search for: give --string or --hex')
+        return 2
+    needles = sorted(labels)
+    tasks = [(path, args.patterns, args.chunk_size)
+             for path, name in iter_containers(args.containers)]
+    summary = Summary()
+    results = run_tasks(grep_container, tasks, args.jobs,
+                        initializer=init_grep_worker, initargs=(needles,))
+    for result in results:
+        summary.add(result)
+        for stream_path, offset, needle in result.records:
+            output.write('%s%s:%d:%s\n' % (result.path, stream_path, offset,
+                                           labels[needle]))
+    summary.report('searched')
+    return summary.status
+
+
+def search_labels(strings, hex_strings, encodings):
+    ''' Map the bytes to search for to how they were given.
+    '''
+    labels = {}
+    for text in strings:
+        for encoding in encodings:
+            label = text
+            if len(encodings) > 1:
+                label = '%s (%s)' % (text, encoding)
+            labels.setdefault(text.encode(encoding), label)
+    for data in hex_strings:
+        labels.setdefault(data, binascii.hexlify(data).decode('ascii'))
+    return labels
+
+
+def hex_bytes(value):
+    try:
+        return binascii.unhexlify(value)
+    except (TypeError, ValueError):
+        raise argparse.ArgumentTypeError('not hexadecimal: %r' % value)
+
+
+worker_matcher = None
+
+
+def init_grep_worker(needles):
+    ''' Compile the matcher once per worker.
+    '''
+    global worker_matcher
+    worker_matcher = Matcher(needles)
+
+
+def grep_container(task):
+    ''' Search the selected streams of one container.
+    '''
+    path, patterns, chunk_size = task
+    records = []
+    streams = 0
+    size = 0
+    try:
+        with OleFileFS(path) as fs:
+            for stream_path in iter_selected_streams(fs, patterns):
+                records.extend(fs.search(worker_matcher, [stream_path],
+                                         chunk_size))
+                streams += 1
+                size += fs.getsize(stream_path)
+    except Exception as e:
+        return Result(path, streams, size, e, records)
+    return Result(path, streams, size, records=records)
+
+
+#
+# props
+#
+
+PROPS_TASKS_PER_CHUNK = 16
+
+
+def props_command(args, output=None):
+    output = output or sys.stdout
+    if args.streams:
+        streams = [property_set_stream_path(name) for name in args.streams]
+    else:
+        streams = ['/' + name for name in PROPERTY_SET_STREAMS]
+    tasks = [(path, streams)
+             for path, name in iter_containers(args.containers)]
+    summary = Summary()
+    results = run_tasks(props_container, tasks, args.jobs,
+                        chunksize=PROPS_TASKS_PER_CHUNK)
+    for result in results:
+        summary.add(result)
+        for line in result.records:
+            output.write(line + '\n')
+    summary.report('read property sets of')
+    return summary.status
+
+
+def property_set_stream_path(name):
+    segments = [segment for segment in name.split('/') if segment]
+    if segments and not segments[-1].startswith('\x05'):
+        segments[-1] = '\x05' + segments[-1]
+    return '/' + '/'.join(segments)
+
+
+def props_container(task):
+    ''' Read the property sets of one container, lazily: only the
+    directory entries, FAT and MiniFAT pages and sectors of the property
+    set streams are read.
+    '''
+    path, streams = task
+    record = {'container': path, 'property_sets': []}
+    found = 0
+    size = 0
+    error = None
+    try:
+        with OleFileFS(path, lazy=True, ministream_cache_size=0) as fs:
+            for stream_path in streams:
+                if not fs.isfile(stream_path):
+                    continue
+                for property_set in fs.getpropertysets(stream_path):
+                    item = property_set_json(property_set)
+                    item['stream'] = stream_path
+                    record['property_sets'].append(item)
+                found += 1
+                size += fs.getsize(stream_path)
+    except Exception as e:
+        error = e
+        record['error'] = str(e)
+    line = json.dumps(record, sort_keys=True)
+    return Result(path, found, size, error, [line])
+
+
+#
+# export
+#
+
+def export_command(args):
+    archive_format = args.format or guess_format(args.output)
+    summary = Summary()
+    try:
+        with OleFileFS(args.container) as fs:
+            if args.output == '-':
+                output = getattr(sys.stdout, 'buffer', sys.stdout)
+                streams, size = export_container(fs, output, archive_format,
+                                                 args.chunk_size)
+                output.flush()
+            else:
+                with open(args.output, 'wb') as output:
+                    streams, size = export_container(fs, output,
+                                                     archive_format,
+                                                     args.chunk_size)
+    except Exception as e:
+        summary.add(Result(args.container, error=e))
+    else:
+        summary.add(Result(args.container, streams, size))
+    summary.report('exported')
+    return summary.status
+
+
+def guess_format(filename):
+    for archive_format in sorted(FORMATS, key=len, reverse=True):
+        if filename.endswith('.' + archive_format):
+            return archive_format
+    if filename.endswith('.tgz'):
+        return 'tar.gz'
+    return 'tar'
+
+
+#
+# serve
+#
+
+def serve_command(args):
+    containers = dict((name.replace(os.sep, '/'), path)
+                      for path, name in iter_containers(args.containers))
+    server = ContainerServer((args.bind, args.port), containers,
+                             ContainerPool(args.max_open),
+                             args.use_sendfile)
+    host, port = server.server_address[:2]
+    sys.stderr.write('serving %d containers on http://%s:%d/\n' % (
+        len(containers), host, port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+def iter_selected_streams(fs, patterns):
+    for stream_path in fs.walkfiles():
+        if patterns is None or match_any(stream_path, patterns):
+            yield stream_path
+
+
+def match_any(path, patterns):
+    return any(fnmatch.fnmatchcase(path, pattern) for pattern in patterns)
+
+
+def makedirs(path):
+    if path and not os.path.isdir(path):
+        os.makedirs(path)
+
+
+#
+# Running tasks over many containers
+#
+
+def iter_containers(arguments):
+    ''' Expand command line arguments to (container path, output name).
+
+    Directories are searched recursively, and their containers named
+    after their path within the directory.
+    '''
+    for argument in arguments:
+        if os.path.isdir(argument):
+            for dirpath, dirnames, filenames in os.walk(argument):
+                dirnames.sort()
+                for filename in sorted(filenames):
+                    path = os.path.join(dirpath, filename)
+                    yield path, os.path.relpath(path, argument)
+        elif glob.has_magic(argument):
+            for path in sorted(glob.glob(argument)):
+                if os.path.isfile(path):
+                    yield path, os.path.basename(path)
+        else:
+            yield argument, os.path.basename(argument)
+
+
+def run_tasks(func, tasks, jobs=None, initializer=None, initargs=(),
+              chunksize=1):
+    ''' Run func over tasks in a pool of worker processes, yielding
+    results as they come. With a single job, run them in this process.
+
+    `initializer(*initargs)` is called once in each worker, and tasks are
+    sent to workers `chunksize` at a time.
+    '''
+    if jobs == 1 or len(tasks) <= 1:
+        if initializer is not None:
+            initializer(*initargs)
+        for task in tasks:
+            yield func(task)
+        return
+    pool = Pool(jobs, initializer, initargs)
+    try:
+        for result in pool.imap_unordered(func, tasks, chunksize):
+            yield result
+    finally:
+        pool.close()
+        pool.join()
+
+
+class Result(object):
+    ''' What a worker did with one container.
+    '''
+
+    def __init__(self, path, streams=0, size=0, error=None, records=(),
+                 cache_entries=None):
+        self.path = path
+        self.streams = streams
+        self.size = size
+        self.error = error
+        self.records = records
+        self.cache_entries = cache_entries or {}
+
+
+class Summary(object):
+    ''' Throughput of a command over many containers.
+    '''
+
+    def __init__(self, output=None):
+        self.output = output or sys.stderr
+        self.started = time.time()
+        self.containers = 0
+        self.streams = 0
+        self.size = 0
+        self.errors = 0
+
+    def add(self, result):
+        self.containers += 1
+        self.streams += result.streams
+        self.size += result.size
+        if result.error is not None:
+            self.errors += 1
+            logger.error('%s: %s', result.path, result.error)
+
+    @property
+    def status(self):
+        return 1 if self.errors else 0
+
+    def report(self, verb):
+        elapsed = max(time.time() - self.started, 1e-6)
+        megabytes = self.size / (1024.0 * 1024.0)
+        self.output.write(
+            '%s %d streams (%.1f MB) from %d containers (%d failed) '
+            'in %.2f s: %.1f files/s, %.1f MB/s\n' % (
+                verb, self.streams, megabytes, self.containers, self.errors,
+                elapsed, self.containers / elapsed, megabytes / elapsed))
@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+#
+#   mete0r.olefilefs : PyFilesystem interface to olefile
+#   Copyright (C) 2015 mete0r <mete0r@sarangbang.or.kr>
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU Lesser General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU Lesser General Public License for more details.
+#
+#   You should have received a copy of the GNU Lesser General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+''' Export the storages and streams of a container to an archive.
+'''
+from __future__ import absolute_import
+from __future__ import unicode_literals
+import calendar
+import datetime
+import shutil
+import tarfile
+import tempfile
+import zipfile
+
+from .hashing import DEFAULT_CHUNK_SIZE
+
+
+FORMATS = ('tar', 'tar.gz', 'tar.bz2', 'zip')
+ZIP_EPOCH = datetime.datetime(1980, 1, 1)
+# before Python 3.6, zip members can only be written whole, and (before
+# 3.5) only into seekable files
+ZIP_STREAMING = hasattr(zipfile.ZipFile, '_open_to_write')
+
+
+def export_container(fs, fileobj, format='tar',
+                     chunk_size=DEFAULT_CHUNK_SIZE):
+    ''' Write every storage and stream of an OleFileFS into a tar or zip
+    archive, a chunk at a time.
+
+    Storages become directories, streams files, and their OLE modified
+    times the member times. Streams are read in the order of their first
+    sector in the container, to keep reads moving forward.
+
+    :param fileobj: where to write the archive; need not be seekable
+        (stdout, a socket, ...).
+    :param format: one of `FORMATS`.
+    :returns: (number of streams, their total size).
+    '''
+    if format not in FORMATS:
+        raise ValueError('unknown archive format: %r' % (format,))
+    if format == 'zip':
+        writer = ZipWriter(fileobj, chunk_size)
+    else:
+        writer = TarWriter(fileobj, format[len('tar.'):], chunk_size)
+    streams = 0
+    size = 0
+    try:
+        for path in fs.walkdirs():
+            if path != '/':
+                writer.adddir(member_name(path), fs.getinfo(path))
+        for path in iter_streams_in_sector_order(fs):
+            info = fs.getinfo(path)
+            with fs.open(path, buffering=0) as stream:
+                writer.addfile(member_name(path), info, stream)
+            streams += 1
+            size += info['size']
+    finally:
+        writer.close()
+    return streams, size
+
+
+def iter_streams_in_sector_order(fs):
+    ''' Paths of every stream, by the position of their first sector.
+    '''
+    positioned = []
+    for path in fs.walkfiles():
+        extents = fs.getextents(path)
+        position = extents[0][0] if extents else 0
+        positioned.append((position, path))
+    positioned.sort()
+    return [path for position, path in positioned]
+
+
+class TarWriter(object):
+
+    def __init__(self, fileobj, compression, chunk_size):
+        self.tar = tarfile.open(fileobj=fileobj, mode='w|' + compression,
+                                bufsize=chunk_size)
+
+    def adddir(self, name, info):
+        member = tarfile.TarInfo(name)
+        member.type = tarfile.DIRTYPE
+        member.mode = 0o755
+        member.mtime = member_mtime(info)
+        self.tar.addfile(member)
+
+    def addfile(self, name, info, stream):
+        member = tarfile.TarInfo(name)
+        member.size = info['size']
+        member.mode = 0o644
+        member.mtime = member_mtime(info)
+        self.tar.addfile(member, stream)
+
+    def close(self):
+        self.tar.close()
+
+
+class ZipWriter(object):
+
+    def __init__(self, fileobj, chunk_size):
+        self.output = None
+        self.spooled = None
+        if not ZIP_STREAMING and not seekable(fileobj):
+            # write into a temporary file, copied out on close()
+            self.output = fileobj
+            fileobj = self.spooled = tempfile.TemporaryFile()
+        self.zip = zipfile.ZipFile(fileobj, 'w', zipfile.ZIP_DEFLATED,
+                                   allowZip64=True)
+        self.chunk_size = chunk_size
+
+    def adddir(self, name, info):
+        member = zipfile.ZipInfo(name + '/', zip_date_time(info))
+        member.external_attr = (0o40755 << 16) | 0x10
+        self.zip.writestr(member, b'')
+
+    def addfile(self, name, info, stream):
+        member = zipfile.ZipInfo(name, zip_date_time(info))
+        member.external_attr = 0o644 << 16
+        member.compress_type = zipfile.ZIP_DEFLATED
+        member.file_size = info['size']
+        if not ZIP_STREAMING:
+            self.zip.writestr(member, stream.read())
+            return
+        with self.zip.open(member, 'w', force_zip64=True) as output:
+            while True:
+                data = stream.read(self.chunk_size)
+                if not data:
+                    break
+                output.write(data)
+
+    def close(self):
+        self.zip.close()
+        if self.spooled is not None:
+            try:
+                self.spooled.seek(0)
+                shutil.copyfileobj(self.spooled, self.output,
+                                   self.chunk_size)
+            finally:
+                self.spooled.close()
+
+
+def seekable(fileobj):
+    if hasattr(fileobj, 'seekable'):
+        return fileobj.seekable()
+    try:
+        fileobj.seek(0, 1)
+    except (AttributeError, EnvironmentError):
+        return False
+    return True
+
+
+def member_name(path):
+    return '/'.join(safe_filename(segment)
+                    for segment in path.split('/') if segment)
+
+
+def member_mtime(info):
+    modified_time = info.get('modified_time')
+    if modified_time is None:
+        return 0
+    return calendar.timegm(modified_time.utctimetuple())
+
+
+def zip_date_time(info):
+    modified_time = info.get('modified_time')
+    if modified_time is None or modified_time < ZIP_EPOCH:
+        modified_time = ZIP_EPOCH
+    return modified_time.timetuple()[:6]
+
+
+def safe_filename(name):
+    ''' Turn an entry name into a file name which stays where it is put.
+    '''
+    for separator in ('/', '\\', '\0'):
+        name = name.replace(separator, '_')
+    if name in ('', '.', '..'):
+        name = '_' + name
+    return name
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+#
+#   mete0r.olefilefs : PyFilesystem interface to olefile
+#   Copyright (C) 2015 mete0r <mete0r@sarangbang.or.kr>
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU Lesser General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU Lesser General Public License for more details.
+#
+#   You should have received a copy of the GNU Lesser General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+from __future__ import absolute_import
+from __future__ import unicode_literals
+from bisect import bisect_right
+
+from olefile import ENDOFCHAIN
+from olefile import STGTY_STREAM
+
+
+class Extents(object):
+    ''' The (position, length) byte ranges holding a stream, in order.
+
+    Adjacent ranges are coalesced, so a stream stored in one contiguous
+    run of sectors has a single extent, whatever its size.
+    '''
+
+    __slots__ = ('extents', 'starts', 'size')
+
+    def __init__(self, extents):
+        self.extents = extents = list(coalesce(extents))
+        self.starts = starts = []
+        size = 0
+        for position, length in extents:
+            starts.append(size)
+            size += length
+        self.size = size
+
+    def __iter__(self):
+        return iter(self.extents)
+
+    def __len__(self):
+        return len(self.extents)
+
+    def runs(self, offset, size):
+        ''' Yield the (position, length) ranges holding the given range of
+        the stream.
+        '''
+        end = min(offset + size, self.size)
+        if offset >= end:
+            return
+        extents = self.extents
+        starts = self.starts
+        index = bisect_right(starts, offset) - 1
+        while offset < end:
+            position, length = extents[index]
+            skip = offset - starts[index]
+            length = min(length - skip, end - offset)
+            yield position + skip, length
+            offset += length
+            index += 1
+
+    def translate(self, extents):
+        ''' Map extents positioned within this stream onto the ranges
+        holding this stream.
+        '''
+        return Extents(run
+                       for position, length in extents
+                       for run in self.runs(position, length))
+
+
+def coalesce(extents):
+    ''' Merge adjacent (position, length) ranges.
+    '''
+    run_position = None
+    run_length = 0
+    for position, length in extents:
+        if run_position is not None and run_position + run_length == position:
+            run_length += length
+            continue
+        if run_position is not None:
+            yield run_position, run_length
+        run_position = position
+        run_length = length
+    if run_position is not None:
+        yield run_position, run_length
+
+
+def chain_extents(fat, start, sector_size, size, base=0):
+    ''' Extents of the first `size` bytes of a FAT or MiniFAT sector chain.
+
+    `base` is the position of sector #0: the size of the header for the
+    FAT, 0 for the MiniFAT (whose sectors live in the mini stream).
+    '''
+    return Extents(iter_chain(fat, start, sector_size, size, base))
+
+
+def iter_chain(fat, start, sector_size, size, base=0):
+    sector = start
+    visited = 0
+    while size > 0:
+        if sector == ENDOFCHAIN:
+            raise IOError('incomplete OLE stream')
+        if sector >= len(fat):
+            raise IOError('OLE sector index out of range')
+        if visited > len(fat):
+            raise IOError('OLE sector chain contains a loop')
+        length = min(sector_size, size)
+        yield base + sector * sector_size, length
+        size -= length
+        visited += 1
+        sector = fat[sector]
+
+
+def entry_extents(olefile, entry, ministream=None):
+    ''' Extents of a stream (or of the mini stream, for the root entry)
+    within the container.
+
+    Streams kept in the mini stream are first resolved through the
+    MiniFAT, then mapped through `ministream`, the extents of the mini
+    stream itself.
+    '''
+    if in_ministream(olefile, entry):
+        return ministream.translate(minifat_extents(olefile, entry))
+    return chain_extents(olefile.fat, entry.isectStart, olefile.sectorsize,
+                         entry.size, olefile.sectorsize)
+
+
+def minifat_extents(olefile, entry):
+    ''' Extents of a small stream within the mini stream.
+    '''
+    if olefile.minifat is None and entry.size > 0:
+        olefile.loadminifat()
+    return chain_extents(olefile.minifat, entry.isectStart,
+                         olefile.minisectorsize, entry.size)
+
+
+def in_ministream(olefile, entry):
+    ''' Whether a stream is kept in the mini stream rather than in sectors
+    of its own.
+    '''
+    return entry.entry_type == STGTY_STREAM and \
+        entry.size < olefile.minisectorcutoff
@@ -18,16 +18,68 @@
 #
 from __future__ import absolute_import
 from __future__ import unicode_literals
+from multiprocessing.pool import ThreadPool
+import fnmatch
+import io
+import logging
+import mmap
+import os
 import os.path
+import re
+import sys
+import timeit
 
 from fs.base import FS
 from fs.errors import CreateFailedError
 from fs.errors import OperationFailedError
+from fs.errors import ResourceInvalidError
+from fs.errors import ResourceNotFoundError
+from fs.path import normpath
+from fs.path import pathcombine
+from olefile import MAGIC
 from olefile import OleFileIO
-from olefile import STGTY_ROOT
-from olefile import STGTY_STORAGE
 from olefile import STGTY_STREAM
 
+from .cache import LRUCache
+from .cache import MemoryBudget
+from .extents import entry_extents
+from .extents import in_ministream
+from .extents import minifat_extents
+from .hashing import DEFAULT_ALGORITHMS
+from .hashing import DEFAULT_CHUNK_SIZE
+from .hashing import digest_stream
+from .hashing import stream_key
+from .index import DirectoryIndex
+from .lazy import DIRENTRY_MEMORY
+from .lazy import LazyOleFile
+from .propset import parse_property_sets
+from .search import Matcher
+from .search import search_stream
+from .sidecar import IndexedOleFile
+from .sidecar import load_index
+from .sidecar import save_index
+from .source import CachedSource
+from .source import FileSource
+from .source import LockedSource
+from .source import MmapSource
+from .source import PreadSource
+from .source import threadsafe_source
+from .stats import CountingFile
+from .stats import CountingSource
+from .stats import Stats
+from .stats import process_stats
+from .stats import timed
+from .stats import timed_generator
+from .stream import BudgetedReader
+from .stream import ExtentSource
+from .stream import OleStream
+
+
+logger = logging.getLogger(__name__)
+
+
+MINISTREAM_BLOCK_SIZE = 64 * 1024
+
 
 class OleFileFS(FS):
 
@@ -37,34 +89,196 @@ class OleFileFS(FS):
                  unicode_paths=True,
                  case_insensitive_paths=True)
 
-    def __init__(self, path):
+    def __init__(self, path, use_mmap=False, thread_safe=False,
+                 path_cache_size=1024, ministream_cache_size=4 * 1024 * 1024,
+                 lazy=False, memory_budget=None, memory_wait=0,
+                 instrument=False, stats_callback=None, index_cache=None):
+        ''' Open an OLE container.
+
+        :param path: path of the container file, or a seekable file object.
+            An `OleStream` (see `opencontainer()`) is read through its
+            extents, so an embedded container reads only the sectors it
+            needs from the outer one.
+        :param use_mmap: memory-map the container file (only if `path` is
+            a path) and serve stream reads straight out of the mapping;
+            `open()` then returns unbuffered streams which also provide
+            zero-copy `views()`.
+        :param thread_safe: parse everything up front and read streams
+            with positional I/O (or under a lock, for file objects without
+            a file descriptor), so that any number of threads may use this
+            filesystem and read its streams concurrently.
+        :param path_cache_size: how many resolved paths to remember, as
+            given by the caller, so that looking them up again skips path
+            normalization.
+        :param ministream_cache_size: how many bytes of the mini stream,
+            which holds the streams smaller than 4096 bytes, to keep in
+            memory. A mini stream within this size is read once, whole
+            (unless `lazy`); a larger one is read and evicted in blocks.
+            0 disables the cache. (Memory-mapped containers need no such
+            cache.)
+        :param lazy: read only the header when opening; FAT and MiniFAT
+            pages and directory entries are then read as they are first
+            needed, so probing a container for a few paths reads only a
+            few sectors.
+        :param memory_budget: bytes of memory which the buffers of open
+            streams, the mini stream cache and the parsed FAT and
+            directory (estimated) may take, or a `MemoryBudget` shared with
+            other filesystems. The mini stream cache is evicted to make
+            room; then `open()` waits up to `memory_wait` seconds (None:
+            forever) for streams to be closed, and fails if none are.
+            See `getmemoryusage()`.
+        :param instrument: count sectors and bytes read, system calls,
+            seeks, cache hits and misses, path resolutions and the time
+            spent in `open()`, `listdir()`, `getinfo()` and `walk()`; see
+            `stats()`. Counts also add up in `stats.process_stats`.
+        :param stats_callback: called with (name, value) of each count
+            (implies `instrument`), e.g. to feed a metrics system.
+        :param index_cache: directory where to keep an index of the
+            directory tree and stream extents of each container opened by
+            path. Reopening an unchanged container (same size, mtime and
+            header) then reads its index instead of parsing it; otherwise
+            the index is saved once the container is parsed (unless
+            `lazy`).
+        '''
+        FS.__init__(self, thread_synchronize=thread_safe)
+        self._refs = 1
+        self._stats = None
+        if instrument or stats_callback is not None:
+            self._stats = Stats(parent=process_stats,
+                                callback=stats_callback)
+        if hasattr(path, 'read'):
+            index_cache = None
+        mapped = None
+        opened = None
+        container = path
+        index = None
         try:
-            self._olefile = OleFileIO(path, path_encoding=None)
-        except IOError as e:
+            if use_mmap and not hasattr(path, 'read'):
+                # parse from the file: OleFileIO cannot read a mapping on
+                # Python 2
+                container = opened = open(path, 'rb')
+                mapped = mmap.mmap(opened.fileno(), 0,
+                                   access=mmap.ACCESS_READ)
+            elif self._stats is not None or index_cache is not None:
+                if not hasattr(path, 'read'):
+                    container = opened = open(path, 'rb')
+            if self._stats is not None:
+                # count what parsing reads, too
+                container = CountingFile(container, self._stats)
+            if index_cache is not None:
+                index = load_index(index_cache, path, container)
+            if index is not None:
+                self._olefile = IndexedOleFile(container, index)
+            elif lazy:
+                self._olefile = LazyOleFile(container)
+            else:
+                self._olefile = OleFileIO(container, path_encoding=None)
+        except (EnvironmentError, ValueError) as e:
+            if mapped is not None:
+                mapped.close()
+            if opened is not None:
+                opened.close()
             raise CreateFailedError(str(e), details=e)
+        self._opened = opened
+        self._mapped = mapped is not None
+        fp = self._olefile.fp
+        if isinstance(fp, CountingFile):
+            fp.sector_size = self._olefile.sectorsize
+            fp = fp.fp
+        if not isinstance(memory_budget, MemoryBudget):
+            memory_budget = MemoryBudget(memory_budget)
+        self._budget = memory_budget
+        self._memory_wait = memory_wait
+        lazy = lazy and index is None
+        if index is not None:
+            self._tables_memory = DIRENTRY_MEMORY * len(index.entries)
+            self._budget.charge('tables', self._tables_memory)
+        elif lazy:
+            self._olefile.budget = self._budget
+            self._tables_memory = 0
+        else:
+            self._tables_memory = (
+                sys.getsizeof(self._olefile.fat) + DIRENTRY_MEMORY *
+                sum(1 for entry in self._olefile.direntries
+                    if entry is not None))
+            self._budget.charge('tables', self._tables_memory)
+        self._identity = None
+        if not hasattr(path, 'read'):
+            stat = os.stat(path)
+            self._identity = (os.path.abspath(path), stat.st_size,
+                              stat.st_mtime)
+        self._index = None
+        self._lazy = lazy
+        self._paths = LRUCache(path_cache_size)
+        if mapped is not None:
+            self._source = MmapSource(mapped)
+        elif isinstance(path, OleStream):
+            self._source = path.source
+        elif thread_safe:
+            self._source = threadsafe_source(fp)
+        else:
+            self._source = FileSource(fp)
+        if self._stats is not None:
+            self._source = counting_source(self._source, self._stats,
+                                           self._olefile.sectorsize)
+        if lazy:
+            self._olefile.source = self._source
+            self._olefile.stats = self._stats
+        self._extents = {}
+        self._mini_extents = {}
+        if index is not None:
+            self._extents.update(index.extents)
+            self._mini_extents.update(index.mini_extents)
+        self._ministream = None
+        self._ministream_cache = LRUCache(ministream_cache_size, weigh=len,
+                                          on_remove=self._release_ministream)
+        self._budget.add_evictor(self._evict_ministream)
+        if thread_safe:
+            self._meta = dict(self._meta, thread_safe=True)
+            if lazy:
+                # reads on demand go through the thread-safe source
+                self._index = DirectoryIndex(self._olefile.root, eager=False)
+            else:
+                # olefile reads the MiniFAT through the shared file
+                # position: load it, and the directory index, before any
+                # thread can.
+                if self._olefile.root.size > 0:
+                    self._olefile.loadminifat()
+                self._lookup('/')
+        if index_cache is not None and index is None and not lazy:
+            self._save_index(index_cache, path, container)
 
     #
     # Essential methods
     #
 
+    @timed('open')
     def open(self, path, mode='r', buffering=-1, encoding=None, errors=None,
              newline=None, line_buffering=False, **kwargs):
         for unsupported in 'w', 'a', '+':
             if unsupported in mode:
                 raise OperationFailedError('open', path=path)
-        segments = path_to_segments_normalized(path)
-        return self._olefile.openstream(segments)
+        node = self._lookup_stream(path)
+        stream = self._openstream(node.entry)
+        if buffering == 0 or self._mapped:
+            return stream
+        if buffering < 0 or buffering == 1:
+            buffering = io.DEFAULT_BUFFER_SIZE
+        if not self._budget.reserve('buffers', buffering, self._memory_wait):
+            raise OperationFailedError('open', path=path,
+                                       msg='Memory budget exhausted: '
+                                       '%(path)s')
+        return BudgetedReader(stream, buffering, self._budget)
 
     def isdir(self, path):
-        segments = path_to_segments_normalized(path)
-        sty = self._olefile.get_type(segments)
-        return sty in (STGTY_STORAGE, STGTY_ROOT)
+        node = self._lookup(path)
+        return node is not None and node.isdir
 
     def isfile(self, path):
-        segments = path_to_segments_normalized(path)
-        sty = self._olefile.get_type(segments)
-        return sty is STGTY_STREAM
+        node = self._lookup(path)
+        return node is not None and node.isfile
 
+    @timed('listdir')
     def listdir(self, path='./', wildcard=None, full=False, absolute=False,
                 dirs_only=False, files_only=False):
         items = self.ilistdir(path=path, wildcard=wildcard, full=full,
@@ -72,65 +286,560 @@ class OleFileFS(FS):
                               files_only=files_only)
         return list(items)
 
+    @timed('getinfo')
     def getinfo(self, path):
-        segments = path_to_segments_normalized(path)
-        size = self._olefile.get_size(segments)
-        ctime = self._olefile.getctime(segments)
-        mtime = self._olefile.getmtime(segments)
-        return {
-            'size': size,
-            'created_time': ctime,
-            'modified_time': mtime,
-        }
+        node = self._lookup(path)
+        if node is None:
+            raise ResourceNotFoundError(path)
+        return entry_info(node.entry)
 
     #
     # Non-essential methods
     #
 
+    def acquire(self):
+        ''' Take another reference to this filesystem, to be dropped by
+        another `close()`: only the last `close()` closes the container.
+        '''
+        with self._lock:
+            self._refs += 1
+        return self
+
     def close(self):
+        with self._lock:
+            if self.closed:
+                return
+            # an extra close() of a holder drops no reference below zero
+            self._refs = max(self._refs - 1, 0)
+            if self._refs > 0:
+                return
+            self.closed = True
         self._olefile.close()
+        self._source.close()
+        if self._opened is not None:
+            self._opened.close()
+        self._budget.remove_evictor(self._evict_ministream)
+        self._ministream_cache.clear()
+        if self._lazy:
+            self._tables_memory = self._olefile.charged
+        self._budget.release('tables', self._tables_memory)
         FS.close(self)
 
+    def getmemoryusage(self):
+        ''' Bytes of memory in use in the budget of this filesystem, by
+        category ('buffers', 'ministream' and 'tables'), along with its
+        'used' total and its 'limit'.
+        '''
+        usage = self._budget.usage()
+        usage['used'] = self._budget.used
+        usage['limit'] = self._budget.limit
+        return usage
+
+    def stats(self):
+        ''' Counts of what this filesystem did, by name, if instrumented
+        (empty otherwise):
+
+        - 'reads', 'bytes_read', 'sectors_read', 'syscalls' and 'seeks'
+          of the container file (or of the outer stream, for a nested
+          container);
+        - '<cache>.hits' and '<cache>.misses' of the 'path_cache',
+          'extents_cache' and 'ministream_cache';
+        - 'path_resolutions', paths looked up in the directory;
+        - 'fat_pages_read', 'minifat_pages_read' and
+          'directory_entries_read', in lazy mode;
+        - 'calls.<method>' and 'time.<method>' (seconds) of `open`,
+          `listdir`, `getinfo` and `walk`, along with 'time.extents',
+          spent walking the FAT/MiniFAT, and 'time.resolve', spent
+          resolving paths.
+        '''
+        if self._stats is None:
+            return {}
+        return self._stats.snapshot()
+
+    def exists(self, path):
+        return self._lookup(path) is not None
+
     def ilistdir(self, path='./', wildcard=None, full=False, absolute=False,
                  dirs_only=False, files_only=False):
-        if dirs_only:
-            olefile_listdir_args = dict(streams=False, storages=True)
-        elif files_only:
-            olefile_listdir_args = dict(streams=True, storages=False)
-        else:
-            olefile_listdir_args = dict()
-        given_node = path_to_segments_normalized(path)
-        leafs = self._olefile.listdir(**olefile_listdir_args)
-        leafs = map(tuple, leafs)
-        nodes = find_children(given_node, leafs)
-        for segments in nodes:
-            stgty = self._olefile.get_type(segments)
-            if dirs_only and stgty not in (STGTY_STORAGE, STGTY_ROOT):
+        children = self._ilistchildren(path, wildcard, dirs_only, files_only)
+        for child in children:
+            yield node_path(child, full, absolute)
+
+    def listdirinfo(self, path='./', wildcard=None, full=False,
+                    absolute=False, dirs_only=False, files_only=False):
+        items = self.ilistdirinfo(path=path, wildcard=wildcard, full=full,
+                                  absolute=absolute, dirs_only=dirs_only,
+                                  files_only=files_only)
+        return list(items)
+
+    def ilistdirinfo(self, path='./', wildcard=None, full=False,
+                     absolute=False, dirs_only=False, files_only=False):
+        children = self._ilistchildren(path, wildcard, dirs_only, files_only)
+        for child in children:
+            yield node_path(child, full, absolute), entry_info(child.entry)
+
+    def _ilistchildren(self, path, wildcard, dirs_only, files_only):
+        if dirs_only and files_only:
+            raise ValueError('dirs_only and files_only can not both be True')
+        node = self._lookup(path)
+        if node is None:
+            raise ResourceNotFoundError(path)
+        if not node.isdir:
+            raise ResourceInvalidError(path, msg='Not a storage: %(path)s')
+        match = wildcard_matcher(wildcard)
+        for child in node.children:
+            if dirs_only and not child.isdir:
                 continue
-            elif files_only and stgty is not STGTY_STREAM:
+            elif files_only and not child.isfile:
                 continue
-            if absolute:
-                yield absolute_path_from_segments(segments)
-            elif full:
-                yield full_path_from_segments(segments)
+            if match is not None and not match(child.segments[-1]):
+                continue
+            yield child
+
+    @timed_generator('walk')
+    def walk(self, path='/', wildcard=None, dir_wildcard=None,
+             search='breadth', ignore_errors=False):
+        match = wildcard_matcher(wildcard)
+        for current_path, children in self._walknodes(path, dir_wildcard,
+                                                      search, ignore_errors):
+            files = [child.segments[-1]
+                     for child in children
+                     if child.isfile and (match is None or
+                                          match(child.segments[-1]))]
+            yield current_path, files
+
+    def walkfiles(self, path='/', wildcard=None, dir_wildcard=None,
+                  search='breadth', ignore_errors=False):
+        for current_path, files in self.walk(path, wildcard=wildcard,
+                                             dir_wildcard=dir_wildcard,
+                                             search=search,
+                                             ignore_errors=ignore_errors):
+            for name in files:
+                yield pathcombine(current_path, name)
+
+    def walkdirs(self, path='/', wildcard=None, search='breadth',
+                 ignore_errors=False):
+        for current_path, children in self._walknodes(path, wildcard, search,
+                                                      ignore_errors):
+            yield current_path
+
+    def _walknodes(self, path, dir_wildcard, search, ignore_errors):
+        ''' Yield (path, child nodes) of the storages under `path`, in one
+        traversal of the directory index: parents first for 'breadth',
+        children first for 'depth'.
+
+        As `FS.walk()` does, `dir_wildcard` is matched against the paths of
+        storages, and storages whose children cannot be read are taken
+        as empty if `ignore_errors`.
+        '''
+        if search not in ('breadth', 'depth'):
+            raise ValueError("Search should be 'breadth' or 'depth'")
+        node = self._lookup(path)
+        if node is None:
+            raise ResourceNotFoundError(path)
+        if not node.isdir:
+            raise ResourceInvalidError(path, msg='Not a storage: %(path)s')
+        match = wildcard_matcher(dir_wildcard)
+
+        def children(node):
+            if not ignore_errors:
+                return node.children
+            try:
+                return node.children
+            except Exception:
+                return []
+
+        def subdirs(current_path, children):
+            for child in reversed(children):
+                if child.isdir:
+                    child_path = pathcombine(current_path, child.segments[-1])
+                    if match is None or match(child_path):
+                        yield child_path, child
+
+        if search == 'breadth':
+            stack = [(normpath(path), node)]
+            while stack:
+                current_path, node = stack.pop()
+                kids = children(node)
+                yield current_path, kids
+                stack.extend(subdirs(current_path, kids))
+        else:
+            stack = [(normpath(path), node, None)]
+            while stack:
+                current_path, node, kids = stack.pop()
+                if kids is not None:
+                    yield current_path, kids
+                    continue
+                kids = children(node)
+                stack.append((current_path, node, kids))
+                stack.extend((subdir_path, subdir, None)
+                             for subdir_path, subdir
+                             in subdirs(current_path, kids))
+
+    #
+    # Streams
+    #
+
+    def getextents(self, path):
+        ''' Return the (offset, length) byte ranges of the container file
+        which hold the stream at `path`, in stream order.
+        '''
+        node = self._lookup_stream(path)
+        return list(self._get_extents(node.entry))
+
+    def readrange(self, path, offset, length):
+        ''' Read `length` bytes of the stream at `path` from `offset`, or
+        up to its end, reading only the sectors which hold them.
+        '''
+        return self.readranges(path, [(offset, length)])[0]
+
+    def readranges(self, path, ranges):
+        ''' Read (offset, length) ranges of the stream at `path`.
+
+        Overlapping and adjacent ranges are coalesced, so each run of them
+        is read once, one read per extent it spans.
+
+        :returns: a list of bytes, one per range, in the given order;
+            shorter than asked for past the end of the stream.
+        '''
+        node = self._lookup_stream(path)
+        source = self._openstream(node.entry).source
+        results = [None] * len(ranges)
+        for start, end, members in coalesce_ranges(ranges):
+            data = source.readat(start, end - start)
+            for index, offset, length in members:
+                results[index] = data[offset - start:offset - start + length]
+        return results
+
+    def getdigests(self, path, algorithms=DEFAULT_ALGORITHMS, cache=None,
+                   chunk_size=DEFAULT_CHUNK_SIZE):
+        ''' Digest the stream at `path`, `chunk_size` bytes at a time.
+
+        :param algorithms: names of `hashlib` algorithms.
+        :param cache: a `DigestCache`, consulted and filled by the version
+            and extents of the container file (if opened by path).
+        :returns: a dict of algorithm name -> hex digest.
+        '''
+        node = self._lookup_stream(path)
+        key = None
+        if cache is not None and self._identity is not None:
+            key = stream_key(self._identity, self._get_extents(node.entry),
+                             node.entry.size)
+            digests = cache.get(key, algorithms)
+            if digests is not None:
+                return digests
+        digests = digest_stream(self._openstream(node.entry), algorithms,
+                                chunk_size)
+        if key is not None:
+            cache.put(key, digests)
+        return digests
+
+    def hashstreams(self, paths=None, algorithms=DEFAULT_ALGORITHMS,
+                    cache=None, chunk_size=DEFAULT_CHUNK_SIZE, threads=1):
+        ''' Yield (path, digests) of the streams at `paths`, or of every
+        stream, in order. See `getdigests()`.
+
+        A thread-safe filesystem digests `threads` streams at once.
+        '''
+        if paths is None:
+            paths = self.walkfiles()
+
+        def digest(path):
+            return path, self.getdigests(path, algorithms, cache, chunk_size)
+        if threads <= 1 or not self.getmeta('thread_safe'):
+            for path in paths:
+                yield digest(path)
+            return
+        pool = ThreadPool(threads)
+        try:
+            for result in pool.imap(digest, paths):
+                yield result
+        finally:
+            pool.close()
+            pool.join()
+
+    def search(self, patterns, paths=None, chunk_size=DEFAULT_CHUNK_SIZE):
+        ''' Yield (path, offset, pattern) of every occurrence of any of
+        `patterns` (bytes) in the streams at `paths`, or in every stream,
+        reading each stream once, `chunk_size` bytes at a time.
+
+        `patterns` may also be a `Matcher`, to be reused.
+        '''
+        matcher = patterns
+        if not isinstance(matcher, Matcher):
+            matcher = Matcher(patterns)
+        if paths is None:
+            paths = self.walkfiles()
+        for path in paths:
+            node = self._lookup_stream(path)
+            stream = self._openstream(node.entry)
+            for offset, index in search_stream(stream, matcher, chunk_size):
+                yield path, offset, matcher.patterns[index]
+
+    def getpropertysets(self, path):
+        ''' Parse the property sets of the stream at `path`, such as the
+        SummaryInformation stream, reading it in one pass over its extents.
+
+        :returns: a list of `PropertySet`.
+        :raises ResourceInvalidError: if the stream is not a valid property
+            set stream.
+        '''
+        node = self._lookup_stream(path)
+        source = self._openstream(node.entry).source
+        try:
+            return parse_property_sets(source.readat(0, node.entry.size))
+        except ValueError:
+            raise ResourceInvalidError(path, msg='Not a property set stream: '
+                                       '%(path)s')
+
+    def iscontainer(self, path):
+        ''' Whether the stream at `path` holds an OLE container.
+
+        Reads only the first sector of the stream.
+        '''
+        node = self._lookup(path)
+        if node is None or not node.isfile:
+            return False
+        return self._openstream(node.entry).read(len(MAGIC)) == MAGIC
+
+    def opencontainer(self, path, **kwargs):
+        ''' Open the OLE container embedded in the stream at `path` as a
+        nested OleFileFS, without copying it: its sectors are read through
+        the extents of the stream, as they are needed.
+
+        Keyword arguments are those of `OleFileFS`; `thread_safe`
+        defaults to that of this filesystem.
+        '''
+        node = self._lookup_stream(path)
+        stream = self._openstream(node.entry)
+        if stream.read(len(MAGIC)) != MAGIC:
+            raise ResourceInvalidError(path,
+                                       msg='Not an OLE container: %(path)s')
+        stream.seek(0)
+        kwargs.setdefault('thread_safe', self.getmeta('thread_safe'))
+        return OleFileFS(stream, **kwargs)
+
+    def _openstream(self, entry):
+        ''' Open a stream without reading any of its sectors yet.
+        '''
+        if self._caches_ministream(entry):
+            extents = self._get_mini_extents(entry)
+            source = ExtentSource(self._get_ministream(), extents)
+        else:
+            extents = self._get_extents(entry)
+            source = ExtentSource(self._source, extents)
+        return OleStream(source, entry.size)
+
+    def _get_extents(self, entry):
+        ''' Extents of a stream, computed once from the FAT/MiniFAT.
+        '''
+        extents = self._extents.get(entry.sid)
+        if self._stats is not None:
+            self._stats.hit('extents_cache', extents is not None)
+        if extents is None:
+            with self._lock:
+                extents = self._extents.get(entry.sid)
+                if extents is None:
+                    olefile = self._olefile
+                    ministream = None
+                    if in_ministream(olefile, entry):
+                        ministream = self._get_extents(olefile.root)
+                    started = timeit.default_timer()
+                    extents = entry_extents(olefile, entry, ministream)
+                    if self._stats is not None:
+                        self._stats.add('time.extents',
+                                        timeit.default_timer() - started)
+                    self._extents[entry.sid] = extents
+        return extents
+
+    def _caches_ministream(self, entry):
+        return (self._ministream_cache.capacity > 0 and
+                not self._mapped and
+                in_ministream(self._olefile, entry))
+
+    def _get_mini_extents(self, entry):
+        ''' Extents of a small stream within the mini stream, computed
+        once from the MiniFAT.
+        '''
+        extents = self._mini_extents.get(entry.sid)
+        if extents is None:
+            with self._lock:
+                extents = self._mini_extents.get(entry.sid)
+                if extents is None:
+                    extents = minifat_extents(self._olefile, entry)
+                    self._mini_extents[entry.sid] = extents
+        return extents
+
+    def _get_ministream(self):
+        ''' The mini stream, read through the mini stream cache.
+        '''
+        if self._ministream is None:
+            with self._lock:
+                if self._ministream is None:
+                    root = self._olefile.root
+                    cache = self._ministream_cache
+                    if root.size <= cache.capacity and not self._lazy:
+                        block_size = max(root.size, 1)
+                    else:
+                        block_size = MINISTREAM_BLOCK_SIZE
+                    source = ExtentSource(self._source,
+                                          self._get_extents(root))
+                    self._ministream = CachedSource(source, root.size, cache,
+                                                    block_size, self._lock,
+                                                    self._budget, self._stats)
+        return self._ministream
+
+    def _release_ministream(self, index, block):
+        self._budget.release('ministream', len(block))
+
+    def _evict_ministream(self):
+        # called while charging a (shared) budget, perhaps under another
+        # lock: skip this cache rather than wait for it
+        if not self._lock.acquire(False):
+            return False
+        try:
+            if len(self._ministream_cache) == 0:
+                return False
+            self._ministream_cache.popitem()
+            return True
+        finally:
+            self._lock.release()
+
+    def _save_index(self, directory, path, container):
+        ''' Compute the extents of every stream, then save them along
+        with the directory tree into `directory`.
+        '''
+        extents = {}
+        mini_extents = {}
+        root = self._olefile.root
+        stack = [root]
+        while stack:
+            entry = stack.pop()
+            if entry.entry_type == STGTY_STREAM:
+                extents[entry.sid] = self._get_extents(entry)
+                if in_ministream(self._olefile, entry):
+                    mini_extents[entry.sid] = self._get_mini_extents(entry)
             else:
-                yield segments[-1]
+                stack.extend(entry.kids)
+        extents[root.sid] = self._get_extents(root)
+        try:
+            save_index(directory, path, container, self._olefile, root,
+                       extents, mini_extents)
+        except (IOError, OSError) as e:
+            logger.warning('%s: could not save its index: %s', path, e)
+
+    #
+    # Directory index
+    #
+
+    def _lookup(self, path):
+        ''' Resolve path to its directory index node, or None.
+        '''
+        with self._lock:
+            node = self._paths.get(path)
+        stats = self._stats
+        if stats is not None:
+            stats.hit('path_cache', node is not None)
+        if node is not None:
+            return node
+        started = timeit.default_timer()
+        if self._index is None:
+            self._index = DirectoryIndex(self._olefile.root,
+                                         eager=not self._lazy)
+        segments = path_to_segments_normalized(path)
+        node = self._index.lookup(segments)
+        if stats is not None:
+            stats.add('path_resolutions')
+            stats.add('time.resolve', timeit.default_timer() - started)
+        if node is not None:
+            with self._lock:
+                self._paths.put(path, node)
+        return node
+
+    def _lookup_stream(self, path):
+        node = self._lookup(path)
+        if node is None:
+            raise ResourceNotFoundError(path)
+        if not node.isfile:
+            raise ResourceInvalidError(path, msg='Not a stream: %(path)s')
+        return node
+
+
+def counting_source(source, stats, sector_size):
+    ''' Count the reads of a source, along with the system calls each one
+    issues.
+    '''
+    if isinstance(source, PreadSource):
+        syscalls, seeks = 1, 0
+    elif isinstance(source, (FileSource, LockedSource)):
+        # seek, then read
+        syscalls, seeks = 2, 1
+    else:
+        # memory-mapped, or read through an outer container
+        syscalls, seeks = 0, 0
+    return CountingSource(source, stats, sector_size, syscalls, seeks)
+
+
+def entry_info(entry):
+    ''' Info dict of a directory entry, as returned by `OleFileFS.getinfo`.
+    '''
+    if entry.entry_type == STGTY_STREAM:
+        size = entry.size
+    else:
+        size = 0
+    return {
+        'size': size,
+        'created_time': entry.getctime(),
+        'modified_time': entry.getmtime(),
+        'storage_type': entry.entry_type,
+        'clsid': entry.clsid,
+        'state_bits': entry.dwUserFlags,
+    }
+
+
+def coalesce_ranges(ranges):
+    ''' Merge overlapping and adjacent (offset, length) ranges.
+
+    Yield (start, end, members) of each merged range, where members are
+    the (index, offset, length) of the ranges it covers.
+    '''
+    indexed = []
+    for index, (offset, length) in enumerate(ranges):
+        if offset < 0 or length < 0:
+            raise ValueError('invalid range: %r' % ((offset, length),))
+        indexed.append((offset, length, index))
+    indexed.sort()
+    start = end = None
+    members = []
+    for offset, length, index in indexed:
+        if start is not None and offset > end:
+            yield start, end, members
+            start = None
+            members = []
+        if start is None:
+            start, end = offset, offset + length
+        end = max(end, offset + length)
+        members.append((index, offset, length))
+    if start is not None:
+        yield start, end, members
 
 
-def find_children(prefix, nodes):
-    seen = set()
-    for node in nodes:
-        if segments_is_descendant_of(node, prefix):
-            child = node[:len(prefix) + 1]
-            if child not in seen:
-                yield child
-                seen.add(child)
+def node_path(node, full=False, absolute=False):
+    if absolute:
+        return absolute_path_from_segments(node.segments)
+    elif full:
+        return full_path_from_segments(node.segments)
+    else:
+        return node.segments[-1]
 
 
-def segments_is_descendant_of(node, ancestor):
-    if len(node) <= len(ancestor):
-        return False
-    return node[:len(ancestor)] == ancestor
+def wildcard_matcher(wildcard):
+    ''' Turn a listdir/walk wildcard into a predicate on names, or None.
+    '''
+    if wildcard is None or callable(wildcard):
+        return wildcard
+    wildcard_re = re.compile(fnmatch.translate(wildcard))
+    return lambda name: wildcard_re.match(name) is not None
 
 
 def absolute_path_from_segments(segments):
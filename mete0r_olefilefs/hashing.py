@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+#
+#   mete0r.olefilefs : PyFilesystem interface to olefile
+#   Copyright (C) 2015 mete0r <mete0r@sarangbang.or.kr>
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU Lesser General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU Lesser General Public License for more details.
+#
+#   You should have received a copy of the GNU Lesser General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+''' Digests of stream contents.
+'''
+from __future__ import absolute_import
+from __future__ import unicode_literals
+import hashlib
+import json
+import os
+import os.path
+
+
+DEFAULT_ALGORITHMS = ('sha256',)
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+
+def digest_stream(stream, algorithms=DEFAULT_ALGORITHMS,
+                  chunk_size=DEFAULT_CHUNK_SIZE):
+    ''' Digest the rest of an `OleStream`, `chunk_size` bytes at a time.
+
+    :returns: a dict of algorithm name -> hex digest.
+    '''
+    hashes = [(algorithm, hashlib.new(algorithm))
+              for algorithm in algorithms]
+    while True:
+        read = 0
+        for view in stream.views(chunk_size):
+            for algorithm, digest in hashes:
+                digest.update(view)
+            read += len(view)
+        if read == 0:
+            break
+    return dict((algorithm, digest.hexdigest())
+                for algorithm, digest in hashes)
+
+
+def stream_key(identity, extents, size):
+    ''' Key of a stream in a `DigestCache`: where it lies in which
+    version of which container file.
+    '''
+    key = hashlib.sha1(repr((tuple(identity), size)).encode('utf-8'))
+    for position, length in extents:
+        key.update(('%d:%d,' % (position, length)).encode('ascii'))
+    return key.hexdigest()
+
+
+class DigestCache(object):
+    ''' Stream digests by `stream_key`, optionally kept in a JSON file.
+
+    Digests computed since the cache was loaded are also kept in
+    `added`, so that workers can send back only those.
+    '''
+
+    def __init__(self, path=None):
+        self.path = path
+        self.entries = {}
+        self.added = {}
+        if path is not None and os.path.exists(path):
+            with open(path, 'rb') as f:
+                self.entries = json.loads(f.read().decode('utf-8'))
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key, algorithms):
+        ''' Cached digests of all `algorithms`, or None.
+        '''
+        digests = self.entries.get(key)
+        if digests is None:
+            return None
+        if any(algorithm not in digests for algorithm in algorithms):
+            return None
+        return dict((algorithm, digests[algorithm])
+                    for algorithm in algorithms)
+
+    def put(self, key, digests):
+        self.update({key: digests})
+
+    def update(self, entries):
+        for key, digests in entries.items():
+            merged = dict(self.entries.get(key, {}), **digests)
+            self.entries[key] = merged
+            self.added[key] = merged
+
+    def save(self):
+        if self.path is None:
+            return
+        temporary = self.path + '.tmp'
+        with open(temporary, 'wb') as f:
+            f.write(json.dumps(self.entries, sort_keys=True,
+                               ensure_ascii=True).encode('ascii'))
+        if os.path.exists(self.path) and os.name == 'nt':
+            os.remove(self.path)
+        os.rename(temporary, self.path)
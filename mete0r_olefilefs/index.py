@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+#
+#   mete0r.olefilefs : PyFilesystem interface to olefile
+#   Copyright (C) 2015 mete0r <mete0r@sarangbang.or.kr>
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU Lesser General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU Lesser General Public License for more details.
+#
+#   You should have received a copy of the GNU Lesser General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+from olefile import STGTY_ROOT
+from olefile import STGTY_STORAGE
+from olefile import STGTY_STREAM
+
+
+class Node(object):
+    ''' A storage or a stream in the directory index.
+    '''
+
+    __slots__ = ('segments', 'entry', '_children', '_names')
+
+    def __init__(self, segments, entry):
+        self.segments = segments
+        self.entry = entry
+        self._children = None
+        self._names = None
+
+    @property
+    def children(self):
+        ''' Child nodes of a storage, in entry order; None for a stream.
+        '''
+        if self._children is None and self.isdir:
+            self.expand()
+        return self._children
+
+    def child(self, name):
+        ''' Look up a child by name, ignoring case.
+
+        Until the storage is indexed, entries which can find a kid by name
+        themselves (those of a lazily read container) are asked to.
+        '''
+        if self._names is None:
+            if not self.isdir:
+                return None
+            findkid = getattr(self.entry, 'findkid', None)
+            if findkid is not None:
+                kid = findkid(name)
+                if kid is None:
+                    return None
+                return Node(self.segments + (kid.name,), kid)
+            self.expand()
+        return self._names.get(fold_name(name))
+
+    def expand(self):
+        ''' Index the children of a storage.
+        '''
+        children = []
+        names = {}
+        for kid in self.entry.kids:
+            child = Node(self.segments + (kid.name,), kid)
+            children.append(child)
+            names[fold_name(kid.name)] = child
+        self._names = names
+        self._children = children
+
+    @property
+    def isdir(self):
+        return self.entry.entry_type in (STGTY_STORAGE, STGTY_ROOT)
+
+    @property
+    def isfile(self):
+        return self.entry.entry_type == STGTY_STREAM
+
+
+class DirectoryIndex(object):
+    ''' The tree of storages and streams of an OLE container.
+
+    Each storage keeps its children both in order, for listing, and in a
+    case-folded name dict, so that resolving a path is one dict hit per
+    segment. The whole tree is indexed at once unless `eager` is False:
+    then a storage is indexed the first time it is looked into, which
+    reads only its own children out of a lazily read container.
+    '''
+
+    def __init__(self, root, eager=True):
+        self.root = node = Node((), root)
+        if not eager:
+            return
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            if node.isdir:
+                stack.extend(node.children)
+
+    def lookup(self, segments):
+        node = self.root
+        for segment in segments:
+            node = node.child(segment)
+            if node is None:
+                return None
+        return node
+
+
+def fold_name(name):
+    ''' Case-fold an entry name, the way olefile compares them.
+    '''
+    return name.lower()
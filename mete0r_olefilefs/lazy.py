@@ -0,0 +1,437 @@
+# -*- coding: utf-8 -*-
+#
+#   mete0r.olefilefs : PyFilesystem interface to olefile
+#   Copyright (C) 2015 mete0r <mete0r@sarangbang.or.kr>
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU Lesser General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU Lesser General Public License for more details.
+#
+#   You should have received a copy of the GNU Lesser General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+''' Read an OLE container on demand.
+
+`LazyOleFile` stands in for `olefile.OleFileIO` where OleFileFS uses it,
+but reads only the header when opened: FAT and MiniFAT pages, DIFAT
+sectors and directory entries are read the first time they are looked
+up, and kept.
+'''
+from __future__ import absolute_import
+from __future__ import unicode_literals
+from array import array
+from contextlib import contextmanager
+import datetime
+import os
+import struct
+import sys
+import threading
+
+from olefile import MAGIC
+from olefile import MAXREGSECT
+from olefile import NOSTREAM
+from olefile import STGTY_ROOT
+from olefile import STGTY_STORAGE
+from olefile import STGTY_STREAM
+
+from .source import FileSource
+
+
+HEADER_FORMAT = str('<8s16sHHHHHHIIIIIIIIII109I')
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+DIRENTRY_FORMAT = str('<64sHBBIII16sIQQIII')
+DIRENTRY_SIZE = 128
+# rough memory of a parsed directory entry
+DIRENTRY_MEMORY = 1024
+
+
+class LazyOleFile(object):
+    ''' The parts of `olefile.OleFileIO` which OleFileFS uses, read on
+    demand.
+
+    :param filename: path of the container file, or a seekable file
+        object (which the caller closes).
+
+    Reads go through `source`, which OleFileFS may point at its own.
+    Memory of the pages and entries read is charged to `budget`, if any,
+    and counted in `charged`; pages and entries read are counted in
+    `stats`, a `Stats`, if any.
+    '''
+
+    def __init__(self, filename):
+        if hasattr(filename, 'read'):
+            self.fp = filename
+            self._we_opened_fp = False
+        else:
+            self.fp = open(filename, 'rb')
+            self._we_opened_fp = True
+        try:
+            self._read_header()
+        except:
+            self.close()
+            raise
+        self.source = FileSource(self.fp)
+        self.budget = None
+        self.charged = 0
+        self.stats = None
+        self.lock = threading.RLock()
+        self._lock_depth = 0
+        self._uncharged = 0
+        self.fat = SectorTable(self, 'fat', self._fat_page_sector,
+                               self._fat_size)
+        self.minifat = SectorTable(self, 'minifat',
+                                   self._minifat_page_sector,
+                                   self._minifat_size)
+        self._difat = SectorChain(self, self._first_difat_sector,
+                                  next_sector=self._next_difat_sector)
+        self._minifat_chain = SectorChain(self, self._first_minifat_sector)
+        self._directory = SectorChain(self, self._first_dir_sector)
+        self._entries = {}
+
+    def _read_header(self):
+        self.fp.seek(0, os.SEEK_END)
+        filesize = self.fp.tell()
+        self.fp.seek(0)
+        header = self.fp.read(HEADER_SIZE)
+        if len(header) != HEADER_SIZE or header[:len(MAGIC)] != MAGIC:
+            raise IOError('not an OLE2 structured storage file')
+        fields = struct.unpack(HEADER_FORMAT, header)
+        (magic, clsid, minor_version, major_version, byte_order,
+         sector_shift, mini_sector_shift, reserved1, reserved2,
+         num_dir_sectors, num_fat_sectors, first_dir_sector,
+         transaction_signature, mini_stream_cutoff, first_minifat_sector,
+         num_minifat_sectors, first_difat_sector, num_difat_sectors) = \
+            fields[:18]
+        if byte_order != 0xFFFE or sector_shift not in (9, 12):
+            raise IOError('incorrect OLE header')
+        self.sectorsize = 1 << sector_shift
+        self.minisectorsize = 1 << mini_sector_shift
+        self.minisectorcutoff = mini_stream_cutoff
+        self._header_difat = fields[18:]
+        self._first_dir_sector = first_dir_sector
+        self._first_minifat_sector = first_minifat_sector
+        self._first_difat_sector = first_difat_sector
+        per_sector = self.sectorsize // 4
+        sectors = (filesize + self.sectorsize - 1) // self.sectorsize - 1
+        self._fat_size = min(num_fat_sectors * per_sector, sectors)
+        self._minifat_size = num_minifat_sectors * per_sector
+
+    def close(self):
+        if self._we_opened_fp:
+            self.fp.close()
+
+    def loadminifat(self):
+        ''' Nothing to do: MiniFAT pages are read as they are looked up.
+        '''
+
+    @property
+    def root(self):
+        return self.getentry(0)
+
+    def getentry(self, sid):
+        ''' The directory entry `sid`, read from its directory sector.
+        '''
+        entry = self._entries.get(sid)
+        if entry is None:
+            with self.locked():
+                entry = self._entries.get(sid)
+                if entry is None:
+                    entry = self._read_entry(sid)
+                    self._entries[sid] = entry
+                    self.charge(DIRENTRY_MEMORY)
+                    if self.stats is not None:
+                        self.stats.add('directory_entries_read')
+        return entry
+
+    def _read_entry(self, sid):
+        per_sector = self.sectorsize // DIRENTRY_SIZE
+        index, slot = divmod(sid, per_sector)
+        try:
+            sector = self._directory[index]
+        except IndexError:
+            raise IOError('OLE directory entry %d out of range' % sid)
+        data = self.readsector(sector)[slot * DIRENTRY_SIZE:
+                                       (slot + 1) * DIRENTRY_SIZE]
+        entry = DirectoryEntry(self, sid, data)
+        if (sid == 0) != (entry.entry_type == STGTY_ROOT):
+            raise IOError('incorrect OLE root entry')
+        return entry
+
+    def iterkids(self, sid):
+        ''' Yield the entries of the sibling tree rooted at `sid`.
+        '''
+        visited = set()
+        stack = [sid]
+        while stack:
+            sid = stack.pop()
+            if sid == NOSTREAM:
+                continue
+            if sid in visited:
+                raise IOError('OLE directory tree contains a loop')
+            visited.add(sid)
+            entry = self.getentry(sid)
+            if entry.entry_type in (STGTY_STORAGE, STGTY_STREAM):
+                yield entry
+            stack.append(entry.sid_left)
+            stack.append(entry.sid_right)
+
+    def findkid(self, sid, name):
+        ''' Find the entry named `name`, ignoring case, in the sibling tree
+        rooted at `sid`, or return None.
+
+        Descends the red-black tree, which [MS-CFB] orders by name length,
+        then by upper-cased name: only the entries on the way are read. As
+        some writers do not order it so, a miss looks at the children of
+        those entries too, and through every entry of the tree if any is
+        out of order.
+        '''
+        key = compare_key(name)
+        root = sid
+        path = []
+        visited = set()
+        while sid != NOSTREAM:
+            if sid in visited:
+                raise IOError('OLE directory tree contains a loop')
+            visited.add(sid)
+            entry = self.getentry(sid)
+            entry_key = compare_key(entry.name)
+            if key == entry_key:
+                if entry.entry_type in (STGTY_STORAGE, STGTY_STREAM):
+                    return entry
+                return None
+            path.append(entry)
+            if key < entry_key:
+                sid = entry.sid_left
+            else:
+                sid = entry.sid_right
+        if self._misordered(path):
+            for entry in self.iterkids(root):
+                if compare_key(entry.name) == key:
+                    return entry
+        return None
+
+    def _misordered(self, path):
+        ''' Whether a child of an entry of `path` is on the wrong side of
+        it.
+        '''
+        for entry in path:
+            entry_key = compare_key(entry.name)
+            for sid, left in ((entry.sid_left, True),
+                              (entry.sid_right, False)):
+                if sid == NOSTREAM:
+                    continue
+                kid_key = compare_key(self.getentry(sid).name)
+                if (kid_key < entry_key) != left:
+                    return True
+        return False
+
+    @contextmanager
+    def locked(self):
+        ''' Hold `lock`.
+
+        Memory charged meanwhile goes to `budget` only once the outermost
+        `locked()` has released the lock: the budget may call evictors,
+        which take locks of their own.
+        '''
+        with self.lock:
+            self._lock_depth += 1
+            try:
+                yield
+            finally:
+                self._lock_depth -= 1
+                uncharged = 0
+                if self._lock_depth == 0:
+                    uncharged, self._uncharged = self._uncharged, 0
+        if uncharged and self.budget is not None:
+            self.budget.charge('tables', uncharged)
+
+    def charge(self, size):
+        ''' Count `size` bytes read; call within `locked()`.
+        '''
+        self.charged += size
+        self._uncharged += size
+
+    def readsector(self, sector):
+        size = self.sectorsize
+        data = self.source.readat((sector + 1) * size, size)
+        if len(data) != size:
+            raise IOError('incomplete OLE sector')
+        return data
+
+    def readsector_ids(self, sector):
+        ids = array(str('I'))
+        data = self.readsector(sector)
+        if hasattr(ids, 'frombytes'):
+            ids.frombytes(data)
+        else:
+            ids.fromstring(data)
+        if sys.byteorder == 'big':
+            ids.byteswap()
+        return ids
+
+    def _fat_page_sector(self, page):
+        if page < len(self._header_difat):
+            return self._header_difat[page]
+        per_sector = self.sectorsize // 4 - 1
+        index, slot = divmod(page - len(self._header_difat), per_sector)
+        try:
+            return self.readsector_ids(self._difat[index])[slot]
+        except IndexError:
+            raise IOError('OLE FAT sector %d out of range' % page)
+
+    def _next_difat_sector(self, sector):
+        return self.readsector_ids(sector)[-1]
+
+    def _minifat_page_sector(self, page):
+        try:
+            return self._minifat_chain[page]
+        except IndexError:
+            raise IOError('OLE MiniFAT sector %d out of range' % page)
+
+
+class SectorChain(object):
+    ''' The sectors of a chain, followed only as far as they are asked
+    for.
+    '''
+
+    def __init__(self, olefile, start, next_sector=None):
+        self.olefile = olefile
+        self.sectors = []
+        self.following = start
+        if next_sector is None:
+            next_sector = self.next_in_fat
+        self.next_sector = next_sector
+
+    def __getitem__(self, index):
+        sectors = self.sectors
+        if index < len(sectors):
+            return sectors[index]
+        with self.olefile.locked():
+            while len(sectors) <= index:
+                sector = self.following
+                if sector > MAXREGSECT:
+                    raise IndexError(index)
+                if len(sectors) > len(self.olefile.fat):
+                    raise IOError('OLE sector chain contains a loop')
+                self.following = self.next_sector(sector)
+                sectors.append(sector)
+            return sectors[index]
+
+    def next_in_fat(self, sector):
+        fat = self.olefile.fat
+        if sector >= len(fat):
+            raise IOError('OLE sector index out of range')
+        return fat[sector]
+
+
+class SectorTable(object):
+    ''' A FAT or a MiniFAT, read a page (a sector of ids) at a time.
+
+    `page_sector` maps a page index to the sector holding it.
+    '''
+
+    def __init__(self, olefile, name, page_sector, size):
+        self.olefile = olefile
+        self.name = name
+        self.page_sector = page_sector
+        self.size = size
+        self.pages = {}
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, index):
+        if not 0 <= index < self.size:
+            raise IndexError(index)
+        page, slot = divmod(index, self.olefile.sectorsize // 4)
+        ids = self.pages.get(page)
+        if ids is None:
+            with self.olefile.locked():
+                ids = self.pages.get(page)
+                if ids is None:
+                    sector = self.page_sector(page)
+                    ids = self.olefile.readsector_ids(sector)
+                    self.pages[page] = ids
+                    self.olefile.charge(sys.getsizeof(ids))
+                    if self.olefile.stats is not None:
+                        self.olefile.stats.add(self.name + '_pages_read')
+        return ids[slot]
+
+
+class DirectoryEntry(object):
+    ''' A directory entry, with the attributes of
+    `olefile.OleDirectoryEntry` which OleFileFS uses.
+    '''
+
+    def __init__(self, olefile, sid, data):
+        (name, name_length, self.entry_type, self.color, self.sid_left,
+         self.sid_right, self.sid_child, clsid, self.dwUserFlags,
+         self.createTime, self.modifyTime, self.isectStart, size_low,
+         size_high) = struct.unpack(DIRENTRY_FORMAT, data)
+        name_length = min(name_length, 64)
+        self.olefile = olefile
+        self.sid = sid
+        self.name = name[:max(name_length - 2, 0)].decode('utf-16-le')
+        self.clsid = format_clsid(clsid)
+        if olefile.sectorsize == 512:
+            self.size = size_low
+        else:
+            self.size = size_low + (size_high << 32)
+        self._kids = None
+
+    def findkid(self, name):
+        ''' The child entry named `name`, ignoring case, or None.
+        '''
+        return self.olefile.findkid(self.sid_child, name)
+
+    @property
+    def kids(self):
+        ''' Child entries, sorted by name, read on first use.
+        '''
+        if self._kids is None:
+            kids = list(self.olefile.iterkids(self.sid_child))
+            kids.sort(key=lambda kid: kid.name)
+            self._kids = kids
+        return self._kids
+
+    def getctime(self):
+        return filetime_to_datetime(self.createTime)
+
+    def getmtime(self):
+        return filetime_to_datetime(self.modifyTime)
+
+
+def compare_key(name):
+    ''' Sort key of a name in a sibling tree: its length, then its
+    characters upper-cased one by one.
+    '''
+    return len(name), ''.join(upper_char(c) for c in name)
+
+
+def upper_char(c):
+    upper = c.upper()
+    if len(upper) != 1:
+        return c
+    return upper
+
+
+def format_clsid(clsid):
+    ''' Format a CLSID the way olefile does: '' if null.
+    '''
+    if not clsid.strip(b'\0'):
+        return ''
+    fields = struct.unpack(str('<IHH8B'), clsid)
+    return ('%08X-%04X-%04X-%02X%02X-' + '%02X' * 6) % fields
+
+
+def filetime_to_datetime(filetime):
+    if filetime == 0:
+        return None
+    return datetime.datetime(1601, 1, 1) + \
+        datetime.timedelta(microseconds=filetime // 10)
@@ -18,23 +18,93 @@
 #
 from __future__ import absolute_import
 from __future__ import unicode_literals
+import os
 import os.path
+import threading
 
 from fs.errors import ResourceNotFoundError
 from fs.errors import ResourceInvalidError
 from fs.opener import Opener as OpenerBase
 
+from .cache import LRUCache
 from .fs import OleFileFS
 
 
+class ContainerPool(object):
+    ''' Open filesystems of local containers, shared by the opens of their
+    URLs.
+
+    At most `max_open` containers are kept open, least recently used
+    first out. A pooled container is reopened once its size or mtime
+    changes. Every open takes a reference on the pooled filesystem, which
+    is closed once it has been evicted and every opener has closed it; one
+    closed by extra closes is reopened.
+    '''
+
+    def __init__(self, max_open=16, path_cache_size=1024):
+        self.lock = threading.Lock()
+        self.containers = LRUCache(max_open)
+        self.paths = LRUCache(path_cache_size)
+
+    def open(self, fs_path):
+        ''' Return (filesystem, path within it) if `fs_path` is within a
+        local container, None otherwise.
+        '''
+        with self.lock:
+            resolved = self.paths.get(fs_path)
+        if resolved is None:
+            resolved = split_container_path(fs_path)
+            if resolved is None:
+                return None
+        container, path = resolved
+        try:
+            stat = os.stat(container)
+        except OSError:
+            return None
+        version = stat.st_size, stat.st_mtime
+        with self.lock:
+            self.paths.put(fs_path, resolved)
+            pooled = self.containers.get(container)
+            # closed if a holder closed it more often than it opened it
+            if pooled is not None and pooled[0] == version and \
+                    not pooled[1].closed:
+                return pooled[1].acquire(), path
+        fs = OleFileFS(container, thread_safe=True)
+        with self.lock:
+            self._evict(container)
+            while len(self.containers) >= self.containers.capacity > 0:
+                self.containers.popitem()[1][1].close()
+            if self.containers.capacity > 0:
+                self.containers.put(container, (version, fs.acquire()))
+        return fs, path
+
+    def clear(self):
+        ''' Drop the references of the pool to its open containers.
+        '''
+        with self.lock:
+            while len(self.containers) > 0:
+                self.containers.popitem()[1][1].close()
+            self.paths.clear()
+
+    def _evict(self, container):
+        pooled = self.containers.pop(container)
+        if pooled is not None:
+            pooled[1].close()
+
+
 class Opener(OpenerBase):
 
     names = ['olefile']
     desc = 'syntax: olefile://<path-to-ole-file>'
 
+    pool = ContainerPool()
+
     @classmethod
     def get_fs(cls, registry, fs_name, fs_name_params, fs_path, writable,
                create_dir):
+        pooled = cls.pool.open(fs_path)
+        if pooled is not None:
+            return pooled
         mount = fs_path
         segments = []
         while True:
@@ -47,3 +117,19 @@ class Opener(OpenerBase):
                 continue
             else:
                 return OleFileFS(f), '/'.join(segments)
+
+
+def split_container_path(fs_path):
+    ''' Split a path into (absolute path of a local container file, path
+    within the container), or return None.
+    '''
+    mount = fs_path
+    segments = []
+    while mount:
+        if os.path.isfile(mount):
+            return os.path.abspath(mount), '/'.join(segments)
+        mount, name = os.path.split(mount)
+        if not name:
+            break
+        segments[0:0] = [name]
+    return None
@@ -0,0 +1,358 @@
+# -*- coding: utf-8 -*-
+#
+#   mete0r.olefilefs : PyFilesystem interface to olefile
+#   Copyright (C) 2015 mete0r <mete0r@sarangbang.or.kr>
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU Lesser General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU Lesser General Public License for more details.
+#
+#   You should have received a copy of the GNU Lesser General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+''' Property sets ([MS-OLEPS]), such as those of the SummaryInformation and
+DocumentSummaryInformation streams.
+'''
+from __future__ import absolute_import
+from __future__ import unicode_literals
+import base64
+import codecs
+import datetime
+import numbers
+import struct
+
+from .lazy import filetime_to_datetime
+from .lazy import format_clsid
+
+
+PROPERTY_SET_STREAMS = ('\x05SummaryInformation',
+                        '\x05DocumentSummaryInformation')
+
+FMTID_SUMMARY_INFORMATION = 'F29F85E0-4FF9-1068-AB91-08002B27B3D9'
+FMTID_DOC_SUMMARY_INFORMATION = 'D5CDD502-2E9C-101B-9397-08002B2CF9AE'
+FMTID_USER_DEFINED_PROPERTIES = 'D5CDD505-2E9C-101B-9397-08002B2CF9AE'
+
+PID_DICTIONARY = 0
+PID_CODEPAGE = 1
+PID_EDITTIME = 10
+CP_WINUNICODE = 1200
+
+COMMON_PROPERTY_NAMES = {
+    PID_CODEPAGE: 'codepage',
+    0x80000000: 'locale',
+    0x80000003: 'behavior',
+}
+
+PROPERTY_NAMES = {
+    FMTID_SUMMARY_INFORMATION: {
+        2: 'title',
+        3: 'subject',
+        4: 'author',
+        5: 'keywords',
+        6: 'comments',
+        7: 'template',
+        8: 'last_saved_by',
+        9: 'revision_number',
+        10: 'total_edit_time',
+        11: 'last_printed',
+        12: 'create_time',
+        13: 'last_saved_time',
+        14: 'num_pages',
+        15: 'num_words',
+        16: 'num_chars',
+        17: 'thumbnail',
+        18: 'creating_application',
+        19: 'security',
+    },
+    FMTID_DOC_SUMMARY_INFORMATION: {
+        2: 'category',
+        3: 'presentation_target',
+        4: 'bytes',
+        5: 'lines',
+        6: 'paragraphs',
+        7: 'slides',
+        8: 'notes',
+        9: 'hidden_slides',
+        10: 'mm_clips',
+        11: 'scale_crop',
+        12: 'heading_pairs',
+        13: 'titles_of_parts',
+        14: 'manager',
+        15: 'company',
+        16: 'links_dirty',
+        17: 'chars_with_spaces',
+        19: 'shared_doc',
+        20: 'link_base',
+        21: 'hlinks',
+        22: 'hlinks_changed',
+        23: 'version',
+        24: 'dig_sig',
+        26: 'content_type',
+        27: 'content_status',
+        28: 'language',
+        29: 'doc_version',
+    },
+}
+
+VT_EMPTY = 0
+VT_NULL = 1
+VT_BSTR = 8
+VT_VARIANT = 12
+VT_LPSTR = 30
+VT_LPWSTR = 31
+VT_FILETIME = 64
+VT_BLOB = 65
+VT_CF = 71
+VT_CLSID = 72
+VT_VECTOR = 0x1000
+
+VT_NAMES = {
+    0: 'VT_EMPTY', 1: 'VT_NULL', 2: 'VT_I2', 3: 'VT_I4', 4: 'VT_R4',
+    5: 'VT_R8', 6: 'VT_CY', 7: 'VT_DATE', 8: 'VT_BSTR', 10: 'VT_ERROR',
+    11: 'VT_BOOL', 12: 'VT_VARIANT', 16: 'VT_I1', 17: 'VT_UI1',
+    18: 'VT_UI2', 19: 'VT_UI4', 20: 'VT_I8', 21: 'VT_UI8', 22: 'VT_INT',
+    23: 'VT_UINT', 30: 'VT_LPSTR', 31: 'VT_LPWSTR', 64: 'VT_FILETIME',
+    65: 'VT_BLOB', 71: 'VT_CF', 72: 'VT_CLSID',
+}
+
+# fixed-size types: struct format
+SCALAR_FORMATS = {
+    2: '<h', 3: '<i', 4: '<f', 5: '<d', 6: '<q', 7: '<d', 10: '<I',
+    11: '<h', 16: '<b', 17: '<B', 18: '<H', 19: '<I', 20: '<q', 21: '<Q',
+    22: '<i', 23: '<I', 64: '<Q',
+}
+
+OLE_DATE_EPOCH = datetime.datetime(1899, 12, 30)
+
+# how deep VT_VARIANT vectors may nest within one another
+MAX_VECTOR_DEPTH = 8
+
+
+class PropertySet(object):
+    ''' The properties of a property set, identified by its FMTID.
+    '''
+
+    def __init__(self, fmtid, properties):
+        self.fmtid = fmtid
+        self.properties = properties
+
+
+class Property(object):
+    ''' A property: its id, its name (None if not known), its VT_* type
+    name (prefixed with 'VT_VECTOR|' for vectors) and its value.
+    '''
+
+    __slots__ = ('id', 'name', 'type', 'value')
+
+    def __init__(self, pid, name, type_name, value):
+        self.id = pid
+        self.name = name
+        self.type = type_name
+        self.value = value
+
+
+def parse_property_sets(data):
+    ''' Parse the property sets of a property set stream.
+
+    :raises ValueError: if the stream is not a valid property set stream.
+    '''
+    try:
+        (byte_order, version, system_identifier, clsid,
+         count) = struct.unpack_from(str('<HHI16sI'), data)
+        if byte_order != 0xFFFE:
+            raise ValueError('not a property set stream')
+        sets = []
+        for index in range(count):
+            fmtid, offset = struct.unpack_from(str('<16sI'), data,
+                                               28 + index * 20)
+            sets.append(parse_property_set(format_clsid(fmtid),
+                                           data, offset))
+        return sets
+    except struct.error as e:
+        raise ValueError('corrupt property set stream: %s' % e)
+
+
+def parse_property_set(fmtid, data, start):
+    size, count = struct.unpack_from(str('<II'), data, start)
+    section = data[start:start + size]
+    offsets = [struct.unpack_from(str('<II'), section, 8 + index * 8)
+               for index in range(count)]
+    codepage = None
+    for pid, offset in offsets:
+        if pid == PID_CODEPAGE:
+            codepage, = struct.unpack_from(str('<H'), section, offset + 4)
+            codepage = codepage_encoding(codepage)
+    names = dict(COMMON_PROPERTY_NAMES)
+    names.update(PROPERTY_NAMES.get(fmtid, {}))
+    for pid, offset in offsets:
+        if pid == PID_DICTIONARY:
+            names.update(parse_dictionary(section, offset, codepage))
+    properties = []
+    for pid, offset in offsets:
+        if pid == PID_DICTIONARY:
+            continue
+        vt, = struct.unpack_from(str('<H'), section, offset)
+        try:
+            value, end = read_typed_value(section, offset + 4, vt, codepage)
+        except UnsupportedType:
+            value = None
+        if (pid == PID_EDITTIME and vt == VT_FILETIME and
+                fmtid == FMTID_SUMMARY_INFORMATION):
+            # a duration, not a date
+            value = struct.unpack_from(str('<Q'), section,
+                                       offset + 4)[0] / 10000000.0
+        elif pid == PID_CODEPAGE and isinstance(value, numbers.Integral):
+            value = value & 0xFFFF
+        properties.append(Property(pid, names.get(pid), vt_name(vt), value))
+    return PropertySet(fmtid, properties)
+
+
+def parse_dictionary(section, offset, encoding):
+    count, = struct.unpack_from(str('<I'), section, offset)
+    position = offset + 4
+    names = {}
+    for _ in range(count):
+        pid, length = struct.unpack_from(str('<II'), section, position)
+        position += 8
+        if encoding == 'utf-16-le':
+            name = section[position:position + length * 2]
+            position = align(position + length * 2)
+        else:
+            name = section[position:position + length]
+            position += length
+        names[pid] = decode(name, encoding)
+    return names
+
+
+class UnsupportedType(ValueError):
+    pass
+
+
+def read_typed_value(data, position, vt, encoding, depth=0):
+    ''' Read a value of type `vt` at `position`.
+
+    :returns: (value, position after the value).
+    '''
+    if vt & VT_VECTOR:
+        if depth > MAX_VECTOR_DEPTH:
+            raise struct.error('vectors nested too deep')
+        count, = struct.unpack_from(str('<I'), data, position)
+        position += 4
+        # elements of VT_EMPTY or VT_NULL take no bytes
+        if count > len(data) - position:
+            raise struct.error('vector longer than its data')
+        values = []
+        for _ in range(count):
+            if vt & ~VT_VECTOR == VT_VARIANT:
+                element_vt, = struct.unpack_from(str('<H'), data, position)
+                value, position = read_typed_value(data, position + 4,
+                                                   element_vt, encoding,
+                                                   depth + 1)
+                position = align(position)
+            else:
+                value, position = read_value(data, position,
+                                             vt & ~VT_VECTOR, encoding)
+            values.append(value)
+        return values, position
+    return read_value(data, position, vt, encoding)
+
+
+def read_value(data, position, vt, encoding):
+    if vt in (VT_EMPTY, VT_NULL):
+        return None, position
+    scalar = SCALAR_FORMATS.get(vt)
+    if scalar is not None:
+        value, = struct.unpack_from(str(scalar), data, position)
+        end = position + struct.calcsize(str(scalar))
+        if vt == 6:
+            value = value / 10000.0
+        elif vt == 7:
+            try:
+                value = OLE_DATE_EPOCH + datetime.timedelta(days=value)
+            except (OverflowError, ValueError):
+                # out of the range of datetime: keep the number
+                pass
+        elif vt == 11:
+            value = value != 0
+        elif vt == VT_FILETIME:
+            try:
+                value = filetime_to_datetime(value)
+            except (OverflowError, ValueError):
+                pass
+        return value, end
+    if vt in (VT_BSTR, VT_LPSTR, VT_BLOB, VT_CF, VT_LPWSTR):
+        length, = struct.unpack_from(str('<I'), data, position)
+        position += 4
+        if vt == VT_LPWSTR:
+            raw = data[position:position + length * 2]
+            return decode(raw, 'utf-16-le'), align(position + length * 2)
+        raw = data[position:position + length]
+        if len(raw) != length:
+            raise struct.error('truncated value')
+        if vt in (VT_BLOB, VT_CF):
+            return bytes(raw), align(position + length)
+        return decode(raw, encoding), align(position + length)
+    if vt == VT_CLSID:
+        return format_clsid(bytes(data[position:position + 16])), \
+            position + 16
+    raise UnsupportedType(vt)
+
+
+def align(position):
+    return (position + 3) & ~3
+
+
+def vt_name(vt):
+    name = VT_NAMES.get(vt & ~VT_VECTOR, '0x%04X' % (vt & ~VT_VECTOR))
+    if vt & VT_VECTOR:
+        return 'VT_VECTOR|' + name
+    return name
+
+
+def codepage_encoding(codepage):
+    ''' The Python codec of a Windows code page, or None if unknown.
+    '''
+    if codepage == CP_WINUNICODE:
+        return 'utf-16-le'
+    if codepage == 65001:
+        return 'utf-8'
+    try:
+        return codecs.lookup('cp%d' % codepage).name
+    except LookupError:
+        return None
+
+
+def decode(raw, encoding):
+    text = bytes(raw).decode(encoding or 'latin-1', 'replace')
+    return text.split('\0', 1)[0]
+
+
+def property_set_json(property_set):
+    ''' A property set as a JSON-able dict: dates in ISO 8601, bytes in
+    base64.
+    '''
+    return {
+        'fmtid': property_set.fmtid,
+        'properties': [{
+            'id': prop.id,
+            'name': prop.name,
+            'type': prop.type,
+            'value': json_value(prop.value),
+        } for prop in property_set.properties],
+    }
+
+
+def json_value(value):
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    if isinstance(value, bytes):
+        return base64.b64encode(value).decode('ascii')
+    if isinstance(value, list):
+        return [json_value(item) for item in value]
+    return value
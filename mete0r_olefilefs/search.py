@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+#
+#   mete0r.olefilefs : PyFilesystem interface to olefile
+#   Copyright (C) 2015 mete0r <mete0r@sarangbang.or.kr>
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU Lesser General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU Lesser General Public License for more details.
+#
+#   You should have received a copy of the GNU Lesser General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+''' Search streams for many byte patterns at once.
+'''
+from __future__ import absolute_import
+from __future__ import unicode_literals
+import re
+
+from .hashing import DEFAULT_CHUNK_SIZE
+
+
+class Matcher(object):
+    ''' Find every occurrence of any of `patterns` (non-empty bytes) in
+    data fed chunk by chunk, including occurrences spanning chunks and
+    overlapping ones.
+
+    One regular expression finds where any pattern starts, in a single
+    pass over each chunk; the last `len(longest pattern) - 1` bytes are
+    kept and searched again along with the next chunk.
+    '''
+
+    def __init__(self, patterns):
+        patterns = [bytes(pattern) for pattern in patterns]
+        if not patterns or not all(patterns):
+            raise ValueError('patterns must be non-empty')
+        self.patterns = patterns
+        alternatives = sorted(set(patterns), key=len, reverse=True)
+        self.regex = re.compile(b'(?=' + b'|'.join(
+            re.escape(pattern) for pattern in alternatives) + b')')
+        self.overlap = max(len(pattern) for pattern in patterns) - 1
+        self.reset()
+
+    def reset(self):
+        ''' Start over, at offset 0.
+        '''
+        self.tail = b''
+        self.offset = 0
+
+    def feed(self, data):
+        ''' Yield (offset, index) of the occurrences of patterns[index]
+        which end within `data`: those found in the same call by offset
+        then index, but a short pattern may be reported before a longer
+        one starting at the same offset which ends in a later chunk.
+        '''
+        if isinstance(data, memoryview):
+            # re of Python 2 takes no memoryview, and bytes() of one gives
+            # its repr there
+            data = data.tobytes()
+        tail = self.tail
+        if tail:
+            data = tail + data
+        base = self.offset - len(tail)
+        patterns = self.patterns
+        for found in self.regex.finditer(data):
+            position = found.start()
+            for index, pattern in enumerate(patterns):
+                end = position + len(pattern)
+                # those ending within the tail were found before
+                if end > len(tail) and data[position:end] == pattern:
+                    yield base + position, index
+        self.offset = base + len(data)
+        if self.overlap:
+            self.tail = bytes(data[-self.overlap:])
+
+
+def search_stream(stream, matcher, chunk_size=DEFAULT_CHUNK_SIZE):
+    ''' Yield (offset, index) of the occurrences of the patterns of
+    `matcher` in the rest of an `OleStream`, read `chunk_size` bytes at a
+    time.
+    '''
+    matcher.reset()
+    while True:
+        read = 0
+        for view in stream.views(chunk_size):
+            for hit in matcher.feed(view):
+                yield hit
+            read += len(view)
+        if read == 0:
+            break
@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+#
+#   mete0r.olefilefs : PyFilesystem interface to olefile
+#   Copyright (C) 2015 mete0r <mete0r@sarangbang.or.kr>
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU Lesser General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU Lesser General Public License for more details.
+#
+#   You should have received a copy of the GNU Lesser General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+''' A read-only HTTP server of the streams of local containers.
+
+``GET /`` lists the containers, ``GET /<container>/<storage>`` lists a
+storage, both as JSON, and ``GET /<container>/<stream>`` serves a stream,
+honoring a single byte range (``Range: bytes=...``). ``HEAD`` gives the
+same headers. Containers are opened through a shared `ContainerPool`.
+'''
+from __future__ import absolute_import
+from __future__ import unicode_literals
+import json
+import logging
+import os
+
+try:
+    from http.server import BaseHTTPRequestHandler
+    from http.server import HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import unquote_to_bytes
+except ImportError:  # Python 2
+    from BaseHTTPServer import BaseHTTPRequestHandler
+    from BaseHTTPServer import HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urllib import unquote as unquote_to_bytes
+
+from fs.errors import FSError
+from fs.errors import ResourceInvalidError
+from fs.errors import ResourceNotFoundError
+from olefile import STGTY_STREAM
+
+from .extents import Extents
+from .opener import ContainerPool
+
+
+logger = logging.getLogger(__name__)
+
+
+COPY_CHUNK_SIZE = 64 * 1024
+
+
+class ContainerServer(ThreadingMixIn, HTTPServer):
+    ''' Serve `containers`, a dict of name -> path of a container file,
+    each request in its own thread.
+
+    :param pool: the `ContainerPool` of open containers.
+    :param use_sendfile: send runs of sectors straight from the container
+        file to the socket with `os.sendfile()`, where available.
+    '''
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, containers, pool=None, use_sendfile=True):
+        HTTPServer.__init__(self, address, ContainerRequestHandler)
+        self.containers = containers
+        self.pool = pool if pool is not None else ContainerPool()
+        self.use_sendfile = use_sendfile and hasattr(os, 'sendfile')
+
+    def resolve(self, url_path):
+        ''' Split a URL path into (container name, path within it), or
+        return None.
+        '''
+        url_path = url_path.split('?', 1)[0]
+        path = unquote_to_bytes(str(url_path)).decode('utf-8')
+        segments = [segment for segment in path.split('/') if segment]
+        for end in range(len(segments), 0, -1):
+            name = '/'.join(segments[:end])
+            if name in self.containers:
+                return name, '/' + '/'.join(segments[end:])
+        return None
+
+    def server_close(self):
+        HTTPServer.server_close(self)
+        self.pool.clear()
+
+
+class ContainerRequestHandler(BaseHTTPRequestHandler):
+
+    server_version = 'olefilefs'
+
+    def do_GET(self):
+        self.respond(send_body=True)
+
+    def do_HEAD(self):
+        self.respond(send_body=False)
+
+    def respond(self, send_body):
+        if self.path.split('?', 1)[0] in ('', '/'):
+            containers = sorted(self.server.containers.items())
+            listing = [{'name': name, 'type': 'container',
+                        'size': file_size(path)}
+                       for name, path in containers]
+            return self.send_json(listing, send_body)
+        try:
+            resolved = self.server.resolve(self.path)
+        except UnicodeDecodeError:
+            resolved = None
+        if resolved is None:
+            return self.send_error(404)
+        name, path = resolved
+        container = self.server.containers[name]
+        try:
+            pooled = self.server.pool.open(container)
+        except FSError as e:
+            logger.error('%s: %s', container, e)
+            return self.send_error(500)
+        if pooled is None:
+            return self.send_error(404)
+        fs = pooled[0]
+        try:
+            if fs.isdir(path):
+                listing = [dict(name=entry_name, **entry_json(info))
+                           for entry_name, info in fs.listdirinfo(path)]
+                return self.send_json(listing, send_body)
+            self.send_stream(container, fs, path, send_body)
+        except (ResourceNotFoundError, ResourceInvalidError):
+            self.send_error(404)
+        finally:
+            fs.close()
+
+    def send_json(self, value, send_body):
+        body = json.dumps(value, sort_keys=True).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if send_body:
+            self.wfile.write(body)
+
+    def send_stream(self, container, fs, path, send_body):
+        size = fs.getsize(path)
+        try:
+            byte_range = parse_range(self.headers.get('Range'), size)
+        except ValueError:
+            self.send_response(416)
+            self.send_header('Content-Range', 'bytes */%d' % size)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        if byte_range is None:
+            start, end = 0, size
+            self.send_response(200)
+        else:
+            start, end = byte_range
+            self.send_response(206)
+            self.send_header('Content-Range',
+                             'bytes %d-%d/%d' % (start, end - 1, size))
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Length', str(end - start))
+        self.send_header('Accept-Ranges', 'bytes')
+        self.end_headers()
+        if not send_body or start == end:
+            return
+        if self.server.use_sendfile:
+            runs = Extents(fs.getextents(path)).runs(start, end - start)
+            self.wfile.flush()
+            with open(container, 'rb') as f:
+                for position, length in runs:
+                    sendfile_all(self.connection.fileno(), f.fileno(),
+                                 position, length)
+            return
+        with fs.open(path, buffering=0) as f:
+            f.seek(start)
+            copy_exactly(f, self.wfile, end - start)
+
+    def log_message(self, format, *args):
+        logger.info('%s %s', self.address_string(), format % args)
+
+
+def parse_range(header, size):
+    ''' Parse a `Range` header into (start, end), or None to serve the
+    whole stream (no header, or a malformed one or several ranges, which
+    may be ignored).
+
+    :raises ValueError: if the range is not satisfiable.
+    '''
+    if not header:
+        return None
+    unit, _, spec = header.partition('=')
+    if unit.strip() != 'bytes' or ',' in spec:
+        return None
+    first, sep, last = spec.strip().partition('-')
+    if not sep or not (first or last):
+        return None
+    if not all(part.isdigit() for part in (first, last) if part):
+        return None
+    if not first:
+        length = int(last)
+        if length == 0 or size == 0:
+            raise ValueError('range not satisfiable')
+        return max(size - length, 0), size
+    start = int(first)
+    if last and int(last) < start:
+        return None
+    if start >= size:
+        raise ValueError('range not satisfiable')
+    end = size if not last else min(int(last) + 1, size)
+    return start, end
+
+
+def entry_json(info):
+    ''' The JSON description of an entry, out of its info dict.
+    '''
+    if info['storage_type'] == STGTY_STREAM:
+        return {'type': 'stream', 'size': info['size']}
+    return {'type': 'storage'}
+
+
+def file_size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return None
+
+
+def sendfile_all(out_fd, in_fd, offset, count):
+    while count > 0:
+        sent = os.sendfile(out_fd, in_fd, offset, count)
+        if sent == 0:
+            raise IOError('unexpected end of container file')
+        offset += sent
+        count -= sent
+
+
+def copy_exactly(source, destination, count):
+    while count > 0:
+        data = source.read(min(count, COPY_CHUNK_SIZE))
+        if not data:
+            raise IOError('unexpected end of stream')
+        destination.write(data)
+        count -= len(data)
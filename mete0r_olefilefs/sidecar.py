@@ -0,0 +1,271 @@
+# -*- coding: utf-8 -*-
+#
+#   mete0r.olefilefs : PyFilesystem interface to olefile
+#   Copyright (C) 2015 mete0r <mete0r@sarangbang.or.kr>
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU Lesser General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU Lesser General Public License for more details.
+#
+#   You should have received a copy of the GNU Lesser General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+''' Persistent index of a container: its directory tree and the extents of
+its streams, kept in a small binary file so that reopening the unchanged
+container skips parsing its FAT, MiniFAT and directory.
+
+An index is keyed by the absolute path of the container, and valid while
+the container keeps its size, its mtime and the checksum of its header
+and first directory sector.
+'''
+from __future__ import absolute_import
+from __future__ import unicode_literals
+import hashlib
+import logging
+import os
+import os.path
+import struct
+
+from olefile import STGTY_STREAM
+
+from .extents import Extents
+from .lazy import filetime_to_datetime
+
+
+logger = logging.getLogger(__name__)
+
+
+INDEX_MAGIC = b'OLEFSIDX'
+INDEX_VERSION = 1
+INDEX_SUFFIX = '.olefsidx'
+
+# magic, version, size, mtime, checksum, sectorsize, minisectorsize,
+# minisectorcutoff, number of entries
+INDEX_HEADER = struct.Struct(str('<8sHQd20sIIII'))
+# sid, entry type, user flags, size, creation and modification FILETIMEs,
+# lengths of the CLSID and of the name
+ENTRY_HEADER = struct.Struct(str('<IBIQQQBH'))
+COUNT = struct.Struct(str('<I'))
+EXTENT = struct.Struct(str('<QQ'))
+NO_EXTENTS = 0xFFFFFFFF
+
+
+def index_path(directory, path):
+    ''' Path of the index of the container at `path`, in `directory`.
+    '''
+    name = hashlib.sha1(os.path.abspath(path).encode('utf-8')).hexdigest()
+    return os.path.join(directory, name + INDEX_SUFFIX)
+
+
+def container_checksum(fp):
+    ''' Checksum of the header and the first directory sector of a
+    container, read from the file object `fp`.
+    '''
+    fp.seek(0)
+    header = fp.read(512)
+    if len(header) < 512:
+        raise IOError('not an OLE2 structured storage file')
+    sector_shift, = struct.unpack(str('<H'), header[30:32])
+    first_dir_sector, = struct.unpack(str('<I'), header[48:52])
+    sector_size = 1 << min(sector_shift, 16)
+    fp.seek((first_dir_sector + 1) * sector_size)
+    return hashlib.sha1(header + fp.read(sector_size)).digest()
+
+
+class ContainerIndex(object):
+    ''' The directory entries of a container, by sid, and the extents of
+    its streams, within the container (`extents`) and within the mini
+    stream for small streams (`mini_extents`).
+    '''
+
+    def __init__(self, sectorsize, minisectorsize, minisectorcutoff,
+                 entries, extents, mini_extents):
+        self.sectorsize = sectorsize
+        self.minisectorsize = minisectorsize
+        self.minisectorcutoff = minisectorcutoff
+        self.entries = entries
+        self.extents = extents
+        self.mini_extents = mini_extents
+
+
+class IndexedEntry(object):
+    ''' A directory entry out of an index, with the attributes of
+    `olefile.OleDirectoryEntry` which OleFileFS uses.
+    '''
+
+    def __init__(self, sid, name, entry_type, size, clsid, dwUserFlags,
+                 createTime, modifyTime):
+        self.sid = sid
+        self.name = name
+        self.entry_type = entry_type
+        self.size = size
+        self.clsid = clsid
+        self.dwUserFlags = dwUserFlags
+        self.createTime = createTime
+        self.modifyTime = modifyTime
+        self.kids = []
+
+    def getctime(self):
+        return filetime_to_datetime(self.createTime)
+
+    def getmtime(self):
+        return filetime_to_datetime(self.modifyTime)
+
+
+class IndexedOleFile(object):
+    ''' The parts of `olefile.OleFileIO` which OleFileFS uses, out of a
+    `ContainerIndex`; `fp` is the container, which the caller closes.
+    '''
+
+    def __init__(self, fp, index):
+        self.fp = fp
+        self.sectorsize = index.sectorsize
+        self.minisectorsize = index.minisectorsize
+        self.minisectorcutoff = index.minisectorcutoff
+        self.root = index.entries[0]
+
+    def loadminifat(self):
+        ''' Nothing to do: extents are in the index.
+        '''
+
+    def close(self):
+        pass
+
+
+def load_index(directory, path, fp):
+    ''' The index of the container at `path`, opened as `fp`, if one was
+    saved in `directory` and is still valid; None otherwise.
+    '''
+    try:
+        with open(index_path(directory, path), 'rb') as f:
+            data = f.read()
+    except (IOError, OSError):
+        return None
+    try:
+        stat = os.stat(path)
+        (magic, version, size, mtime, checksum, sectorsize, minisectorsize,
+         minisectorcutoff, count) = INDEX_HEADER.unpack_from(data)
+        if magic != INDEX_MAGIC or version != INDEX_VERSION:
+            return None
+        if (size, mtime) != (stat.st_size, stat.st_mtime):
+            return None
+        if checksum != container_checksum(fp):
+            return None
+        entries, extents, mini_extents = unpack_entries(
+            data, INDEX_HEADER.size, count)
+    except (IOError, OSError, struct.error, UnicodeDecodeError,
+            KeyError) as e:
+        logger.debug('%s: invalid index: %s', path, e)
+        return None
+    return ContainerIndex(sectorsize, minisectorsize, minisectorcutoff,
+                          entries, extents, mini_extents)
+
+
+def save_index(directory, path, fp, olefile, root, extents, mini_extents):
+    ''' Save the index of the container at `path`, opened as `fp`, into
+    `directory`.
+
+    :param root: the root entry; its descendants are indexed.
+    :param extents: a dict of sid -> `Extents` of every stream, and of the
+        root entry (the mini stream).
+    :param mini_extents: a dict of sid -> `Extents` of the small streams
+        within the mini stream.
+    '''
+    stat = os.stat(path)
+    entries = list(iter_entries(root))
+    chunks = [INDEX_HEADER.pack(
+        INDEX_MAGIC, INDEX_VERSION, stat.st_size, stat.st_mtime,
+        container_checksum(fp), olefile.sectorsize, olefile.minisectorsize,
+        olefile.minisectorcutoff, len(entries))]
+    for entry in entries:
+        chunks.extend(pack_entry(entry, extents.get(entry.sid),
+                                 mini_extents.get(entry.sid)))
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    target = index_path(directory, path)
+    temporary = '%s.%d.tmp' % (target, os.getpid())
+    with open(temporary, 'wb') as f:
+        f.write(b''.join(chunks))
+    if os.path.exists(target) and os.name == 'nt':
+        os.remove(target)
+    os.rename(temporary, target)
+
+
+def iter_entries(root):
+    ''' The root entry and its descendants, parents first.
+    '''
+    stack = [root]
+    while stack:
+        entry = stack.pop()
+        yield entry
+        if entry.entry_type != STGTY_STREAM:
+            stack.extend(reversed(entry.kids))
+
+
+def pack_entry(entry, extents, mini_extents):
+    name = entry.name.encode('utf-16-le')
+    clsid = (entry.clsid or '').encode('ascii')
+    yield ENTRY_HEADER.pack(entry.sid, entry.entry_type, entry.dwUserFlags,
+                            entry.size, entry.createTime, entry.modifyTime,
+                            len(clsid), len(name))
+    yield clsid
+    yield name
+    if entry.entry_type == STGTY_STREAM:
+        yield COUNT.pack(0)
+    else:
+        yield COUNT.pack(len(entry.kids))
+        for kid in entry.kids:
+            yield COUNT.pack(kid.sid)
+    for ranges in extents, mini_extents:
+        if ranges is None:
+            yield COUNT.pack(NO_EXTENTS)
+            continue
+        yield COUNT.pack(len(ranges))
+        for position, length in ranges:
+            yield EXTENT.pack(position, length)
+
+
+def unpack_entries(data, offset, count):
+    entries = {}
+    kid_sids = {}
+    extents = {}
+    mini_extents = {}
+    for _ in range(count):
+        (sid, entry_type, user_flags, size, ctime, mtime, clsid_length,
+         name_length) = ENTRY_HEADER.unpack_from(data, offset)
+        offset += ENTRY_HEADER.size
+        clsid = data[offset:offset + clsid_length].decode('ascii')
+        offset += clsid_length
+        name = data[offset:offset + name_length].decode('utf-16-le')
+        offset += name_length
+        entries[sid] = IndexedEntry(sid, name, entry_type, size, clsid,
+                                    user_flags, ctime, mtime)
+        kids, offset = unpack_counted(data, offset, COUNT)
+        kid_sids[sid] = [kid for kid, in kids]
+        for found in extents, mini_extents:
+            ranges, offset = unpack_counted(data, offset, EXTENT)
+            if ranges is not None:
+                found[sid] = Extents(ranges)
+    if offset != len(data):
+        raise IOError('trailing data')
+    for sid, kids in kid_sids.items():
+        entries[sid].kids = [entries[kid] for kid in kids]
+    return entries, extents, mini_extents
+
+
+def unpack_counted(data, offset, item):
+    ''' Unpack a count, then as many `item`s; None for NO_EXTENTS.
+    '''
+    count, = COUNT.unpack_from(data, offset)
+    offset += COUNT.size
+    if count == NO_EXTENTS:
+        return None, offset
+    items = [item.unpack_from(data, offset + index * item.size)
+             for index in range(count)]
+    return items, offset + count * item.size
@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+#
+#   mete0r.olefilefs : PyFilesystem interface to olefile
+#   Copyright (C) 2015 mete0r <mete0r@sarangbang.or.kr>
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU Lesser General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU Lesser General Public License for more details.
+#
+#   You should have received a copy of the GNU Lesser General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+from __future__ import absolute_import
+from __future__ import unicode_literals
+import os
+import threading
+
+
+class FileSource(object):
+    ''' Read byte ranges of an OLE container from a seekable file object.
+    '''
+
+    def __init__(self, fp):
+        self.fp = fp
+
+    def readat(self, offset, size):
+        self.fp.seek(offset)
+        return self.fp.read(size)
+
+    def readinto(self, offset, buffer):
+        self.fp.seek(offset)
+        readinto = getattr(self.fp, 'readinto', None)
+        if readinto is None:
+            data = self.fp.read(len(buffer))
+            buffer[:len(data)] = data
+            return len(data)
+        return readinto(buffer)
+
+    def views(self, offset, size):
+        yield memoryview(self.readat(offset, size))
+
+    def close(self):
+        pass
+
+
+class MmapSource(object):
+    ''' Serve byte ranges of a memory-mapped OLE container without copying.
+
+    On Python 2, where a mapping offers no buffer to `memoryview`, byte
+    ranges are copied out of it.
+    '''
+
+    def __init__(self, mapped):
+        self.mapped = mapped
+        try:
+            self.view = memoryview(mapped)
+        except TypeError:
+            self.view = None
+
+    def readat(self, offset, size):
+        if self.view is None:
+            return self.mapped[offset:offset + size]
+        return self.view[offset:offset + size].tobytes()
+
+    def readinto(self, offset, buffer):
+        if self.view is None:
+            data = self.mapped[offset:offset + len(buffer)]
+        else:
+            data = self.view[offset:offset + len(buffer)]
+        size = len(data)
+        buffer[:size] = data
+        return size
+
+    def views(self, offset, size):
+        if self.view is None:
+            yield memoryview(self.readat(offset, size))
+        else:
+            yield self.view[offset:offset + size]
+
+    def close(self):
+        if self.view is None:
+            self.mapped.close()
+            return
+        self.view.release()
+        try:
+            self.mapped.close()
+        except BufferError:
+            # views handed out are still alive; the mapping goes with them.
+            pass
+
+
+class PreadSource(object):
+    ''' Read byte ranges of an OLE container with positional I/O.
+
+    Reads never move a shared file position, so any number of threads
+    may read through the same descriptor at once.
+    '''
+
+    def __init__(self, fd):
+        self.fd = fd
+
+    def readat(self, offset, size):
+        chunks = []
+        while size > 0:
+            data = os.pread(self.fd, size, offset)
+            if not data:
+                break
+            chunks.append(data)
+            offset += len(data)
+            size -= len(data)
+        return b''.join(chunks)
+
+    def readinto(self, offset, buffer):
+        preadv = getattr(os, 'preadv', None)
+        if preadv is None:
+            data = self.readat(offset, len(buffer))
+            buffer[:len(data)] = data
+            return len(data)
+        buffer = memoryview(buffer)
+        filled = 0
+        while filled < len(buffer):
+            size = preadv(self.fd, [buffer[filled:]], offset + filled)
+            if size == 0:
+                break
+            filled += size
+        return filled
+
+    def views(self, offset, size):
+        yield memoryview(self.readat(offset, size))
+
+    def close(self):
+        pass
+
+
+class LockedSource(object):
+    ''' Serialize the reads of a source which shares a file position.
+    '''
+
+    def __init__(self, source):
+        self.source = source
+        self.lock = threading.Lock()
+
+    def readat(self, offset, size):
+        with self.lock:
+            return self.source.readat(offset, size)
+
+    def readinto(self, offset, buffer):
+        with self.lock:
+            return self.source.readinto(offset, buffer)
+
+    def views(self, offset, size):
+        yield memoryview(self.readat(offset, size))
+
+    def close(self):
+        self.source.close()
+
+
+class CachedSource(object):
+    ''' Serve byte ranges of a source out of an LRU cache of its blocks.
+
+    Each block of `block_size` bytes is read from `source` once, then kept
+    in `cache` (an `LRUCache` weighing blocks by their length) until it is
+    evicted. `lock` guards the cache when it is shared between threads.
+    Blocks are kept only if `budget`, a `MemoryBudget`, has room for
+    them; the cache releases them from the budget as it evicts them.
+    Hits and misses are counted in `stats`, a `Stats`, if any.
+    '''
+
+    def __init__(self, source, size, cache, block_size, lock, budget=None,
+                 stats=None):
+        self.source = source
+        self.size = size
+        self.cache = cache
+        self.block_size = block_size
+        self.lock = lock
+        self.budget = budget
+        self.stats = stats
+
+    def readat(self, offset, size):
+        return b''.join(view.tobytes() for view in self.views(offset, size))
+
+    def readinto(self, offset, buffer):
+        filled = 0
+        for view in self.views(offset, len(buffer)):
+            buffer[filled:filled + len(view)] = view
+            filled += len(view)
+        return filled
+
+    def views(self, offset, size):
+        end = min(offset + size, self.size)
+        while offset < end:
+            index, skip = divmod(offset, self.block_size)
+            block = self.block(index)
+            view = memoryview(block)[skip:skip + end - offset]
+            if len(view) == 0:
+                return
+            yield view
+            offset += len(view)
+
+    def block(self, index):
+        with self.lock:
+            block = self.cache.get(index)
+        if self.stats is not None:
+            self.stats.hit('ministream_cache', block is not None)
+        if block is None:
+            position = index * self.block_size
+            size = min(self.block_size, self.size - position)
+            block = self.source.readat(position, size)
+            if len(block) > self.cache.capacity:
+                return block
+            if self.budget is None or self.budget.reserve('ministream',
+                                                          len(block)):
+                with self.lock:
+                    self.cache.put(index, block)
+        return block
+
+    def close(self):
+        with self.lock:
+            self.cache.clear()
+
+
+def threadsafe_source(fp):
+    ''' A source safe to read from many threads: positional reads on the
+    file descriptor where there is one, locked reads otherwise.
+    '''
+    if hasattr(os, 'pread'):
+        try:
+            fd = fp.fileno()
+        except (AttributeError, IOError, ValueError):
+            pass
+        else:
+            return PreadSource(fd)
+    return LockedSource(FileSource(fp))
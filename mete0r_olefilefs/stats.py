@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+#
+#   mete0r.olefilefs : PyFilesystem interface to olefile
+#   Copyright (C) 2015 mete0r <mete0r@sarangbang.or.kr>
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU Lesser General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU Lesser General Public License for more details.
+#
+#   You should have received a copy of the GNU Lesser General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+''' Counters of what OleFileFS instances do: I/O, caches and time.
+
+Every instrumented OleFileFS (see its `instrument` parameter) counts into
+its own `Stats`, whose counts also add up in `process_stats`.
+'''
+from __future__ import absolute_import
+from __future__ import unicode_literals
+import functools
+import threading
+import timeit
+
+
+class Stats(object):
+    ''' Counters by name, also added to a `parent` and passed on to a
+    `callback(name, value)`, e.g. to feed a metrics system.
+    '''
+
+    def __init__(self, parent=None, callback=None):
+        self.parent = parent
+        self.callback = callback
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def add(self, name, value=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+        if self.callback is not None:
+            self.callback(name, value)
+        if self.parent is not None:
+            self.parent.add(name, value)
+
+    def hit(self, cache, hit):
+        self.add(cache + ('.hits' if hit else '.misses'))
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._counters)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+
+
+process_stats = Stats()
+
+
+class CountingSource(object):
+    ''' Count the reads of a source of `sector_size` byte sectors: each
+    one issues `syscalls` system calls, of which `seeks` seeks.
+    '''
+
+    def __init__(self, source, stats, sector_size, syscalls=1, seeks=0):
+        self.source = source
+        self.stats = stats
+        self.sector_size = sector_size
+        self.syscalls = syscalls
+        self.seeks = seeks
+
+    def readat(self, offset, size):
+        data = self.source.readat(offset, size)
+        self.count(offset, len(data))
+        return data
+
+    def readinto(self, offset, buffer):
+        size = self.source.readinto(offset, buffer)
+        self.count(offset, size)
+        return size
+
+    def views(self, offset, size):
+        for view in self.source.views(offset, size):
+            self.count(offset, len(view))
+            offset += len(view)
+            yield view
+
+    def count(self, offset, size):
+        stats = self.stats
+        stats.add('reads')
+        stats.add('bytes_read', size)
+        stats.add('sectors_read', sectors_spanned(offset, size,
+                                                  self.sector_size))
+        if self.syscalls:
+            stats.add('syscalls', self.syscalls)
+        if self.seeks:
+            stats.add('seeks', self.seeks)
+
+    def close(self):
+        self.source.close()
+
+
+class CountingFile(object):
+    ''' Count the reads and seeks through a file object of `sector_size`
+    byte sectors.
+    '''
+
+    def __init__(self, fp, stats, sector_size=512):
+        self.fp = fp
+        self.stats = stats
+        self.sector_size = sector_size
+
+    def read(self, size=-1):
+        offset = self.fp.tell()
+        data = self.fp.read(size)
+        self.count(offset, len(data))
+        return data
+
+    def readinto(self, buffer):
+        offset = self.fp.tell()
+        size = self.fp.readinto(buffer)
+        self.count(offset, size)
+        return size
+
+    def seek(self, offset, whence=0):
+        self.stats.add('syscalls')
+        self.stats.add('seeks')
+        return self.fp.seek(offset, whence)
+
+    def tell(self):
+        return self.fp.tell()
+
+    def fileno(self):
+        return self.fp.fileno()
+
+    @property
+    def closed(self):
+        return self.fp.closed
+
+    def close(self):
+        self.fp.close()
+
+    def count(self, offset, size):
+        stats = self.stats
+        stats.add('reads')
+        stats.add('syscalls')
+        stats.add('bytes_read', size)
+        stats.add('sectors_read', sectors_spanned(offset, size,
+                                                  self.sector_size))
+
+
+def sectors_spanned(offset, size, sector_size):
+    ''' Number of sectors which bytes [offset, offset + size) touch.
+    '''
+    if size <= 0:
+        return 0
+    return (offset + size - 1) // sector_size - offset // sector_size + 1
+
+
+def timed(name):
+    ''' Count calls of a method of an instrumented object, and the time
+    spent in them, as 'calls.<name>' and 'time.<name>' (seconds).
+
+    For generator methods, use `timed_generator`.
+    '''
+    def decorate(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            stats = self._stats
+            if stats is None:
+                return method(self, *args, **kwargs)
+            stats.add('calls.' + name)
+            started = timeit.default_timer()
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                stats.add('time.' + name, timeit.default_timer() - started)
+        return wrapper
+    return decorate
+
+
+def timed_generator(name):
+    ''' Like `timed`, for generator methods.
+    '''
+    def decorate(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            stats = self._stats
+            if stats is None:
+                for item in method(self, *args, **kwargs):
+                    yield item
+                return
+            stats.add('calls.' + name)
+            elapsed = 0
+            started = timeit.default_timer()
+            try:
+                for item in method(self, *args, **kwargs):
+                    elapsed += timeit.default_timer() - started
+                    yield item
+                    started = timeit.default_timer()
+                elapsed += timeit.default_timer() - started
+            finally:
+                stats.add('time.' + name, elapsed)
+        return wrapper
+    return decorate
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+#
+#   mete0r.olefilefs : PyFilesystem interface to olefile
+#   Copyright (C) 2015 mete0r <mete0r@sarangbang.or.kr>
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU Lesser General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU Lesser General Public License for more details.
+#
+#   You should have received a copy of the GNU Lesser General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+from __future__ import absolute_import
+from __future__ import unicode_literals
+import io
+import os
+
+
+class ExtentSource(object):
+    ''' Read byte ranges of a stream out of the source holding its extents.
+    '''
+
+    def __init__(self, source, extents):
+        self.source = source
+        self.extents = extents
+
+    def readat(self, offset, size):
+        chunks = []
+        for position, length in self.extents.runs(offset, size):
+            data = self.source.readat(position, length)
+            if len(data) != length:
+                raise IOError('incomplete OLE sector')
+            chunks.append(data)
+        return b''.join(chunks)
+
+    def readinto(self, offset, buffer):
+        filled = 0
+        for position, length in self.extents.runs(offset, len(buffer)):
+            target = buffer[filled:filled + length]
+            if self.source.readinto(position, target) != length:
+                raise IOError('incomplete OLE sector')
+            filled += length
+        return filled
+
+    def views(self, offset, size):
+        for position, length in self.extents.runs(offset, size):
+            for view in self.source.views(position, length):
+                length -= len(view)
+                yield view
+            if length != 0:
+                raise IOError('incomplete OLE sector')
+
+    def close(self):
+        ''' Nothing to release: `source` belongs to whoever opened it.
+        '''
+
+
+class BudgetedReader(io.BufferedReader):
+    ''' A buffered reader whose buffer is reserved in a `MemoryBudget`,
+    and released when it is closed.
+    '''
+
+    def __init__(self, raw, buffer_size, budget):
+        io.BufferedReader.__init__(self, raw, buffer_size)
+        self._budget = budget
+        self._reserved = buffer_size
+
+    def close(self):
+        try:
+            io.BufferedReader.close(self)
+        finally:
+            if self._reserved:
+                self._budget.release('buffers', self._reserved)
+                self._reserved = 0
+
+
+class OleStream(io.RawIOBase):
+    ''' Seekable, read-only view of an OLE stream.
+
+    Nothing is read until asked for, and then only the extents which
+    hold the requested bytes, one read per extent.
+    '''
+
+    def __init__(self, source, size):
+        io.RawIOBase.__init__(self)
+        self._source = source
+        self._position = 0
+        self.size = size
+
+    @property
+    def source(self):
+        ''' The source of the stream contents, positioned from the start
+        of the stream.
+        '''
+        return self._source
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_SET:
+            position = offset
+        elif whence == os.SEEK_CUR:
+            position = self._position + offset
+        elif whence == os.SEEK_END:
+            position = self.size + offset
+        else:
+            raise ValueError('invalid whence: %r' % (whence,))
+        if position < 0:
+            raise IOError('negative seek position %d' % (position,))
+        self._position = position
+        return position
+
+    def readinto(self, b):
+        self._checkClosed()
+        size = min(len(b), self.size - self._position)
+        if size <= 0:
+            return 0
+        target = memoryview(b)[:size]
+        self._source.readinto(self._position, target)
+        self._position += size
+        return size
+
+    def views(self, size=-1):
+        ''' Yield the next `size` bytes, or up to the end, as memoryviews
+        of contiguous runs of the container.
+
+        On a memory-mapped container the views are slices of the mapping
+        itself; nothing is copied.
+        '''
+        self._checkClosed()
+        end = self.size
+        if size >= 0:
+            end = min(end, self._position + size)
+        if end <= self._position:
+            return
+        for view in self._source.views(self._position, end - self._position):
+            self._position += len(view)
+            yield view
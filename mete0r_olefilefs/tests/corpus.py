@@ -0,0 +1,325 @@
+# -*- coding: utf-8 -*-
+#
+#   mete0r.olefilefs : PyFilesystem interface to olefile
+#   Copyright (C) 2015 mete0r <mete0r@sarangbang.or.kr>
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU Lesser General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU Lesser General Public License for more details.
+#
+#   You should have received a copy of the GNU Lesser General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+''' Synthetic OLE containers, for tests and benchmarks.
+
+A container is described as a tree of dicts: a dict value is a storage,
+a bytes value is a stream. `write_container` lays it out as a compound
+file, version 3 (512-byte sectors) or 4 (4096-byte sectors), optionally
+scattering sectors so that chains are fragmented.
+'''
+from __future__ import absolute_import
+from __future__ import unicode_literals
+from array import array
+import random
+import struct
+import sys
+
+
+MAGIC = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'
+DIFSECT = 0xFFFFFFFC
+FATSECT = 0xFFFFFFFD
+ENDOFCHAIN = 0xFFFFFFFE
+FREESECT = 0xFFFFFFFF
+NOSTREAM = 0xFFFFFFFF
+
+STGTY_STORAGE = 1
+STGTY_STREAM = 2
+STGTY_ROOT = 5
+
+MINI_SECTOR_SIZE = 64
+MINI_STREAM_CUTOFF = 4096
+
+HEADER_FORMAT = '<8s16sHHHHHHIIIIIIIIII'
+DIRENTRY_FORMAT = '<64sHBBIII16sIQQIII'
+
+
+def write_container(fp, tree, version=3, fragment=False, seed=0,
+                    timestamp=0, sibling_key=None):
+    ''' Write `tree` to `fp` as an OLE compound file.
+
+    :param tree: dict of name -> bytes (stream) or dict (storage).
+    :param version: 3 for 512-byte sectors, 4 for 4096-byte sectors.
+    :param fragment: scatter sectors in short runs all over the file.
+    :param seed: seed of the fragmentation.
+    :param timestamp: FILETIME of storages.
+    :param sibling_key: order sibling trees by this key of the names
+        instead of [MS-CFB]'s, as some writers do.
+    '''
+    sector_size = 512 if version == 3 else 4096
+    entries = flatten(tree, timestamp, sibling_key)
+    root = entries[0]
+
+    ministream = bytearray()
+    minifat = array(str('I'))
+    chains = []
+    for entry in entries:
+        if entry.entry_type != STGTY_STREAM or not entry.data:
+            continue
+        if len(entry.data) < MINI_STREAM_CUTOFF:
+            count = sectors_for(len(entry.data), MINI_SECTOR_SIZE)
+            entry.start = len(ministream) // MINI_SECTOR_SIZE
+            minifat.extend(list(range(entry.start + 1,
+                                      entry.start + count)) + [ENDOFCHAIN])
+            ministream += pad(entry.data, MINI_SECTOR_SIZE)
+        else:
+            chains.append((entry, entry.data))
+    root.size = len(ministream)
+    if ministream:
+        chains.append((root, bytes(ministream)))
+    minifat_data = to_bytes(minifat)
+
+    data_sectors = sum(sectors_for(len(data), sector_size)
+                       for entry, data in chains)
+    minifat_sectors = sectors_for(len(minifat_data), sector_size)
+    directory_sectors = sectors_for(len(entries) * 128, sector_size)
+    fat_sectors, difat_sectors = fat_layout(
+        data_sectors + minifat_sectors + directory_sectors, sector_size)
+
+    # FAT and DIFAT sectors go first, everything else in allocation order
+    total = (fat_sectors + difat_sectors + data_sectors + minifat_sectors +
+             directory_sectors)
+    fat = [FREESECT] * (fat_sectors * sector_size // 4)
+    fat_ids = list(range(fat_sectors))
+    difat_ids = list(range(fat_sectors, fat_sectors + difat_sectors))
+    for sector in fat_ids:
+        fat[sector] = FATSECT
+    for sector in difat_ids:
+        fat[sector] = DIFSECT
+    free = list(range(fat_sectors + difat_sectors, total))
+    if fragment:
+        free = scatter(free, random.Random(seed))
+    free.reverse()
+    sectors = {}
+
+    def allocate(data):
+        count = sectors_for(len(data), sector_size)
+        if count == 0:
+            return ENDOFCHAIN
+        chain = [free.pop() for _ in range(count)]
+        for index, sector in enumerate(chain):
+            if index + 1 < count:
+                fat[sector] = chain[index + 1]
+            else:
+                fat[sector] = ENDOFCHAIN
+            offset = index * sector_size
+            sectors[sector] = pad(data[offset:offset + sector_size],
+                                  sector_size)
+        return chain[0]
+
+    for entry, data in chains:
+        entry.start = allocate(data)
+    minifat_start = allocate(minifat_data)
+    unused = struct.pack(DIRENTRY_FORMAT, b'', 0, 0, 0, NOSTREAM, NOSTREAM,
+                         NOSTREAM, b'', 0, 0, 0, 0, 0, 0)
+    directory = [entry.pack(version) for entry in entries]
+    directory += [unused] * (directory_sectors * sector_size // 128 -
+                             len(entries))
+    directory_start = allocate(b''.join(directory))
+
+    fat_data = to_bytes(array(str('I'), fat))
+    for index, sector in enumerate(fat_ids):
+        offset = index * sector_size
+        sectors[sector] = fat_data[offset:offset + sector_size]
+    per_difat = sector_size // 4 - 1
+    for index, sector in enumerate(difat_ids):
+        listed = fat_ids[109 + index * per_difat:
+                         109 + (index + 1) * per_difat]
+        listed += [FREESECT] * (per_difat - len(listed))
+        if index + 1 < len(difat_ids):
+            listed.append(difat_ids[index + 1])
+        else:
+            listed.append(ENDOFCHAIN)
+        sectors[sector] = to_bytes(array(str('I'), listed))
+
+    header = struct.pack(
+        HEADER_FORMAT, MAGIC, b'', 0x3E, version, 0xFFFE,
+        9 if version == 3 else 12, 6, 0, 0,
+        directory_sectors if version == 4 else 0,
+        fat_sectors, directory_start, 0, MINI_STREAM_CUTOFF,
+        minifat_start, minifat_sectors,
+        difat_ids[0] if difat_ids else ENDOFCHAIN, difat_sectors)
+    header_fat = fat_ids[:109] + [FREESECT] * (109 - len(fat_ids[:109]))
+    header += to_bytes(array(str('I'), header_fat))
+    fp.write(pad(header, sector_size))
+    empty = b'\0' * sector_size
+    for sector in range(total):
+        fp.write(sectors.get(sector, empty))
+
+
+class Entry(object):
+
+    def __init__(self, name, entry_type, data=None, timestamp=0):
+        self.name = name
+        self.entry_type = entry_type
+        self.data = data
+        self.timestamp = timestamp
+        self.children = []
+        self.sid = None
+        self.left = self.right = self.child = NOSTREAM
+        self.start = ENDOFCHAIN if entry_type == STGTY_ROOT else 0
+        self.size = len(data) if data is not None else 0
+
+    def pack(self, version):
+        name = self.name.encode('utf-16-le') + b'\0\0'
+        if self.entry_type == STGTY_STREAM and self.size == 0:
+            start = ENDOFCHAIN
+        else:
+            start = self.start
+        size_high = self.size >> 32 if version == 4 else 0
+        return struct.pack(DIRENTRY_FORMAT, name, len(name), self.entry_type,
+                           1, self.left, self.right, self.child, b'', 0,
+                           self.timestamp, self.timestamp, start,
+                           self.size & 0xFFFFFFFF, size_high)
+
+
+def flatten(tree, timestamp=0, sibling_key=None):
+    ''' Directory entries of a tree, in sid order, with their red-black
+    (here: balanced, all black) sibling trees linked.
+    '''
+    root = Entry('Root Entry', STGTY_ROOT, timestamp=timestamp)
+    entries = [root]
+    stack = [(root, tree)]
+    while stack:
+        storage, items = stack.pop()
+        for name in sorted(items):
+            value = items[name]
+            if isinstance(value, dict):
+                entry = Entry(name, STGTY_STORAGE, timestamp=timestamp)
+                stack.append((entry, value))
+            else:
+                entry = Entry(name, STGTY_STREAM, bytes(value))
+            entry.sid = len(entries)
+            entries.append(entry)
+            storage.children.append(entry)
+    root.sid = 0
+    for entry in entries:
+        entry.child = link_siblings(entry.children, sibling_key)
+    return entries
+
+
+def link_siblings(children, key=None):
+    key = key or compare_key
+    children = sorted(children, key=lambda entry: key(entry.name))
+
+    def link(low, high):
+        if low >= high:
+            return NOSTREAM
+        middle = (low + high) // 2
+        entry = children[middle]
+        entry.left = link(low, middle)
+        entry.right = link(middle + 1, high)
+        return entry.sid
+    return link(0, len(children))
+
+
+def compare_key(name):
+    ''' [MS-CFB] orders siblings by name length, then by upper-cased name.
+    '''
+    return len(name), name.upper()
+
+
+def fat_layout(sectors, sector_size):
+    ''' Numbers of FAT and DIFAT sectors needed to map `sectors` sectors
+    along with themselves.
+    '''
+    per_sector = sector_size // 4
+    fat_sectors = difat_sectors = 0
+    while True:
+        total = sectors + fat_sectors + difat_sectors
+        needed_fat = sectors_for(total, per_sector)
+        needed_difat = 0
+        if needed_fat > 109:
+            needed_difat = sectors_for(needed_fat - 109, per_sector - 1)
+        if (needed_fat, needed_difat) == (fat_sectors, difat_sectors):
+            return fat_sectors, difat_sectors
+        fat_sectors, difat_sectors = needed_fat, needed_difat
+
+
+def scatter(sectors, rng, longest_run=8):
+    ''' Shuffle runs of 1 to `longest_run` consecutive sectors.
+    '''
+    runs = []
+    index = 0
+    while index < len(sectors):
+        length = rng.randint(1, longest_run)
+        runs.append(sectors[index:index + length])
+        index += length
+    rng.shuffle(runs)
+    return [sector for run in runs for sector in run]
+
+
+def sectors_for(size, sector_size):
+    return (size + sector_size - 1) // sector_size
+
+
+def pad(data, size):
+    remainder = len(data) % size
+    if remainder:
+        data = bytes(data) + b'\0' * (size - remainder)
+    return bytes(data)
+
+
+def to_bytes(values):
+    if sys.byteorder == 'big':
+        values = array(values.typecode, values)
+        values.byteswap()
+    if hasattr(values, 'tobytes'):
+        return values.tobytes()
+    return values.tostring()
+
+
+#
+# Corpus shapes
+#
+
+def random_bytes(rng, size):
+    if hasattr(rng, 'randbytes'):
+        return rng.randbytes(size)
+    return bytes(bytearray(rng.getrandbits(8) for _ in range(size)))
+
+
+def many_entries_tree(rng, storages=100, streams=100, stream_size=200):
+    ''' Many small streams spread over storages, like an MSG file.
+    '''
+    data = random_bytes(rng, stream_size)
+    return dict(('__recip_version1.0_#%08X' % i, dict(
+        ('__substg1.0_%08X' % j, data) for j in range(streams)
+    )) for i in range(storages))
+
+
+def deep_tree(rng, depth=30, streams=4, stream_size=5000):
+    ''' A chain of nested storages, each holding a few streams.
+    '''
+    tree = current = {}
+    for level in range(depth):
+        for j in range(streams):
+            current['Stream%d' % j] = random_bytes(rng, stream_size)
+        current['Storage%d' % level] = current = {}
+    return tree
+
+
+def large_stream_tree(rng, size=64 * 1024 * 1024, small=10):
+    ''' One large stream alongside a few property-set sized streams.
+    '''
+    block = random_bytes(rng, 64 * 1024)
+    large = block * (size // len(block)) + block[:size % len(block)]
+    tree = {'Workbook': large}
+    for j in range(small):
+        tree['\x05Small%d' % j] = random_bytes(rng, 200)
+    return tree
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+#
+#   mete0r.olefilefs : PyFilesystem interface to olefile
+#   Copyright (C) 2015 mete0r <mete0r@sarangbang.or.kr>
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU Lesser General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU Lesser General Public License for more details.
+#
+#   You should have received a copy of the GNU Lesser General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+from unittest import TestCase
+from unittest import skipIf
+import os.path
+import sys
+
+
+FILES_DIR = os.path.join(os.path.dirname(__file__), 'files')
+TEST_XLS_PATH = os.path.join(FILES_DIR, 'test.xls')
+EXAMPLE_STG_PATH = os.path.join(FILES_DIR, 'example.stg')
+
+
+# Futures are driven with run_until_complete() rather than async/await,
+# so that this module still compiles on Python 2.
+@skipIf(sys.version_info < (3, 4), 'asyncio front-end needs Python 3.4+')
+class AsyncOleFileFSTest(TestCase):
+
+    def setUp(self):
+        import asyncio
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+
+    def tearDown(self):
+        import asyncio
+        asyncio.set_event_loop(None)
+        self.loop.close()
+
+    def run_until_complete(self, coroutine):
+        return self.loop.run_until_complete(coroutine)
+
+    def test_open_fs(self):
+        from ..aio import open_fs
+        run = self.run_until_complete
+        afs = run(open_fs(EXAMPLE_STG_PATH))
+        self.assertTrue(run(afs.__aenter__()) is afs)
+        try:
+            self.assertTrue(afs.fs.getmeta('thread_safe'))
+            self.assertEquals(sorted(run(afs.listdir('/'))),
+                              ['a', 'b', 'bar', 'foo'])
+            self.assertTrue(run(afs.isdir('foo')))
+            self.assertTrue(run(afs.isfile('foo/foofile1')))
+            self.assertFalse(run(afs.exists('baz')))
+            info = run(afs.getinfo('foo/foofile1'))
+            self.assertEquals(info['size'], 13)
+            self.assertEquals(run(afs.walkfiles()),
+                              list(afs.fs.walkfiles()))
+        finally:
+            run(afs.__aexit__(None, None, None))
+        self.assertTrue(afs.fs.closed)
+
+    def test_read(self):
+        from ..aio import open_fs
+        from ..fs import OleFileFS
+        run = self.run_until_complete
+        with OleFileFS(TEST_XLS_PATH) as fs:
+            expected = fs.getcontents('Workbook')
+        afs = run(open_fs(TEST_XLS_PATH))
+        try:
+            f = run(afs.open('Workbook'))
+            try:
+                head = run(f.read(16))
+                self.assertEquals(f.tell(), 16)
+                rest = run(f.read())
+            finally:
+                run(f.close())
+            self.assertTrue(f.closed)
+            self.assertEquals(head + rest, expected)
+            self.assertEquals(run(afs.getcontents('Workbook')), expected)
+        finally:
+            run(afs.close())
+
+    def test_concurrency(self):
+        import asyncio
+        from ..aio import AsyncOleFileFS
+        from ..aio import open_fs
+        from ..fs import OleFileFS
+        run = self.run_until_complete
+        with OleFileFS(EXAMPLE_STG_PATH) as fs:
+            paths = list(fs.walkfiles())
+            expected = [fs.getcontents(path) for path in paths] * 20
+
+        afs = run(open_fs(EXAMPLE_STG_PATH, max_concurrency=4))
+        try:
+            results = run(asyncio.gather(*[
+                afs.getcontents(path) for path in paths * 20
+            ]))
+            self.assertEquals(results, expected)
+        finally:
+            run(afs.close())
+
+        # not thread-safe: one call at a time
+        afs = AsyncOleFileFS(OleFileFS(EXAMPLE_STG_PATH))
+        try:
+            self.assertEquals(afs.max_concurrency, 1)
+            results = run(asyncio.gather(*[
+                afs.getcontents(path) for path in paths * 20
+            ]))
+            self.assertEquals(results, expected)
+        finally:
+            run(afs.close())
+
+    def test_not_found(self):
+        from fs.errors import ResourceNotFoundError
+        from ..aio import open_fs
+        run = self.run_until_complete
+        afs = run(open_fs(EXAMPLE_STG_PATH))
+        try:
+            self.assertRaises(ResourceNotFoundError, run, afs.open('baz'))
+        finally:
+            run(afs.close())
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+#
+#   mete0r.olefilefs : PyFilesystem interface to olefile
+#   Copyright (C) 2015 mete0r <mete0r@sarangbang.or.kr>
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU Lesser General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU Lesser General Public License for more details.
+#
+#   You should have received a copy of the GNU Lesser General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+from unittest import TestCase
+
+
+class LRUCacheTest(TestCase):
+
+    def test_get_put(self):
+        from ..cache import LRUCache
+        cache = LRUCache(2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        self.assertEquals(cache.get('a'), 1)
+        self.assertEquals(cache.get('c'), None)
+        self.assertEquals(cache.get('c', 3), 3)
+        self.assertEquals(len(cache), 2)
+
+    def test_evicts_least_recently_used(self):
+        from ..cache import LRUCache
+        cache = LRUCache(2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        cache.get('a')
+        cache.put('c', 3)
+        self.assertTrue('a' in cache)
+        self.assertFalse('b' in cache)
+        self.assertTrue('c' in cache)
+
+    def test_weigh(self):
+        from ..cache import LRUCache
+        cache = LRUCache(10, weigh=len)
+        cache.put('a', b'12345')
+        cache.put('b', b'1234')
+        self.assertEquals(cache.weight, 9)
+        cache.put('c', b'12')
+        self.assertEquals(cache.weight, 6)
+        self.assertFalse('a' in cache)
+        cache.put('d', b'12345678901')
+        self.assertFalse('d' in cache)
+        self.assertEquals(cache.weight, 6)
+
+    def test_put_replaces(self):
+        from ..cache import LRUCache
+        cache = LRUCache(10, weigh=len)
+        cache.put('a', b'12345')
+        cache.put('a', b'12')
+        self.assertEquals(cache.weight, 2)
+        self.assertEquals(cache.pop('a'), b'12')
+        self.assertEquals(cache.weight, 0)
+
+    def test_zero_capacity(self):
+        from ..cache import LRUCache
+        cache = LRUCache(0)
+        cache.put('a', 1)
+        self.assertEquals(len(cache), 0)
+
+    def test_on_remove(self):
+        from ..cache import LRUCache
+        removed = []
+        cache = LRUCache(2, on_remove=lambda key, value: removed.append(key))
+        cache.put('a', 1)
+        cache.put('b', 2)
+        cache.put('c', 3)
+        cache.put('b', 4)
+        cache.pop('c')
+        self.assertEquals(removed, ['a', 'b', 'c'])
+        cache.clear()
+        self.assertEquals(removed, ['a', 'b', 'c', 'b'])
+
+
+class MemoryBudgetTest(TestCase):
+
+    def test_reserve_release(self):
+        from ..cache import MemoryBudget
+        budget = MemoryBudget(100)
+        self.assertTrue(budget.reserve('buffers', 60))
+        self.assertFalse(budget.reserve('buffers', 60))
+        self.assertFalse(budget.reserve('buffers', 101))
+        budget.release('buffers', 60)
+        self.assertTrue(budget.reserve('buffers', 100))
+        self.assertEquals(budget.usage(), {'buffers': 100})
+        self.assertEquals(budget.used, 100)
+
+    def test_unlimited(self):
+        from ..cache import MemoryBudget
+        budget = MemoryBudget()
+        self.assertTrue(budget.reserve('buffers', 10 ** 12))
+        self.assertEquals(budget.used, 10 ** 12)
+
+    def test_evict(self):
+        from ..cache import LRUCache
+        from ..cache import MemoryBudget
+        budget = MemoryBudget(100)
+        cache = LRUCache(1000, weigh=len, on_remove=lambda key, value:
+                         budget.release('cache', len(value)))
+
+        def evict():
+            if len(cache) == 0:
+                return False
+            cache.popitem()
+            return True
+        budget.add_evictor(evict)
+        for key in 'abc':
+            self.assertTrue(budget.reserve('cache', 30))
+            cache.put(key, b'x' * 30)
+        self.assertTrue(budget.reserve('buffers', 50))
+        self.assertEquals(list(cache._items), ['c'])
+        self.assertEquals(budget.usage(), {'cache': 30, 'buffers': 50})
+        budget.charge('tables', 40)
+        self.assertEquals(len(cache), 0)
+        self.assertEquals(budget.used, 90)
+
+    def test_wait(self):
+        import threading
+        from ..cache import MemoryBudget
+        budget = MemoryBudget(100)
+        budget.reserve('buffers', 100)
+        timer = threading.Timer(0.05, budget.release, ('buffers', 100))
+        timer.start()
+        try:
+            self.assertTrue(budget.reserve('buffers', 100, timeout=10))
+        finally:
+            timer.join()
+        self.assertFalse(budget.reserve('buffers', 1, timeout=0.01))
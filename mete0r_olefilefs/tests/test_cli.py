@@ -0,0 +1,269 @@
+# -*- coding: utf-8 -*-
+#
+#   mete0r.olefilefs : PyFilesystem interface to olefile
+#   Copyright (C) 2015 mete0r <mete0r@sarangbang.or.kr>
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU Lesser General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU Lesser General Public License for more details.
+#
+#   You should have received a copy of the GNU Lesser General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+from unittest import TestCase
+import io
+import json
+import os.path
+import shutil
+import tempfile
+
+
+FILES_DIR = os.path.join(os.path.dirname(__file__), 'files')
+TEST_XLS_PATH = os.path.join(FILES_DIR, 'test.xls')
+EXAMPLE_STG_PATH = os.path.join(FILES_DIR, 'example.stg')
+
+
+class ExtractTest(TestCase):
+
+    def setUp(self):
+        self.output = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.output)
+
+    def listfiles(self):
+        found = []
+        for dirpath, dirnames, filenames in os.walk(self.output):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                found.append(os.path.relpath(path, self.output))
+        return sorted(found)
+
+    def test_extract(self):
+        from ..cli import main
+        from ..fs import OleFileFS
+        status = main(['extract', '-j', '1', '-o', self.output,
+                       EXAMPLE_STG_PATH])
+        self.assertEquals(status, 0)
+        self.assertEquals(self.listfiles(), [
+            os.path.join('example.stg', 'a'),
+            os.path.join('example.stg', 'b'),
+            os.path.join('example.stg', 'bar', 'barfile1'),
+            os.path.join('example.stg', 'bar', 'barfile2'),
+            os.path.join('example.stg', 'foo', 'bar', 'foobarfile1'),
+            os.path.join('example.stg', 'foo', 'bar', 'foobarfile2'),
+            os.path.join('example.stg', 'foo', 'foofile1'),
+            os.path.join('example.stg', 'foo', 'foofile2'),
+        ])
+        with OleFileFS(EXAMPLE_STG_PATH) as fs:
+            expected = fs.getcontents('foo/bar/foobarfile1')
+        path = os.path.join(self.output, 'example.stg', 'foo', 'bar',
+                            'foobarfile1')
+        with open(path, 'rb') as f:
+            self.assertEquals(f.read(), expected)
+
+    def test_extract_patterns_directory_parallel(self):
+        from ..cli import main
+        status = main(['extract', '-j', '2', '-o', self.output,
+                       '-p', '/Workbook', '-p', '/foo/*1', FILES_DIR])
+        self.assertEquals(status, 0)
+        self.assertEquals(self.listfiles(), [
+            os.path.join('example.stg', 'foo', 'bar', 'foobarfile1'),
+            os.path.join('example.stg', 'foo', 'foofile1'),
+            os.path.join('test.xls', 'Workbook'),
+        ])
+
+    def test_extract_failure(self):
+        from ..cli import main
+        status = main(['extract', '-j', '1', '-o', self.output,
+                       os.path.join(FILES_DIR, 'nonexists.xls'),
+                       TEST_XLS_PATH])
+        self.assertEquals(status, 1)
+        self.assertEquals(len(self.listfiles()), 5)
+
+
+class HashTest(TestCase):
+
+    def setUp(self):
+        self.output = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.output)
+
+    def run_hash(self, arguments):
+        from ..cli import hash_command
+        from ..cli import make_parser
+        args = make_parser().parse_args(['hash'] + arguments)
+        output = io.StringIO()
+        status = hash_command(args, output)
+        return status, output.getvalue().splitlines()
+
+    def test_hash(self):
+        import hashlib
+        from ..fs import OleFileFS
+        status, lines = self.run_hash(['-j', '1', '-a', 'md5', '-a', 'sha1',
+                                       '-p', '/foo/*', EXAMPLE_STG_PATH])
+        self.assertEquals(status, 0)
+        with OleFileFS(EXAMPLE_STG_PATH) as fs:
+            data = fs.getcontents('foo/foofile1')
+        self.assertEquals(len(lines), 4)
+        self.assertTrue('%s %s  %s/foo/foofile1' % (
+            hashlib.md5(data).hexdigest(), hashlib.sha1(data).hexdigest(),
+            EXAMPLE_STG_PATH) in lines)
+
+    def test_hash_cache_parallel(self):
+        cache = os.path.join(self.output, 'digests.json')
+        status, lines = self.run_hash(['-j', '2', '--cache', cache,
+                                       FILES_DIR])
+        self.assertEquals(status, 0)
+        self.assertEquals(len(lines), 13)
+        with open(cache, 'rb') as f:
+            self.assertTrue(f.read())
+        status, cached_lines = self.run_hash(['-j', '2', '--cache', cache,
+                                              FILES_DIR])
+        self.assertEquals(sorted(cached_lines), sorted(lines))
+
+    def test_hash_failure(self):
+        status, lines = self.run_hash([
+            '-j', '1', os.path.join(FILES_DIR, 'nonexists.xls'),
+            TEST_XLS_PATH])
+        self.assertEquals(status, 1)
+        self.assertEquals(len(lines), 5)
+
+class GrepTest(TestCase):
+
+    def run_grep(self, arguments):
+        from ..cli import grep_command
+        from ..cli import make_parser
+        args = make_parser().parse_args(['grep'] + arguments)
+        output = io.StringIO()
+        status = grep_command(args, output)
+        return status, output.getvalue().splitlines()
+
+    def test_grep(self):
+        import binascii
+        from ..fs import OleFileFS
+        with OleFileFS(EXAMPLE_STG_PATH) as fs:
+            data = fs.getcontents('foo/foofile1')
+        status, lines = self.run_grep([
+            '-j', '2', '--chunk-size', '4', '-x',
+            binascii.hexlify(data[2:7]).decode('ascii'), '-p', '/foo/*',
+            FILES_DIR, EXAMPLE_STG_PATH])
+        self.assertEquals(status, 0)
+        self.assertTrue('%s/foo/foofile1:2:%s' % (
+            EXAMPLE_STG_PATH, binascii.hexlify(data[2:7]).decode('ascii'))
+            in lines)
+
+    def test_grep_encodings(self):
+        status, lines = self.run_grep([
+            '-j', '1', '-e', 'Workbook', '--encoding', 'utf-8',
+            '--encoding', 'utf-16-le', os.path.join(FILES_DIR, 'test.xls')])
+        self.assertEquals(status, 0)
+        for line in lines:
+            self.assertTrue(line.endswith(':Workbook (utf-8)') or
+                            line.endswith(':Workbook (utf-16-le)'))
+
+    def test_grep_nothing(self):
+        status, lines = self.run_grep(['-j', '1', EXAMPLE_STG_PATH])
+        self.assertEquals(status, 2)
+
+
+class PropsTest(TestCase):
+
+    def run_props(self, arguments):
+        from ..cli import make_parser
+        from ..cli import props_command
+        args = make_parser().parse_args(['props'] + arguments)
+        output = io.StringIO()
+        status = props_command(args, output)
+        return status, [json.loads(line)
+                        for line in output.getvalue().splitlines()]
+
+    def test_props(self):
+        status, records = self.run_props(['-j', '2', FILES_DIR])
+        self.assertEquals(status, 0)
+        records = dict((record['container'], record) for record in records)
+        self.assertEquals(records[EXAMPLE_STG_PATH]['property_sets'], [])
+        property_sets = records[TEST_XLS_PATH]['property_sets']
+        self.assertEquals([item['stream'] for item in property_sets], [
+            '/\x05SummaryInformation',
+            '/\x05DocumentSummaryInformation',
+            '/\x05DocumentSummaryInformation',
+        ])
+        self.assertTrue({'id': 4, 'name': 'author', 'type': 'VT_LPSTR',
+                         'value': 'yoosung '}
+                        in property_sets[0]['properties'])
+
+    def test_props_stream_failure(self):
+        status, records = self.run_props([
+            '-j', '1', '-s', 'DocumentSummaryInformation',
+            os.path.join(FILES_DIR, 'nonexists.xls'), TEST_XLS_PATH])
+        self.assertEquals(status, 1)
+        self.assertTrue('error' in records[0])
+        self.assertEquals([item['stream']
+                           for item in records[1]['property_sets']],
+                          ['/\x05DocumentSummaryInformation'] * 2)
+
+
+class ExportTest(TestCase):
+
+    def setUp(self):
+        self.output = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.output)
+
+    def test_export(self):
+        import zipfile
+        from ..cli import main
+        path = os.path.join(self.output, 'example.zip')
+        status = main(['export', '-o', path, EXAMPLE_STG_PATH])
+        self.assertEquals(status, 0)
+        with zipfile.ZipFile(path) as archive:
+            self.assertTrue('foo/bar/foobarfile1' in archive.namelist())
+
+    def test_export_failure(self):
+        from ..cli import main
+        path = os.path.join(self.output, 'example.tar')
+        status = main(['export', '-o', path,
+                       os.path.join(FILES_DIR, 'nonexists.xls')])
+        self.assertEquals(status, 1)
+
+    def test_guess_format(self):
+        from ..cli import guess_format
+        self.assertEquals(guess_format('a.zip'), 'zip')
+        self.assertEquals(guess_format('a.tar.gz'), 'tar.gz')
+        self.assertEquals(guess_format('a.tgz'), 'tar.gz')
+        self.assertEquals(guess_format('-'), 'tar')
+
+class SummaryTest(TestCase):
+
+    def test_report(self):
+        from ..cli import Result
+        from ..cli import Summary
+        output = io.StringIO()
+        summary = Summary(output)
+        summary.add(Result('a', 2, 1024 * 1024))
+        summary.add(Result('b', error=IOError('broken')))
+        summary.report('extracted')
+        self.assertTrue(output.getvalue().startswith(
+            'extracted 2 streams (1.0 MB) from 2 containers (1 failed) in '))
+        self.assertEquals(summary.status, 1)
+
+
+class SafeFilenameTest(TestCase):
+
+    def test_safe_filename(self):
+        from ..cli import safe_filename
+        self.assertEquals(safe_filename('Workbook'), 'Workbook')
+        self.assertEquals(safe_filename('..'), '_..')
+        self.assertEquals(safe_filename('a/b\\c'), 'a_b_c')
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+#
+#   mete0r.olefilefs : PyFilesystem interface to olefile
+#   Copyright (C) 2015 mete0r <mete0r@sarangbang.or.kr>
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU Lesser General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU Lesser General Public License for more details.
+#
+#   You should have received a copy of the GNU Lesser General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+from unittest import TestCase
+import io
+import random
+
+
+class CorpusTest(TestCase):
+
+    def write(self, tree, **kwargs):
+        from .corpus import write_container
+        f = io.BytesIO()
+        write_container(f, tree, **kwargs)
+        f.seek(0)
+        return f
+
+    def assertSameStreams(self, f, tree):
+        from olefile import OleFileIO
+        from ..fs import OleFileFS
+        olefile = OleFileIO(f)
+        try:
+            paths = ['/'.join(path) for path in olefile.listdir()]
+            self.assertEquals(len(paths), count_streams(tree))
+            with OleFileFS(f) as fs:
+                for path in paths:
+                    with fs.open(path) as stream:
+                        self.assertEquals(stream.read(),
+                                          olefile.openstream(path).read())
+        finally:
+            olefile.close()
+
+    def test_version3(self):
+        from .corpus import deep_tree
+        tree = deep_tree(random.Random(0), depth=5)
+        self.assertSameStreams(self.write(tree), tree)
+
+    def test_version4(self):
+        from .corpus import many_entries_tree
+        tree = many_entries_tree(random.Random(0), storages=5, streams=5)
+        self.assertSameStreams(self.write(tree, version=4), tree)
+
+    def test_fragment(self):
+        from .corpus import large_stream_tree
+        from ..fs import OleFileFS
+        tree = large_stream_tree(random.Random(0), size=256 * 1024)
+        f = self.write(tree, fragment=True)
+        self.assertSameStreams(f, tree)
+        with OleFileFS(f) as fs:
+            self.assertTrue(len(fs.getextents('Workbook')) > 1)
+
+    def test_contiguous(self):
+        from .corpus import large_stream_tree
+        from ..fs import OleFileFS
+        tree = large_stream_tree(random.Random(0), size=256 * 1024)
+        f = self.write(tree)
+        with OleFileFS(f) as fs:
+            self.assertEquals(len(fs.getextents('Workbook')), 1)
+
+    def test_difat(self):
+        from .corpus import fat_layout
+        from .corpus import large_stream_tree
+        # 109 FAT sectors of 128 entries map less than 7 MB
+        self.assertEquals(fat_layout(109 * 128, 512), (110, 1))
+        tree = large_stream_tree(random.Random(0), size=7 * 1024 * 1024,
+                                 small=1)
+        self.assertSameStreams(self.write(tree, fragment=True), tree)
+
+
+def count_streams(tree):
+    return sum(count_streams(value) if isinstance(value, dict) else 1
+               for value in tree.values())
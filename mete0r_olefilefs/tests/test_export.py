@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+#
+#   mete0r.olefilefs : PyFilesystem interface to olefile
+#   Copyright (C) 2015 mete0r <mete0r@sarangbang.or.kr>
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU Lesser General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU Lesser General Public License for more details.
+#
+#   You should have received a copy of the GNU Lesser General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+from unittest import TestCase
+import io
+import os.path
+
+
+FILES_DIR = os.path.join(os.path.dirname(__file__), 'files')
+EXAMPLE_STG_PATH = os.path.join(FILES_DIR, 'example.stg')
+
+
+class UnseekableFile(object):
+
+    def __init__(self):
+        self.f = io.BytesIO()
+
+    def write(self, data):
+        return self.f.write(data)
+
+    def flush(self):
+        pass
+
+
+class ExportTest(TestCase):
+
+    def expected(self):
+        from ..fs import OleFileFS
+        with OleFileFS(EXAMPLE_STG_PATH) as fs:
+            dirs = [path.lstrip('/') for path in fs.walkdirs()
+                    if path != '/']
+            files = dict((path.lstrip('/'), fs.getcontents(path))
+                         for path in fs.walkfiles())
+            mtimes = dict((path, fs.getinfo(path)['modified_time'])
+                          for path in dirs)
+        return dirs, files, mtimes
+
+    def test_tar(self):
+        import calendar
+        import tarfile
+        from ..export import export_container
+        from ..fs import OleFileFS
+        dirs, files, mtimes = self.expected()
+        output = UnseekableFile()
+        with OleFileFS(EXAMPLE_STG_PATH) as fs:
+            self.assertEquals(export_container(fs, output, 'tar.gz'),
+                              (len(files), sum(len(data)
+                                               for data in files.values())))
+        output.f.seek(0)
+        with tarfile.open(fileobj=output.f) as tar:
+            members = tar.getmembers()
+            self.assertEquals([member.name for member in members
+                               if member.isdir()], dirs)
+            self.assertEquals(sorted(member.name for member in members
+                                     if member.isfile()), sorted(files))
+            for member in members:
+                if member.isfile():
+                    self.assertEquals(tar.extractfile(member).read(),
+                                      files[member.name])
+                elif mtimes[member.name] is not None:
+                    self.assertEquals(member.mtime, calendar.timegm(
+                        mtimes[member.name].utctimetuple()))
+
+    def test_zip(self):
+        import zipfile
+        from ..export import export_container
+        from ..fs import OleFileFS
+        dirs, files, mtimes = self.expected()
+        output = UnseekableFile()
+        with OleFileFS(EXAMPLE_STG_PATH) as fs:
+            export_container(fs, output, 'zip', chunk_size=3)
+        output.f.seek(0)
+        with zipfile.ZipFile(output.f) as archive:
+            names = archive.namelist()
+            self.assertEquals([name[:-1] for name in names
+                               if name.endswith('/')], dirs)
+            for name, data in files.items():
+                self.assertEquals(archive.read(name), data)
+
+    def test_zip_whole_members(self):
+        from .. import export
+        streaming = export.ZIP_STREAMING
+        # as before Python 3.6, spooled for the unseekable output
+        export.ZIP_STREAMING = False
+        try:
+            self.test_zip()
+        finally:
+            export.ZIP_STREAMING = streaming
+
+    def test_sector_order(self):
+        from ..export import iter_streams_in_sector_order
+        from ..fs import OleFileFS
+        with OleFileFS(EXAMPLE_STG_PATH) as fs:
+            paths = iter_streams_in_sector_order(fs)
+            self.assertEquals(sorted(paths), sorted(fs.walkfiles()))
+            positions = [fs.getextents(path)[0][0] for path in paths]
+            self.assertEquals(positions, sorted(positions))
+
+    def test_unknown_format(self):
+        from ..export import export_container
+        from ..fs import OleFileFS
+        with OleFileFS(EXAMPLE_STG_PATH) as fs:
+            self.assertRaises(ValueError, export_container, fs,
+                              io.BytesIO(), 'rar')
+
+    def test_member_name(self):
+        from ..export import member_name
+        self.assertEquals(member_name('/foo/bar'), 'foo/bar')
+        self.assertEquals(member_name('/../a\\b'), '_../a_b')
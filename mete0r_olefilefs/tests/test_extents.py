@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+#
+#   mete0r.olefilefs : PyFilesystem interface to olefile
+#   Copyright (C) 2015 mete0r <mete0r@sarangbang.or.kr>
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU Lesser General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU Lesser General Public License for more details.
+#
+#   You should have received a copy of the GNU Lesser General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+from unittest import TestCase
+import os.path
+
+
+FILES_DIR = os.path.join(os.path.dirname(__file__), 'files')
+TEST_XLS_PATH = os.path.join(FILES_DIR, 'test.xls')
+EXAMPLE_STG_PATH = os.path.join(FILES_DIR, 'example.stg')
+
+ENDOFCHAIN = 0xFFFFFFFE
+
+
+class ExtentsTest(TestCase):
+
+    def test_coalesce(self):
+        from ..extents import Extents
+        extents = Extents([(0, 4), (4, 4), (12, 4), (16, 2), (8, 4)])
+        self.assertEquals(list(extents), [
+            (0, 8),
+            (12, 6),
+            (8, 4),
+        ])
+        self.assertEquals(extents.size, 18)
+
+    def test_runs(self):
+        from ..extents import Extents
+        extents = Extents([(0, 8), (12, 6), (8, 4)])
+        self.assertEquals(list(extents.runs(0, 18)), [
+            (0, 8),
+            (12, 6),
+            (8, 4),
+        ])
+        self.assertEquals(list(extents.runs(6, 4)), [
+            (6, 2),
+            (12, 2),
+        ])
+        self.assertEquals(list(extents.runs(10, 100)), [
+            (14, 4),
+            (8, 4),
+        ])
+        self.assertEquals(list(extents.runs(18, 1)), [])
+
+    def test_translate(self):
+        from ..extents import Extents
+        outer = Extents([(100, 8), (200, 8)])
+        inner = Extents([(4, 8), (0, 2)])
+        self.assertEquals(list(outer.translate(inner)), [
+            (104, 4),
+            (200, 4),
+            (100, 2),
+        ])
+
+
+class ChainExtentsTest(TestCase):
+
+    def test_contiguous(self):
+        from ..extents import chain_extents
+        fat = [1, 2, 3, ENDOFCHAIN]
+        self.assertEquals(list(chain_extents(fat, 0, 512, 2000, 512)), [
+            (512, 2000),
+        ])
+
+    def test_fragmented(self):
+        from ..extents import chain_extents
+        fat = [1, 3, ENDOFCHAIN, 2]
+        self.assertEquals(list(chain_extents(fat, 0, 4, 16)), [
+            (0, 8),
+            (12, 4),
+            (8, 4),
+        ])
+
+    def test_size_shorter_than_chain(self):
+        from ..extents import chain_extents
+        fat = [1, 2, 3, ENDOFCHAIN]
+        self.assertEquals(list(chain_extents(fat, 0, 4, 5)), [
+            (0, 5),
+        ])
+
+    def test_incomplete(self):
+        from ..extents import chain_extents
+        self.assertRaises(IOError, chain_extents, [ENDOFCHAIN], 0, 4, 5)
+
+    def test_out_of_range(self):
+        from ..extents import chain_extents
+        self.assertRaises(IOError, chain_extents, [5], 0, 4, 5)
+
+    def test_loop(self):
+        from ..extents import chain_extents
+        self.assertRaises(IOError, chain_extents, [1, 0], 0, 4, 100)
+
+
+class OleFileFSExtentsTest(TestCase):
+
+    def test_getextents(self):
+        from ..fs import OleFileFS
+        with OleFileFS(TEST_XLS_PATH) as fs:
+            extents = fs.getextents('Workbook')
+            self.assertEquals(sum(length for _, length in extents), 2743)
+            with open(TEST_XLS_PATH, 'rb') as f:
+                data = b''
+                for position, length in extents:
+                    f.seek(position)
+                    data += f.read(length)
+            with fs.open('Workbook') as f:
+                self.assertEquals(f.read(), data)
+
+    def test_getextents_cached(self):
+        from ..fs import OleFileFS
+        with OleFileFS(EXAMPLE_STG_PATH) as fs:
+            node = fs._lookup('foo/foofile1')
+            self.assertTrue(fs._get_extents(node.entry) is
+                            fs._get_extents(node.entry))
+
+    def test_getextents_storage(self):
+        from fs.errors import ResourceInvalidError
+        from ..fs import OleFileFS
+        with OleFileFS(EXAMPLE_STG_PATH) as fs:
+            self.assertRaises(ResourceInvalidError, fs.getextents, 'foo')
@@ -20,6 +20,7 @@ from __future__ import absolute_import
 from __future__ import unicode_literals
 
 from unittest import TestCase
+import io
 import os.path
 
 
@@ -43,6 +44,21 @@ class OleFileFSTest(TestCase):
             with OleFileFS(f):
                 pass
 
+    def test_constructor_mmap(self):
+        from ..fs import OleFileFS
+        with OleFileFS(TEST_XLS_PATH, use_mmap=True) as fs:
+            self.assertTrue(fs.isfile('Workbook'))
+
+    def test_constructor_mmap_nonexists(self):
+        from fs.errors import CreateFailedError
+        from ..fs import OleFileFS
+        try:
+            OleFileFS('nonexists.xls', use_mmap=True)
+        except CreateFailedError as e:
+            self.assertEquals(e.details.errno, 2)
+        else:
+            raise AssertionError('CreateFailedError expected')
+
     def test_constructor_nonexists(self):
         from fs.errors import CreateFailedError
         from ..fs import OleFileFS
@@ -109,6 +125,67 @@ class OleFileFSTest(TestCase):
                 'b',
             ])
 
+    def test_listdir_storage(self):
+        from ..fs import OleFileFS
+        with OleFileFS(EXAMPLE_STG_PATH) as fs:
+            self.assertEquals(fs.listdir(), [
+                'a',
+                'b',
+                'bar',
+                'foo',
+            ])
+            self.assertEquals(fs.listdir('foo'), [
+                'bar',
+                'foofile1',
+                'foofile2',
+            ])
+            self.assertEquals(fs.listdir('foo', dirs_only=True), [
+                'bar',
+            ])
+            self.assertEquals(fs.listdir('/foo/bar', absolute=True), [
+                '/foo/bar/foobarfile1',
+                '/foo/bar/foobarfile2',
+            ])
+
+    def test_listdir_case_insensitive(self):
+        from ..fs import OleFileFS
+        with OleFileFS(EXAMPLE_STG_PATH) as fs:
+            self.assertEquals(fs.listdir('FOO/Bar', full=True), [
+                'foo/bar/foobarfile1',
+                'foo/bar/foobarfile2',
+            ])
+
+    def test_lookup_cached(self):
+        from ..fs import OleFileFS
+        with OleFileFS(EXAMPLE_STG_PATH, path_cache_size=2) as fs:
+            node = fs._lookup('/foo/bar/')
+            self.assertTrue(fs._lookup('/foo/bar/') is node)
+            self.assertTrue(fs._lookup('FOO/BAR') is node)
+            self.assertEquals(len(fs._paths), 2)
+            fs._lookup('a')
+            self.assertFalse('/foo/bar/' in fs._paths)
+            self.assertEquals(fs._lookup('nonexists'), None)
+            self.assertFalse('nonexists' in fs._paths)
+
+    def test_listdir_nonexists(self):
+        from fs.errors import ResourceNotFoundError
+        with self._createOne() as fs:
+            self.assertRaises(ResourceNotFoundError, fs.listdir, 'nonexists')
+
+    def test_listdir_stream(self):
+        from fs.errors import ResourceInvalidError
+        with self._createOne() as fs:
+            self.assertRaises(ResourceInvalidError, fs.listdir, 'Workbook')
+
+    def test_exists(self):
+        from ..fs import OleFileFS
+        with OleFileFS(EXAMPLE_STG_PATH) as fs:
+            self.assertTrue(fs.exists('/'))
+            self.assertTrue(fs.exists('foo/bar'))
+            self.assertTrue(fs.exists('foo/bar/foobarfile1'))
+            self.assertFalse(fs.exists('foo/nonexists'))
+            self.assertFalse(fs.exists('a/b'))
+
     def test_listdir_full(self):
         with self._createOne() as fs:
             items = fs.listdir(full=True)
@@ -131,6 +208,85 @@ class OleFileFSTest(TestCase):
                 '/Workbook',
             ])
 
+    def test_walk(self):
+        from ..fs import OleFileFS
+        with OleFileFS(EXAMPLE_STG_PATH) as fs:
+            self.assertEquals(list(fs.walk()), [
+                ('/', ['a', 'b']),
+                ('/bar', ['barfile1', 'barfile2']),
+                ('/foo', ['foofile1', 'foofile2']),
+                ('/foo/bar', ['foobarfile1', 'foobarfile2']),
+            ])
+
+    def test_walk_depth(self):
+        from ..fs import OleFileFS
+        with OleFileFS(EXAMPLE_STG_PATH) as fs:
+            self.assertEquals(list(fs.walk('foo', search='depth')), [
+                ('foo/bar', ['foobarfile1', 'foobarfile2']),
+                ('foo', ['foofile1', 'foofile2']),
+            ])
+            self.assertEquals(list(fs.walkdirs(search='depth')), [
+                '/bar',
+                '/foo/bar',
+                '/foo',
+                '/',
+            ])
+
+    def test_walk_wildcards(self):
+        from ..fs import OleFileFS
+        with OleFileFS(EXAMPLE_STG_PATH) as fs:
+            # directories by path, files by name
+            self.assertEquals(list(fs.walk(wildcard='*2',
+                                           dir_wildcard='/f*')), [
+                ('/', []),
+                ('/foo', ['foofile2']),
+                ('/foo/bar', ['foobarfile2']),
+            ])
+            # storages not matching are not descended into
+            self.assertEquals(list(fs.walkdirs(wildcard='*/bar')), [
+                '/',
+                '/bar',
+            ])
+
+    def test_walk_invalid(self):
+        from fs.errors import ResourceInvalidError
+        from fs.errors import ResourceNotFoundError
+        from ..fs import OleFileFS
+        with OleFileFS(EXAMPLE_STG_PATH) as fs:
+            self.assertRaises(ResourceNotFoundError, list,
+                              fs.walk('nonexists'))
+            self.assertRaises(ResourceInvalidError, list, fs.walk('a'))
+            self.assertRaises(ValueError, list, fs.walk(search='random'))
+
+    def test_walk_ignore_errors(self):
+        import struct
+        from .corpus import write_container
+        from ..fs import OleFileFS
+        f = io.BytesIO()
+        write_container(f, {'s': {'x': b'1'}, 'y': b'2'})
+        data = bytearray(f.getvalue())
+        # point the child of storage 's' past the directory
+        name = 's\0'.encode('utf-16-le')
+        offset = bytes(data).index(name + b'\0' * (64 - len(name)) +
+                                   struct.pack('<H', len(name)))
+        data[offset + 76:offset + 80] = struct.pack('<I', 0x7fff)
+        with OleFileFS(io.BytesIO(bytes(data)), lazy=True) as fs:
+            self.assertRaises(IOError, list, fs.walk())
+            self.assertEquals(list(fs.walk(ignore_errors=True)), [
+                ('/', ['y']),
+                ('/s', []),
+            ])
+
+    def test_walkfiles(self):
+        from ..fs import OleFileFS
+        with OleFileFS(EXAMPLE_STG_PATH) as fs:
+            self.assertEquals(list(fs.walkfiles('foo')), [
+                'foo/foofile1',
+                'foo/foofile2',
+                'foo/bar/foobarfile1',
+                'foo/bar/foobarfile2',
+            ])
+
     def test_getinfo(self):
         with self._createOne() as fs:
             info = fs.getinfo('Workbook')
@@ -138,7 +294,64 @@ class OleFileFSTest(TestCase):
                 'size': 2743,
                 'created_time': None,
                 'modified_time': None,
+                'storage_type': 2,
+                'clsid': '',
+                'state_bits': 0,
+            })
+
+    def test_getinfo_root(self):
+        with self._createOne() as fs:
+            info = fs.getinfo('/')
+            self.assertEquals(info['size'], 0)
+            self.assertEquals(info['storage_type'], 5)
+            self.assertEquals(info['clsid'],
+                              '00020810-0000-0000-C000-000000000046')
+
+    def test_getinfo_nonexists(self):
+        from fs.errors import ResourceNotFoundError
+        with self._createOne() as fs:
+            self.assertRaises(ResourceNotFoundError, fs.getinfo, 'nonexists')
+
+    def test_listdirinfo(self):
+        from datetime import datetime
+        from ..fs import OleFileFS
+        with OleFileFS(EXAMPLE_STG_PATH) as fs:
+            items = fs.listdirinfo('foo')
+            self.assertEquals([name for name, info in items], [
+                'bar',
+                'foofile1',
+                'foofile2',
+            ])
+            self.assertEquals(items[0][1], {
+                'size': 0,
+                'created_time': datetime(2015, 7, 25, 14, 25, 52, 108000),
+                'modified_time': datetime(2015, 7, 25, 14, 25, 52, 108000),
+                'storage_type': 1,
+                'clsid': '',
+                'state_bits': 0,
             })
+            for name, info in items:
+                self.assertEquals(info, fs.getinfo('foo/' + name))
+
+    def test_listdirinfo_files_only_full(self):
+        from ..fs import OleFileFS
+        with OleFileFS(EXAMPLE_STG_PATH) as fs:
+            items = fs.listdirinfo('foo', files_only=True, full=True)
+            self.assertEquals([(name, info['size']) for name, info in items], [
+                ('foo/foofile1', 13),
+                ('foo/foofile2', 13),
+            ])
+
+    def test_listdir_wildcard(self):
+        with self._createOne() as fs:
+            self.assertEquals(fs.listdir(wildcard='\x05*'), [
+                '\x05DocumentSummaryInformation',
+                '\x05SummaryInformation',
+            ])
+            self.assertEquals(fs.listdir(wildcard=lambda name: 'Ole' in name),
+                              [
+                                  '\x01Ole',
+                              ])
 
     def test_open_w(self):
         from fs.errors import OperationFailedError
@@ -181,6 +394,64 @@ class OleFileFSTest(TestCase):
             with fs.open('Workbook') as f:
                 f.read()
 
+    def test_open_contents(self):
+        from olefile import OleFileIO
+        from ..fs import OleFileFS
+        with OleFileIO(EXAMPLE_STG_PATH) as ole:
+            with OleFileFS(EXAMPLE_STG_PATH) as fs:
+                for path in fs.walkfiles():
+                    segments = path.split('/')[1:]
+                    expected = ole.openstream(segments).read()
+                    with fs.open(path) as f:
+                        self.assertEquals(f.read(), expected)
+
+    def test_open_seek(self):
+        with self._createOne() as fs:
+            with fs.open('Workbook') as f:
+                head = f.read(8)
+                f.seek(-16, 2)
+                tail = f.read()
+            with fs.open('Workbook') as f:
+                data = f.read()
+            self.assertEquals(len(data), 2743)
+            self.assertEquals(head, data[:8])
+            self.assertEquals(tail, data[-16:])
+
+    def test_open_unbuffered(self):
+        from ..stream import OleStream
+        with self._createOne() as fs:
+            with fs.open('Workbook', buffering=0) as f:
+                self.assertTrue(isinstance(f, OleStream))
+                self.assertEquals(len(f.read()), 2743)
+
+    def test_open_mmap(self):
+        from ..fs import OleFileFS
+        with self._createOne() as fs:
+            with fs.open('Workbook') as f:
+                expected = f.read()
+        with OleFileFS(TEST_XLS_PATH, use_mmap=True) as fs:
+            with fs.open('Workbook') as f:
+                views = list(f.views())
+                for view in views:
+                    self.assertTrue(isinstance(view, memoryview))
+                self.assertEquals(b''.join(view.tobytes() for view in views),
+                                  expected)
+                del views
+            with fs.open('Workbook') as f:
+                buf = bytearray(len(expected))
+                self.assertEquals(f.readinto(buf), len(expected))
+                self.assertEquals(bytes(buf), expected)
+
+    def test_open_nonexists(self):
+        from fs.errors import ResourceNotFoundError
+        with self._createOne() as fs:
+            self.assertRaises(ResourceNotFoundError, fs.open, 'nonexists')
+
+    def test_open_storage(self):
+        from fs.errors import ResourceInvalidError
+        with self._createOne() as fs:
+            self.assertRaises(ResourceInvalidError, fs.open, '/')
+
     def test_getmeta(self):
         with self._createOne() as fs:
             self.assertTrue(fs.getmeta('read_only'))
@@ -189,47 +460,389 @@ class OleFileFSTest(TestCase):
             self.assertTrue(fs.getmeta('unicode_paths'))
             self.assertTrue(fs.getmeta('case_insensitive_paths'))
 
+    def test_getmeta_thread_safe(self):
+        from ..fs import OleFileFS
+        with OleFileFS(TEST_XLS_PATH, thread_safe=True) as fs:
+            self.assertTrue(fs.getmeta('thread_safe'))
+        with self._createOne() as fs:
+            self.assertFalse(fs.getmeta('thread_safe'))
 
-class FnsTest(TestCase):
+    def test_thread_safe_source(self):
+        from ..fs import OleFileFS
+        from ..source import LockedSource
+        from ..source import PreadSource
+        with OleFileFS(TEST_XLS_PATH, thread_safe=True) as fs:
+            if hasattr(os, 'pread'):
+                self.assertTrue(isinstance(fs._source, PreadSource))
+        with open(TEST_XLS_PATH, 'rb') as f:
+            data = f.read()
+        with OleFileFS(io.BytesIO(data), thread_safe=True) as fs:
+            self.assertTrue(isinstance(fs._source, LockedSource))
 
-    def test_segments_is_descendant_of(self):
-        from ..fs import segments_is_descendant_of
-        self.assertTrue(segments_is_descendant_of(('A', 'B'), ()))
-        self.assertTrue(segments_is_descendant_of(('A', 'B'), ('A', )))
-        self.assertFalse(segments_is_descendant_of(('A', 'B'), ('A', 'C')))
-        self.assertFalse(segments_is_descendant_of(('A', 'B'), ('B',)))
-        self.assertFalse(segments_is_descendant_of(('A', 'B'), ('A', 'B')))
-        self.assertFalse(segments_is_descendant_of(('A',), ('A', 'B')))
-
-    def test_find_children(self):
-        from ..fs import find_children
-        nodes = [
-            ('A',),
-            ('B', '01'),
-            ('B', '02')
-        ]
-        items = list(find_children((), nodes))
-        self.assertEquals(items, [
-            ('A', ),
-            ('B', ),
-        ])
+    def test_thread_safe_concurrent_reads(self):
+        from multiprocessing.pool import ThreadPool
+        from ..fs import OleFileFS
+        with OleFileFS(EXAMPLE_STG_PATH) as fs:
+            paths = list(fs.walkfiles())
+            expected = dict((path, fs.getcontents(path)) for path in paths)
 
-        items = list(find_children(('B', ), nodes))
-        self.assertEquals(items, [
-            ('B', '01'),
-            ('B', '02')
-        ])
+        with OleFileFS(EXAMPLE_STG_PATH, thread_safe=True) as fs:
+            def read(path):
+                with fs.open(path, buffering=0) as f:
+                    return path, f.read()
+            pool = ThreadPool(8)
+            try:
+                results = pool.map(read, paths * 50)
+            finally:
+                pool.close()
+                pool.join()
+        for path, data in results:
+            self.assertEquals(data, expected[path])
+
+    def test_ministream_cache(self):
+        from olefile import OleFileIO
+        from ..fs import OleFileFS
+        olefile = OleFileIO(EXAMPLE_STG_PATH)
+        try:
+            expected = dict(('/'.join(path),
+                             olefile.openstream(path).read())
+                            for path in olefile.listdir())
+            ministream_size = olefile.root.size
+        finally:
+            olefile.close()
+        with OleFileFS(EXAMPLE_STG_PATH) as fs:
+            for path, data in expected.items():
+                self.assertEquals(fs.getcontents(path), data)
+            # read once, whole
+            self.assertEquals(len(fs._ministream_cache), 1)
+            self.assertEquals(fs._ministream_cache.weight, ministream_size)
+
+    def test_ministream_cache_evicts(self):
+        import random
+        from .corpus import many_entries_tree
+        from .corpus import write_container
+        from ..fs import OleFileFS
+        f = io.BytesIO()
+        write_container(f, many_entries_tree(random.Random(0), storages=20))
+        capacity = 128 * 1024
+        with OleFileFS(f, ministream_cache_size=capacity) as fs:
+            self.assertTrue(fs._olefile.root.size > capacity)
+            paths = list(fs.walkfiles())
+            contents = [fs.getcontents(path) for path in paths]
+            self.assertTrue(fs._ministream_cache.weight <= capacity)
+        with OleFileFS(f, ministream_cache_size=0) as fs:
+            self.assertEquals([fs.getcontents(path) for path in paths],
+                              contents)
+            self.assertEquals(len(fs._ministream_cache), 0)
+
+
+class ReadRangeTest(TestCase):
+
+    def _createOne(self):
+        import random
+        from .corpus import large_stream_tree
+        from .corpus import write_container
+        from ..fs import OleFileFS
+        tree = large_stream_tree(random.Random(0), size=64 * 1024)
+        f = io.BytesIO()
+        write_container(f, tree, fragment=True)
+        f.seek(0)
+        return OleFileFS(f), tree['Workbook']
+
+    def test_readrange(self):
+        fs, data = self._createOne()
+        with fs:
+            self.assertEquals(fs.readrange('Workbook', 1000, 3000),
+                              data[1000:4000])
+            self.assertEquals(fs.readrange('Workbook', len(data) - 10, 100),
+                              data[-10:])
+            self.assertEquals(fs.readrange('Workbook', len(data), 100), b'')
+            self.assertEquals(fs.readrange('\x05Small0', 10, 20),
+                              fs.getcontents('\x05Small0')[10:30])
+
+    def test_readranges(self):
+        fs, data = self._createOne()
+        ranges = [(5000, 100), (0, 10), (5050, 100), (5150, 10),
+                  (20000, 0), (len(data) - 5, 10)]
+        with fs:
+            reads = []
+            source = fs._source
+            readat = source.readat
+
+            def recording_readat(offset, size):
+                reads.append((offset, size))
+                return readat(offset, size)
+            source.readat = recording_readat
+            results = fs.readranges('Workbook', ranges)
+        self.assertEquals(results, [data[offset:offset + length]
+                                    for offset, length in ranges])
+        # 0-10, 5000-5160, 20000 and the tail: each at most one read per
+        # 512-byte sector it spans
+        self.assertTrue(len(reads) <= 1 + 2 + 1 + 2)
 
-        items = list(find_children(('B', ), [
-            ('B', ),
-            ('B', '01'),
-            ('B', '02'),
-        ]))
-        self.assertEquals(items, [
-            ('B', '01'),
-            ('B', '02')
+    def test_readranges_invalid(self):
+        from fs.errors import ResourceInvalidError
+        from fs.errors import ResourceNotFoundError
+        fs, data = self._createOne()
+        with fs:
+            self.assertRaises(ValueError, fs.readranges, 'Workbook',
+                              [(-1, 10)])
+            self.assertRaises(ResourceNotFoundError, fs.readrange,
+                              'nonexists', 0, 1)
+            self.assertRaises(ResourceInvalidError, fs.readrange, '/', 0, 1)
+
+    def test_coalesce_ranges(self):
+        from ..fs import coalesce_ranges
+        self.assertEquals(list(coalesce_ranges([(10, 5), (0, 10), (30, 5),
+                                                (12, 1)])), [
+            (0, 15, [(1, 0, 10), (0, 10, 5), (3, 12, 1)]),
+            (30, 35, [(2, 30, 5)]),
         ])
 
+class MemoryBudgetTest(TestCase):
+
+    def test_open(self):
+        from fs.errors import OperationFailedError
+        from ..fs import OleFileFS
+        with OleFileFS(EXAMPLE_STG_PATH) as fs:
+            tables = fs.getmemoryusage()['tables']
+        budget = tables + 2 * io.DEFAULT_BUFFER_SIZE
+        with OleFileFS(EXAMPLE_STG_PATH, memory_budget=budget,
+                       ministream_cache_size=0) as fs:
+            self.assertEquals(fs.getmemoryusage(), {
+                'tables': tables, 'used': tables, 'limit': budget,
+            })
+            first = fs.open('foo/foofile1')
+            second = fs.open('foo/foofile2')
+            self.assertEquals(fs.getmemoryusage()['buffers'],
+                              2 * io.DEFAULT_BUFFER_SIZE)
+            self.assertRaises(OperationFailedError, fs.open, 'a')
+            # unbuffered streams own no buffer
+            fs.open('a', buffering=0).close()
+            first.close()
+            with fs.open('a') as f:
+                self.assertTrue(f.read())
+            second.close()
+            self.assertEquals(fs.getmemoryusage()['buffers'], 0)
+        self.assertEquals(fs.getmemoryusage()['used'], 0)
+
+    def test_wait(self):
+        import threading
+        from ..fs import OleFileFS
+        with OleFileFS(EXAMPLE_STG_PATH) as fs:
+            tables = fs.getmemoryusage()['tables']
+        with OleFileFS(EXAMPLE_STG_PATH, thread_safe=True,
+                       memory_budget=tables + io.DEFAULT_BUFFER_SIZE,
+                       memory_wait=10) as fs:
+            first = fs.open('foo/foofile1')
+            timer = threading.Timer(0.05, first.close)
+            timer.start()
+            try:
+                with fs.open('foo/foofile2') as f:
+                    self.assertTrue(f.read())
+            finally:
+                timer.join()
+
+    def test_evicts_ministream(self):
+        from ..fs import OleFileFS
+        with OleFileFS(EXAMPLE_STG_PATH) as fs:
+            usage = fs.getmemoryusage()
+            for path in fs.walkfiles():
+                fs.getcontents(path)
+            ministream = fs.getmemoryusage()['ministream']
+            self.assertTrue(ministream > 0)
+        budget = usage['tables'] + ministream + io.DEFAULT_BUFFER_SIZE - 1
+        with OleFileFS(EXAMPLE_STG_PATH, memory_budget=budget) as fs:
+            fs.readrange('a', 0, 10)
+            self.assertEquals(fs.getmemoryusage()['ministream'], ministream)
+            with fs.open('a') as f:
+                self.assertEquals(fs.getmemoryusage()['ministream'], 0)
+                self.assertEquals(f.read(), fs.readrange('a', 0, 100))
+
+    def test_shared(self):
+        from ..cache import MemoryBudget
+        from ..fs import OleFileFS
+        budget = MemoryBudget()
+        with OleFileFS(EXAMPLE_STG_PATH, memory_budget=budget):
+            with OleFileFS(TEST_XLS_PATH, memory_budget=budget,
+                           lazy=True) as fs:
+                fs.getcontents('Workbook')
+                self.assertTrue(budget.usage()['tables'] > 0)
+        self.assertEquals(budget.used, 0)
+
+    def test_close_twice(self):
+        from ..cache import MemoryBudget
+        from ..fs import OleFileFS
+        budget = MemoryBudget()
+        with OleFileFS(EXAMPLE_STG_PATH, memory_budget=budget):
+            with OleFileFS(TEST_XLS_PATH, memory_budget=budget) as fs:
+                fs.getcontents('Workbook')
+            fs.close()
+            self.assertTrue(fs.closed)
+            self.assertTrue(budget.usage()['tables'] > 0)
+        self.assertEquals(budget.used, 0)
+
+
+class NestedContainerTest(TestCase):
+
+    def _createOne(self, **kwargs):
+        import random
+        from .corpus import large_stream_tree
+        from .corpus import write_container
+        from ..fs import OleFileFS
+        inner = io.BytesIO()
+        write_container(inner, large_stream_tree(random.Random(0),
+                                                 size=1024 * 1024),
+                        fragment=True)
+        with open(TEST_XLS_PATH, 'rb') as f:
+            xls = f.read()
+        outer = io.BytesIO()
+        write_container(outer, {
+            'Embedded': inner.getvalue(),
+            'ObjectPool': {'_1': {'Package': xls}},
+            'Text': b'not a container' * 1000,
+        }, fragment=True, seed=1)
+        outer.seek(0)
+        inner.seek(0)
+        return OleFileFS(outer, **kwargs), inner
+
+    def test_opencontainer(self):
+        from ..fs import OleFileFS
+        fs, inner = self._createOne()
+        with fs:
+            with fs.opencontainer('Embedded') as nested:
+                with OleFileFS(inner) as expected:
+                    self.assertEquals(sorted(nested.listdir('/')),
+                                      sorted(expected.listdir('/')))
+                    for path in expected.walkfiles():
+                        self.assertEquals(nested.getcontents(path),
+                                          expected.getcontents(path))
+            with fs.opencontainer('ObjectPool/_1/Package') as nested:
+                with OleFileFS(TEST_XLS_PATH) as expected:
+                    self.assertEquals(nested.getcontents('Workbook'),
+                                      expected.getcontents('Workbook'))
+            # the outer container stays open
+            self.assertTrue(fs.isfile('Text'))
+
+    def test_opencontainer_reads_only_needed_sectors(self):
+        fs, inner = self._createOne()
+        with fs:
+            reads = []
+            source = fs._source
+            readat = source.readat
+
+            def recording_readat(offset, size):
+                reads.append(size)
+                return readat(offset, size)
+            source.readat = recording_readat
+            with fs.opencontainer('Embedded') as nested:
+                nested.getcontents('\x05Small0')
+            self.assertTrue(0 < sum(reads) < fs.getsize('Embedded') // 10)
+
+    def test_opencontainer_thread_safe(self):
+        fs, inner = self._createOne(thread_safe=True)
+        with fs:
+            with fs.opencontainer('Embedded') as nested:
+                self.assertTrue(nested.getmeta('thread_safe'))
+
+    def test_iscontainer(self):
+        fs, inner = self._createOne()
+        with fs:
+            self.assertTrue(fs.iscontainer('Embedded'))
+            self.assertTrue(fs.iscontainer('ObjectPool/_1/Package'))
+            self.assertFalse(fs.iscontainer('Text'))
+            self.assertFalse(fs.iscontainer('ObjectPool'))
+            self.assertFalse(fs.iscontainer('nonexists'))
+
+    def test_opencontainer_invalid(self):
+        from fs.errors import ResourceInvalidError
+        from fs.errors import ResourceNotFoundError
+        fs, inner = self._createOne()
+        with fs:
+            self.assertRaises(ResourceInvalidError, fs.opencontainer, 'Text')
+            self.assertRaises(ResourceInvalidError, fs.opencontainer,
+                              'ObjectPool')
+            self.assertRaises(ResourceNotFoundError, fs.opencontainer,
+                              'nonexists')
+
+class StatsTest(TestCase):
+
+    def test_not_instrumented(self):
+        from ..fs import OleFileFS
+        with OleFileFS(EXAMPLE_STG_PATH) as fs:
+            fs.getcontents('a')
+            self.assertEquals(fs.stats(), {})
+
+    def test_stats(self):
+        from ..fs import OleFileFS
+        from ..stats import process_stats
+        before = process_stats.snapshot()
+        with OleFileFS(TEST_XLS_PATH, instrument=True,
+                       ministream_cache_size=0) as fs:
+            parsed = fs.stats()
+            self.assertTrue(parsed['reads'] > 0)
+            self.assertEquals(parsed['bytes_read'], parsed['sectors_read'] *
+                              512)
+            with fs.open('Workbook') as f:
+                data = f.read()
+            fs.getinfo('Workbook')
+            fs.listdir('/')
+            self.assertEquals(len(list(fs.walk())), 1)
+            stats = fs.stats()
+        # the stream, and the MiniFAT sector which maps it
+        self.assertEquals(stats['bytes_read'] - parsed['bytes_read'],
+                          len(data) + 512)
+        self.assertTrue(stats['seeks'] > parsed['seeks'])
+        # 'Workbook' and '/' are resolved once each
+        self.assertEquals(stats['path_cache.misses'], 2)
+        self.assertEquals(stats['path_cache.hits'], 2)
+        self.assertEquals(stats['path_resolutions'], 2)
+        # Workbook, in the mini stream, and the mini stream
+        self.assertEquals(stats['extents_cache.misses'], 2)
+        for method in 'open', 'getinfo', 'listdir', 'walk':
+            self.assertEquals(stats['calls.' + method], 1)
+            self.assertTrue(stats['time.' + method] >= 0)
+        after = process_stats.snapshot()
+        self.assertTrue(after['bytes_read'] - before.get('bytes_read', 0) >=
+                        stats['bytes_read'])
+
+    def test_thread_safe_ministream(self):
+        from ..fs import OleFileFS
+        with OleFileFS(EXAMPLE_STG_PATH, instrument=True,
+                       thread_safe=True) as fs:
+            before = fs.stats()
+            fs.getcontents('a')
+            fs.getcontents('b')
+            stats = fs.stats()
+        self.assertEquals(stats['ministream_cache.misses'], 1)
+        self.assertEquals(stats['ministream_cache.hits'], 1)
+        if hasattr(os, 'pread'):
+            # positional reads: no seeks
+            self.assertEquals(stats['seeks'], before['seeks'])
+        reads = stats['reads'] - before['reads']
+        self.assertTrue(0 < reads <= stats['syscalls'] - before['syscalls'])
+
+    def test_lazy(self):
+        from ..fs import OleFileFS
+        with OleFileFS(TEST_XLS_PATH, instrument=True, lazy=True) as fs:
+            fs.getcontents('Workbook')
+            stats = fs.stats()
+        self.assertEquals(stats['fat_pages_read'], 1)
+        self.assertTrue(stats['directory_entries_read'] > 1)
+
+    def test_callback(self):
+        from ..fs import OleFileFS
+        counted = []
+        with OleFileFS(EXAMPLE_STG_PATH,
+                       stats_callback=lambda name, value:
+                       counted.append(name)) as fs:
+            fs.getinfo('a')
+        self.assertTrue('calls.getinfo' in counted)
+        self.assertTrue('reads' in counted)
+
+
+class FnsTest(TestCase):
+
     def test_path_to_segments_normalized(self):
         from ..fs import path_to_segments_normalized
         self.assertEquals(path_to_segments_normalized('/'),
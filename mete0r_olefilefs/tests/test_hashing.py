@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+#
+#   mete0r.olefilefs : PyFilesystem interface to olefile
+#   Copyright (C) 2015 mete0r <mete0r@sarangbang.or.kr>
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU Lesser General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU Lesser General Public License for more details.
+#
+#   You should have received a copy of the GNU Lesser General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+from unittest import TestCase
+import hashlib
+import os.path
+import shutil
+import tempfile
+
+
+FILES_DIR = os.path.join(os.path.dirname(__file__), 'files')
+TEST_XLS_PATH = os.path.join(FILES_DIR, 'test.xls')
+EXAMPLE_STG_PATH = os.path.join(FILES_DIR, 'example.stg')
+
+
+class DigestTest(TestCase):
+
+    def test_getdigests(self):
+        from ..fs import OleFileFS
+        with OleFileFS(TEST_XLS_PATH) as fs:
+            data = fs.getcontents('Workbook')
+            digests = fs.getdigests('Workbook', ['md5', 'sha256'],
+                                    chunk_size=100)
+        self.assertEquals(digests, {
+            'md5': hashlib.md5(data).hexdigest(),
+            'sha256': hashlib.sha256(data).hexdigest(),
+        })
+
+    def test_hashstreams(self):
+        from ..fs import OleFileFS
+        with OleFileFS(EXAMPLE_STG_PATH) as fs:
+            expected = [(path, {'sha1': hashlib.sha1(
+                fs.getcontents(path)).hexdigest()})
+                for path in fs.walkfiles()]
+            self.assertEquals(list(fs.hashstreams(algorithms=['sha1'])),
+                              expected)
+        with OleFileFS(EXAMPLE_STG_PATH, thread_safe=True) as fs:
+            self.assertEquals(list(fs.hashstreams(algorithms=['sha1'],
+                                                  threads=4)),
+                              expected)
+
+    def test_cache(self):
+        from ..fs import OleFileFS
+        from ..hashing import DigestCache
+        cache = DigestCache()
+        with OleFileFS(TEST_XLS_PATH) as fs:
+            digests = fs.getdigests('Workbook', ['md5'], cache)
+            self.assertEquals(len(cache), 1)
+            key = list(cache.entries)[0]
+            # served from the cache
+            cache.entries[key] = {'md5': 'cached'}
+            self.assertEquals(fs.getdigests('Workbook', ['md5'], cache),
+                              {'md5': 'cached'})
+            # missing algorithms are computed, and merged
+            digests = fs.getdigests('Workbook', ['md5', 'sha1'], cache)
+            self.assertNotEquals(digests['md5'], 'cached')
+            self.assertEquals(sorted(cache.entries[key]), ['md5', 'sha1'])
+
+    def test_cache_file(self):
+        from ..fs import OleFileFS
+        from ..hashing import DigestCache
+        directory = tempfile.mkdtemp()
+        try:
+            container = os.path.join(directory, 'test.xls')
+            shutil.copyfile(TEST_XLS_PATH, container)
+            path = os.path.join(directory, 'digests.json')
+            cache = DigestCache(path)
+            with OleFileFS(container) as fs:
+                digests = dict(fs.hashstreams(cache=cache))
+            cache.save()
+
+            cache = DigestCache(path)
+            self.assertEquals(len(cache), len(digests))
+            self.assertEquals(cache.added, {})
+            with OleFileFS(container) as fs:
+                self.assertEquals(dict(fs.hashstreams(cache=cache)), digests)
+            self.assertEquals(cache.added, {})
+
+            # a modified container misses
+            stat = os.stat(container)
+            os.utime(container, (stat.st_atime, stat.st_mtime + 10))
+            with OleFileFS(container) as fs:
+                self.assertEquals(dict(fs.hashstreams(cache=cache)), digests)
+            self.assertEquals(len(cache.added), len(digests))
+        finally:
+            shutil.rmtree(directory)
+
+    def test_no_cache_for_file_objects(self):
+        from ..fs import OleFileFS
+        from ..hashing import DigestCache
+        cache = DigestCache()
+        with open(TEST_XLS_PATH, 'rb') as f:
+            with OleFileFS(f) as fs:
+                fs.getdigests('Workbook', cache=cache)
+        self.assertEquals(len(cache), 0)
@@ -0,0 +1,252 @@
+# -*- coding: utf-8 -*-
+#
+#   mete0r.olefilefs : PyFilesystem interface to olefile
+#   Copyright (C) 2015 mete0r <mete0r@sarangbang.or.kr>
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU Lesser General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU Lesser General Public License for more details.
+#
+#   You should have received a copy of the GNU Lesser General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+from unittest import TestCase
+import io
+import os.path
+import random
+
+
+FILES_DIR = os.path.join(os.path.dirname(__file__), 'files')
+TEST_XLS_PATH = os.path.join(FILES_DIR, 'test.xls')
+EXAMPLE_STG_PATH = os.path.join(FILES_DIR, 'example.stg')
+
+
+class RecordingFile(io.BytesIO):
+
+    def __init__(self, data):
+        io.BytesIO.__init__(self, data)
+        self.reads = []
+
+    def read(self, size=-1):
+        data = io.BytesIO.read(self, size)
+        self.reads.append(len(data))
+        return data
+
+    def readinto(self, buffer):
+        size = io.BytesIO.readinto(self, buffer)
+        self.reads.append(size)
+        return size
+
+
+def corpus_container(tree, **kwargs):
+    from .corpus import write_container
+    f = io.BytesIO()
+    write_container(f, tree, **kwargs)
+    return f.getvalue()
+
+
+class LazyOleFileFSTest(TestCase):
+
+    def assertSameFS(self, data):
+        from ..fs import OleFileFS
+        with OleFileFS(io.BytesIO(data)) as expected:
+            with OleFileFS(io.BytesIO(data), lazy=True) as fs:
+                self.assertEquals(list(fs.walk()), list(expected.walk()))
+                for path in expected.walkdirs():
+                    self.assertEquals(fs.listdirinfo(path),
+                                      expected.listdirinfo(path))
+                for path in expected.walkfiles():
+                    self.assertEquals(fs.getinfo(path),
+                                      expected.getinfo(path))
+                    self.assertEquals(fs.getcontents(path),
+                                      expected.getcontents(path))
+                self.assertEquals(fs.getinfo('/'), expected.getinfo('/'))
+
+    def test_files(self):
+        for path in (TEST_XLS_PATH, EXAMPLE_STG_PATH):
+            with open(path, 'rb') as f:
+                self.assertSameFS(f.read())
+
+    def test_corpus(self):
+        from .corpus import deep_tree
+        from .corpus import large_stream_tree
+        from .corpus import many_entries_tree
+        rng = random.Random(0)
+        self.assertSameFS(corpus_container(deep_tree(rng, depth=8)))
+        self.assertSameFS(corpus_container(
+            many_entries_tree(rng, storages=10, streams=30), version=4))
+        # DIFAT: more than 109 FAT sectors
+        self.assertSameFS(corpus_container(
+            large_stream_tree(rng, size=7 * 1024 * 1024, small=2),
+            fragment=True))
+
+    def test_reads_header_only(self):
+        from ..fs import OleFileFS
+        with open(TEST_XLS_PATH, 'rb') as f:
+            f = RecordingFile(f.read())
+        fs = OleFileFS(f, lazy=True)
+        try:
+            self.assertEquals(f.reads, [512])
+            self.assertTrue(fs.isfile('Workbook'))
+        finally:
+            fs.close()
+
+    def test_reads_few_sectors(self):
+        from .corpus import many_entries_tree
+        from ..fs import OleFileFS
+        tree = many_entries_tree(random.Random(0), storages=100)
+        f = RecordingFile(corpus_container(tree))
+        with OleFileFS(f, lazy=True) as fs:
+            name = '__recip_version1.0_#00000000'
+            self.assertTrue(fs.isdir(name))
+            self.assertEquals(fs.getsize(name + '/__substg1.0_00000000'),
+                              200)
+            # the root storage, one of its storages, and some FAT pages
+            self.assertTrue(sum(f.reads) < len(f.getvalue()) // 20)
+
+    def test_lookup_descends_sibling_trees(self):
+        from .corpus import many_entries_tree
+        from ..fs import OleFileFS
+        tree = many_entries_tree(random.Random(0), storages=1000, streams=5)
+        f = RecordingFile(corpus_container(tree))
+        with OleFileFS(f, lazy=True) as fs:
+            del f.reads[:]
+            path = '__recip_version1.0_#000001F3/__substg1.0_00000002'
+            self.assertTrue(fs.isfile(path))
+            self.assertTrue(fs.isfile(path.upper()))
+            # a few directory sectors and FAT pages, not the thousands of
+            # entries
+            self.assertTrue(len(f.reads) < 30)
+            self.assertTrue(sum(f.reads) < 30 * 512)
+            # misses read the other children of the entries on the way,
+            # too
+            del f.reads[:]
+            self.assertFalse(fs.exists('__recip_version1.0_#00001000'))
+            self.assertFalse(fs.exists(path + 'X'))
+            self.assertTrue(len(f.reads) < 30)
+            self.assertTrue(sum(f.reads) < 30 * 512)
+            self.assertEquals(fs.getcontents(path),
+                              tree['__recip_version1.0_#000001F3']
+                              ['__substg1.0_00000002'])
+            self.assertTrue(sum(f.reads) < len(f.getvalue()) // 10)
+
+    def test_findkid(self):
+        from olefile import OleFileIO
+        from .corpus import many_entries_tree
+        from ..lazy import LazyOleFile
+        tree = many_entries_tree(random.Random(0), storages=50, streams=3)
+        data = corpus_container(tree)
+        expected = OleFileIO(io.BytesIO(data))
+        olefile = LazyOleFile(io.BytesIO(data))
+        try:
+            for storage in expected.root.kids:
+                kid = olefile.root.findkid(storage.name.lower())
+                self.assertEquals(kid.sid, storage.sid)
+                for stream in storage.kids:
+                    self.assertEquals(kid.findkid(stream.name).sid,
+                                      stream.sid)
+                self.assertEquals(kid.findkid('nonexists'), None)
+            self.assertEquals(olefile.root.findkid('nonexists'), None)
+        finally:
+            olefile.close()
+            expected.close()
+
+    def test_findkid_unsorted(self):
+        from ..fs import OleFileFS
+        # ordered by code point, not by length first
+        tree = {'b': b'1', 'aa': b'2', 'c': {'dd': b'3', 'e': b'4'}}
+        data = corpus_container(tree, sibling_key=lambda name: name)
+        with OleFileFS(io.BytesIO(data), lazy=True) as fs:
+            self.assertEquals(fs.getcontents('AA'), b'2')
+            self.assertEquals(fs.getcontents('c/dd'), b'3')
+            self.assertEquals(fs.getcontents('c/e'), b'4')
+            self.assertFalse(fs.exists('ff'))
+
+    def test_mmap(self):
+        from ..fs import OleFileFS
+        with OleFileFS(TEST_XLS_PATH, lazy=True, use_mmap=True) as fs:
+            with OleFileFS(TEST_XLS_PATH) as expected:
+                self.assertEquals(fs.getcontents('Workbook'),
+                                  expected.getcontents('Workbook'))
+
+    def test_thread_safe(self):
+        from multiprocessing.pool import ThreadPool
+        from ..fs import OleFileFS
+        with OleFileFS(EXAMPLE_STG_PATH) as fs:
+            paths = list(fs.walkfiles())
+            expected = dict((path, fs.getcontents(path)) for path in paths)
+
+        with OleFileFS(EXAMPLE_STG_PATH, lazy=True, thread_safe=True) as fs:
+            def read(path):
+                return path, fs.getcontents(path)
+            pool = ThreadPool(8)
+            try:
+                results = pool.map(read, paths * 20)
+            finally:
+                pool.close()
+                pool.join()
+        for path, data in results:
+            self.assertEquals(data, expected[path])
+
+    def test_thread_safe_budget(self):
+        import sys
+        import threading
+        from .corpus import many_entries_tree
+        from ..cache import MemoryBudget
+        from ..fs import OleFileFS
+        tree = many_entries_tree(random.Random(0), storages=40)
+        paths = ['%s/%s' % (storage, stream)
+                 for storage, streams in tree.items()
+                 for stream in streams]
+        budget = MemoryBudget(300 * 1024)
+        fs = OleFileFS(io.BytesIO(corpus_container(tree)), lazy=True,
+                       thread_safe=True, memory_budget=budget,
+                       ministream_cache_size=64 * 1024)
+        errors = []
+
+        # reading entries and FAT pages charges the budget, which evicts
+        # ministream blocks, while other threads look up the MiniFAT
+        def read(paths):
+            try:
+                for path in paths:
+                    # unbuffered: the tables alone outgrow the budget
+                    with fs.open(path, buffering=0) as f:
+                        data = f.read()
+                    storage, stream = path.split('/')
+                    assert data == tree[storage][stream], path
+            except Exception as e:
+                errors.append(e)
+        threads = [threading.Thread(target=read, args=(paths[i::8],))
+                   for i in range(8)]
+        # switch threads often, to interleave the lock acquisitions
+        if hasattr(sys, 'setswitchinterval'):
+            interval = sys.getswitchinterval()
+            sys.setswitchinterval(1e-6)
+        try:
+            for thread in threads:
+                thread.daemon = True
+                thread.start()
+            for thread in threads:
+                thread.join(10)
+        finally:
+            if hasattr(sys, 'setswitchinterval'):
+                sys.setswitchinterval(interval)
+        # a deadlocked fs would block close() too
+        self.assertFalse(any(thread.is_alive() for thread in threads))
+        fs.close()
+        self.assertEquals(errors, [])
+
+    def test_not_ole(self):
+        from fs.errors import CreateFailedError
+        from ..fs import OleFileFS
+        self.assertRaises(CreateFailedError, OleFileFS,
+                          io.BytesIO(b'not an OLE file' * 100), lazy=True)
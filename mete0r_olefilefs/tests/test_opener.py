@@ -22,6 +22,8 @@ from __future__ import unicode_literals
 from unittest import TestCase
 
 import os.path
+import shutil
+import tempfile
 
 
 FILES_DIR = os.path.join(os.path.dirname(__file__), 'files')
@@ -59,3 +61,113 @@ class OpenerTest(TestCase):
         registry = OpenerRegistry(openers + [Opener])
         with registry.open('olefile://' + TEST_XLS_PATH + '/Workbook'):
             pass
+
+
+class ContainerPoolTest(TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tempdir, 'test.xls')
+        shutil.copyfile(TEST_XLS_PATH, self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def test_open(self):
+        from ..opener import ContainerPool
+        pool = ContainerPool()
+        fs, path = pool.open(self.path + '/Workbook')
+        self.assertEquals(path, 'Workbook')
+        self.assertTrue(fs.getmeta('thread_safe'))
+        other, path = pool.open(self.path + '/nonexists')
+        self.assertTrue(other is fs)
+        self.assertEquals(path, 'nonexists')
+        other, path = pool.open(self.path)
+        self.assertTrue(other is fs)
+        self.assertEquals(path, '')
+        self.assertEquals(pool.open(self.tempdir + '/nonexists/Workbook'),
+                          None)
+
+    def test_refcount(self):
+        from ..opener import ContainerPool
+        pool = ContainerPool()
+        fs, path = pool.open(self.path + '/Workbook')
+        other, path = pool.open(self.path + '/Workbook')
+        fs.close()
+        other.close()
+        # still held by the pool
+        self.assertFalse(fs.closed)
+        self.assertTrue(fs.isfile('Workbook'))
+        pool.clear()
+        self.assertTrue(fs.closed)
+
+    def test_refcount_extra_close(self):
+        from ..opener import ContainerPool
+        pool = ContainerPool()
+        fs, path = pool.open(self.path + '/Workbook')
+        fs.close()
+        # once more, dropping the reference of the pool
+        fs.close()
+        other, path = pool.open(self.path + '/Workbook')
+        self.assertFalse(other.closed)
+        self.assertTrue(other.getcontents('Workbook'))
+        other.close()
+        self.assertFalse(other.closed)
+        pool.clear()
+        self.assertTrue(other.closed)
+
+    def test_reopen_modified(self):
+        from ..opener import ContainerPool
+        pool = ContainerPool()
+        fs, path = pool.open(self.path + '/Workbook')
+        stat = os.stat(self.path)
+        os.utime(self.path, (stat.st_atime, stat.st_mtime + 10))
+        other, path = pool.open(self.path + '/Workbook')
+        self.assertFalse(other is fs)
+        self.assertFalse(fs.closed)
+        fs.close()
+        self.assertTrue(fs.closed)
+        other.close()
+        self.assertFalse(other.closed)
+
+    def test_max_open(self):
+        from ..opener import ContainerPool
+        other_path = os.path.join(self.tempdir, 'other.xls')
+        shutil.copyfile(TEST_XLS_PATH, other_path)
+        pool = ContainerPool(max_open=1)
+        fs, path = pool.open(self.path + '/Workbook')
+        fs.close()
+        other, path = pool.open(other_path + '/Workbook')
+        self.assertTrue(fs.closed)
+        self.assertEquals(len(pool.containers), 1)
+        other.close()
+        self.assertFalse(other.closed)
+
+    def test_get_fs_pooled(self):
+        from fs.opener import OpenerRegistry
+        from fs.opener import opener as opener_base
+        from ..opener import Opener
+
+        openers = sorted(opener_base.openers.items())
+        openers = list(value for index, value in openers)
+        registry = OpenerRegistry(openers + [Opener])
+        fs, path = Opener.get_fs(registry=registry,
+                                 fs_name='olefile',
+                                 fs_name_params=None,
+                                 fs_path=self.path + '/Workbook',
+                                 writable=False,
+                                 create_dir=False)
+        with registry.open('olefile://' + self.path + '/Workbook') as f:
+            self.assertTrue(f.read(4))
+        self.assertFalse(fs.closed)
+        other, path = Opener.get_fs(registry=registry,
+                                    fs_name='olefile',
+                                    fs_name_params=None,
+                                    fs_path=self.path + '/Workbook',
+                                    writable=False,
+                                    create_dir=False)
+        self.assertTrue(other is fs)
+        fs.close()
+        other.close()
+        Opener.pool.clear()
+        self.assertTrue(fs.closed)
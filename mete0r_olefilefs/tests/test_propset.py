@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+#
+#   mete0r.olefilefs : PyFilesystem interface to olefile
+#   Copyright (C) 2015 mete0r <mete0r@sarangbang.or.kr>
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU Lesser General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU Lesser General Public License for more details.
+#
+#   You should have received a copy of the GNU Lesser General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+from unittest import TestCase
+import datetime
+import os.path
+import struct
+import uuid
+
+
+FILES_DIR = os.path.join(os.path.dirname(__file__), 'files')
+TEST_XLS_PATH = os.path.join(FILES_DIR, 'test.xls')
+EXAMPLE_STG_PATH = os.path.join(FILES_DIR, 'example.stg')
+
+FMTID = uuid.UUID('D5CDD505-2E9C-101B-9397-08002B2CF9AE').bytes_le
+
+
+def pad(data):
+    return data + b'\0' * (-len(data) % 4)
+
+
+def property_set_stream(properties):
+    ''' A property set stream of one set of (id, encoded value) pairs.
+    '''
+    values = b''
+    offsets = []
+    header_size = 8 + 8 * len(properties)
+    for pid, value in properties:
+        offsets.append((pid, header_size + len(values)))
+        values += pad(value)
+    section = struct.pack('<II', header_size + len(values), len(properties))
+    section += b''.join(struct.pack('<II', pid, offset)
+                        for pid, offset in offsets) + values
+    return struct.pack('<HHI16sI', 0xFFFE, 0, 0, b'\0' * 16, 1) + \
+        FMTID + struct.pack('<I', 48) + section
+
+
+def lpstr(text):
+    data = text.encode('cp1252') + b'\0'
+    return struct.pack('<I', len(data)) + pad(data)
+
+
+class ParsePropertySetsTest(TestCase):
+
+    def test_types(self):
+        from ..propset import parse_property_sets
+        filetime = (datetime.datetime(2015, 7, 20) -
+                    datetime.datetime(1601, 1, 1)).days * 864000000000
+        dictionary = struct.pack('<I', 1) + struct.pack('<II', 2, 6) + \
+            b'Owner\0'
+        data = property_set_stream([
+            (0, dictionary),
+            (1, struct.pack('<HHh', 2, 0, 1252)),
+            (2, struct.pack('<HH', 30, 0) + lpstr('caf\xe9')),
+            (3, struct.pack('<HHi', 3, 0, -7)),
+            (4, struct.pack('<HHQ', 64, 0, filetime)),
+            (5, struct.pack('<HHh', 11, 0, -1)),
+            (6, struct.pack('<HHI', 31, 0, 3) + 'h\xe9\0'.encode(
+                'utf-16-le')),
+            (7, struct.pack('<HHI', 0x1000 | 12, 0, 2) +
+             struct.pack('<HH', 30, 0) + lpstr('Pages') +
+             struct.pack('<HHi', 3, 0, 2)),
+            (8, struct.pack('<HHI', 65, 0, 3) + b'abc'),
+            (9, struct.pack('<HHd', 7, 0, 2.5)),
+            (10, struct.pack('<HH', 0xFF, 0)),
+        ])
+        property_set, = parse_property_sets(data)
+        self.assertEquals(property_set.fmtid,
+                          'D5CDD505-2E9C-101B-9397-08002B2CF9AE')
+        properties = dict((prop.id, prop)
+                          for prop in property_set.properties)
+        self.assertFalse(0 in properties)
+        self.assertEquals(properties[1].name, 'codepage')
+        self.assertEquals(properties[1].value, 1252)
+        self.assertEquals(properties[2].name, 'Owner')
+        self.assertEquals(properties[2].type, 'VT_LPSTR')
+        self.assertEquals(properties[2].value, 'caf\xe9')
+        self.assertEquals(properties[3].value, -7)
+        self.assertEquals(properties[4].value,
+                          datetime.datetime(2015, 7, 20))
+        self.assertEquals(properties[5].value, True)
+        self.assertEquals(properties[6].value, 'h\xe9')
+        self.assertEquals(properties[7].type, 'VT_VECTOR|VT_VARIANT')
+        self.assertEquals(properties[7].value, ['Pages', 2])
+        self.assertEquals(properties[8].value, b'abc')
+        self.assertEquals(properties[9].value,
+                          datetime.datetime(1900, 1, 1, 12))
+        self.assertEquals(properties[10].type, '0x00FF')
+        self.assertEquals(properties[10].value, None)
+
+    def test_invalid(self):
+        from ..propset import parse_property_sets
+        self.assertRaises(ValueError, parse_property_sets, b'')
+        self.assertRaises(ValueError, parse_property_sets, b'\0' * 48)
+        data = property_set_stream([(2, struct.pack('<HH', 30, 0) +
+                                     lpstr('title'))])
+        self.assertRaises(ValueError, parse_property_sets, data[:-8])
+
+    def test_corrupt_values(self):
+        from ..propset import parse_property_sets
+        data = property_set_stream([
+            # a codepage of an unsupported type
+            (1, struct.pack('<HH', 0xFF, 0)),
+            # dates out of the range of datetime
+            (2, struct.pack('<HHd', 7, 0, 1e300)),
+            (3, struct.pack('<HHd', 7, 0, float('nan'))),
+            (4, struct.pack('<HHQ', 64, 0, 2 ** 64 - 1)),
+        ])
+        property_set, = parse_property_sets(data)
+        values = [prop.value for prop in property_set.properties]
+        self.assertEquals(values[0], None)
+        self.assertEquals(values[1], 1e300)
+        self.assertTrue(values[2] != values[2])
+        self.assertEquals(values[3], 2 ** 64 - 1)
+
+    def test_corrupt_vectors(self):
+        from ..propset import parse_property_sets
+        # a vector of 2 ** 32 - 1 empty elements
+        data = property_set_stream([
+            (2, struct.pack('<HHI', 0x1000, 0, 0xFFFFFFFF)),
+        ])
+        self.assertRaises(ValueError, parse_property_sets, data)
+        # vectors of variants, each a vector of variants
+        data = property_set_stream([
+            (2, struct.pack('<HHI', 0x100C, 0, 1) * 5000),
+        ])
+        self.assertRaises(ValueError, parse_property_sets, data)
+
+    def test_json(self):
+        from ..propset import Property
+        from ..propset import PropertySet
+        from ..propset import property_set_json
+        property_set = PropertySet('F29F85E0-4FF9-1068-AB91-08002B27B3D9', [
+            Property(12, 'create_time', 'VT_FILETIME',
+                     datetime.datetime(2015, 7, 20, 23, 44, 10)),
+            Property(17, 'thumbnail', 'VT_CF', b'\0\1'),
+        ])
+        self.assertEquals(property_set_json(property_set), {
+            'fmtid': 'F29F85E0-4FF9-1068-AB91-08002B27B3D9',
+            'properties': [
+                {'id': 12, 'name': 'create_time', 'type': 'VT_FILETIME',
+                 'value': '2015-07-20T23:44:10'},
+                {'id': 17, 'name': 'thumbnail', 'type': 'VT_CF',
+                 'value': 'AAE='},
+            ],
+        })
+
+
+class GetPropertySetsTest(TestCase):
+
+    def test_summary_information(self):
+        import olefile
+        from ..fs import OleFileFS
+        from ..propset import FMTID_SUMMARY_INFORMATION
+        ole = olefile.OleFileIO(TEST_XLS_PATH)
+        try:
+            metadata = ole.get_metadata()
+        finally:
+            ole.close()
+        with OleFileFS(TEST_XLS_PATH, lazy=True, instrument=True,
+                       ministream_cache_size=0) as fs:
+            property_set = fs.getpropertysets('\x05SummaryInformation')[0]
+            # the header, directory, FAT and MiniFAT sectors, and the
+            # mini sectors of the stream
+            self.assertTrue(fs.stats()['bytes_read'] <
+                            os.path.getsize(TEST_XLS_PATH) // 2)
+        self.assertEquals(property_set.fmtid, FMTID_SUMMARY_INFORMATION)
+        properties = dict((prop.name, prop.value)
+                          for prop in property_set.properties)
+        self.assertEquals(properties['author'],
+                          metadata.author.decode('utf-8'))
+        self.assertEquals(properties['create_time'], metadata.create_time)
+        self.assertEquals(properties['total_edit_time'], 0)
+
+    def test_invalid(self):
+        from fs.errors import ResourceInvalidError
+        from ..fs import OleFileFS
+        with OleFileFS(EXAMPLE_STG_PATH) as fs:
+            self.assertRaises(ResourceInvalidError, fs.getpropertysets, 'a')
+            self.assertRaises(ResourceInvalidError, fs.getpropertysets, 'foo')
+
+    def test_corrupt(self):
+        import io
+        from fs.errors import ResourceInvalidError
+        from .corpus import write_container
+        from ..fs import OleFileFS
+        f = io.BytesIO()
+        write_container(f, {'\x05SummaryInformation': property_set_stream([
+            (2, struct.pack('<HHI', 0x100C, 0, 1) * 5000),
+        ])})
+        with OleFileFS(f) as fs:
+            self.assertRaises(ResourceInvalidError, fs.getpropertysets,
+                              '\x05SummaryInformation')
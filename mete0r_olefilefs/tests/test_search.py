@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+#
+#   mete0r.olefilefs : PyFilesystem interface to olefile
+#   Copyright (C) 2015 mete0r <mete0r@sarangbang.or.kr>
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU Lesser General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU Lesser General Public License for more details.
+#
+#   You should have received a copy of the GNU Lesser General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+from unittest import TestCase
+import os.path
+
+
+FILES_DIR = os.path.join(os.path.dirname(__file__), 'files')
+EXAMPLE_STG_PATH = os.path.join(FILES_DIR, 'example.stg')
+
+
+def find_all(data, patterns):
+    return sorted((offset, index)
+                  for index, pattern in enumerate(patterns)
+                  for offset in range(len(data))
+                  if data.startswith(pattern, offset))
+
+
+class MatcherTest(TestCase):
+
+    def feed_chunks(self, matcher, data, chunk_size):
+        matcher.reset()
+        hits = []
+        for offset in range(0, len(data), chunk_size):
+            hits.extend(matcher.feed(memoryview(data)[offset:
+                                                       offset + chunk_size]))
+        return hits
+
+    def test_feed(self):
+        from ..search import Matcher
+        patterns = [b'abc', b'bca', b'aa', b'a', b'c.a']
+        data = b'aabcabcaac.abcc.a' * 3
+        matcher = Matcher(patterns)
+        expected = find_all(data, patterns)
+        for chunk_size in 1, 2, 3, 5, 7, len(data):
+            self.assertEquals(sorted(self.feed_chunks(matcher, data,
+                                                      chunk_size)),
+                              expected)
+
+    def test_invalid(self):
+        from ..search import Matcher
+        self.assertRaises(ValueError, Matcher, [])
+        self.assertRaises(ValueError, Matcher, [b'a', b''])
+
+
+class SearchTest(TestCase):
+
+    def test_search(self):
+        from ..fs import OleFileFS
+        with OleFileFS(EXAMPLE_STG_PATH) as fs:
+            contents = dict((path, fs.getcontents(path))
+                            for path in fs.walkfiles())
+            patterns = [contents['/foo/foofile1'][3:8], b'\0\0']
+            expected = sorted(
+                (path, offset, patterns[index])
+                for path, data in contents.items()
+                for offset, index in find_all(data, patterns))
+            self.assertEquals(sorted(fs.search(patterns, chunk_size=4)),
+                              expected)
+            hits = list(fs.search([patterns[0]], ['/foo/foofile1']))
+            self.assertEquals(hits, [('/foo/foofile1', 3, patterns[0])])
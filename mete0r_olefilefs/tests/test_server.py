@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+#
+#   mete0r.olefilefs : PyFilesystem interface to olefile
+#   Copyright (C) 2015 mete0r <mete0r@sarangbang.or.kr>
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU Lesser General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU Lesser General Public License for more details.
+#
+#   You should have received a copy of the GNU Lesser General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+from unittest import TestCase
+import json
+import os.path
+import threading
+
+try:
+    from http.client import HTTPConnection
+except ImportError:  # Python 2
+    from httplib import HTTPConnection
+
+
+FILES_DIR = os.path.join(os.path.dirname(__file__), 'files')
+TEST_XLS_PATH = os.path.join(FILES_DIR, 'test.xls')
+EXAMPLE_STG_PATH = os.path.join(FILES_DIR, 'example.stg')
+
+
+class ContainerServerTest(TestCase):
+
+    use_sendfile = True
+
+    def setUp(self):
+        from ..server import ContainerServer
+        self.server = ContainerServer(('127.0.0.1', 0), {
+            'example.stg': EXAMPLE_STG_PATH,
+            'docs/test.xls': TEST_XLS_PATH,
+        }, use_sendfile=self.use_sendfile)
+        self.thread = threading.Thread(target=self.server.serve_forever,
+                                       kwargs={'poll_interval': 0.01})
+        self.thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+    def request(self, method, path, headers=None):
+        connection = HTTPConnection(*self.server.server_address[:2])
+        try:
+            connection.request(method, path, headers=headers or {})
+            response = connection.getresponse()
+            # header names, lower-cased as by httplib of Python 2
+            headers = dict((name.lower(), value)
+                           for name, value in response.getheaders())
+            return response.status, headers, response.read()
+        finally:
+            connection.close()
+
+    def test_list_containers(self):
+        status, headers, body = self.request('GET', '/')
+        self.assertEquals(status, 200)
+        listing = json.loads(body.decode('utf-8'))
+        self.assertEquals([item['name'] for item in listing],
+                          ['docs/test.xls', 'example.stg'])
+        self.assertEquals(listing[1]['size'],
+                          os.path.getsize(EXAMPLE_STG_PATH))
+
+    def test_list_storage(self):
+        from ..fs import OleFileFS
+        status, headers, body = self.request('GET', '/example.stg/foo')
+        self.assertEquals(status, 200)
+        self.assertEquals(headers['content-type'], 'application/json')
+        listing = json.loads(body.decode('utf-8'))
+        with OleFileFS(EXAMPLE_STG_PATH) as fs:
+            self.assertEquals(sorted(item['name'] for item in listing),
+                              sorted(fs.listdir('foo')))
+            self.assertTrue({'name': 'foofile1', 'type': 'stream',
+                             'size': fs.getsize('foo/foofile1')} in listing)
+        self.assertTrue({'name': 'bar', 'type': 'storage'} in listing)
+
+    def test_get(self):
+        from ..fs import OleFileFS
+        with OleFileFS(TEST_XLS_PATH) as fs:
+            expected = fs.getcontents('Workbook')
+        status, headers, body = self.request('GET', '/docs/test.xls/Workbook')
+        self.assertEquals(status, 200)
+        self.assertEquals(body, expected)
+        self.assertEquals(headers['accept-ranges'], 'bytes')
+        status, headers, body = self.request('HEAD',
+                                             '/docs/test.xls/Workbook')
+        self.assertEquals(status, 200)
+        self.assertEquals(headers['content-length'], str(len(expected)))
+        self.assertEquals(body, b'')
+
+    def test_range(self):
+        from ..fs import OleFileFS
+        with OleFileFS(TEST_XLS_PATH) as fs:
+            expected = fs.getcontents('Workbook')
+        size = len(expected)
+        for header, start, end in [('bytes=100-1099', 100, 1100),
+                                   ('bytes=1000-', 1000, size),
+                                   ('bytes=-10', size - 10, size),
+                                   ('bytes=0-99999999', 0, size)]:
+            status, headers, body = self.request(
+                'GET', '/docs/test.xls/Workbook', {'Range': header})
+            self.assertEquals(status, 206)
+            self.assertEquals(body, expected[start:end])
+            self.assertEquals(headers['content-range'], 'bytes %d-%d/%d' % (
+                start, end - 1, size))
+        status, headers, body = self.request(
+            'GET', '/docs/test.xls/Workbook', {'Range': 'bytes=%d-' % size})
+        self.assertEquals(status, 416)
+
+    def test_not_found(self):
+        for path in '/nonexists', '/example.stg/nonexists', \
+                '/example.stg/foo/foofile1/x':
+            status, headers, body = self.request('GET', path)
+            self.assertEquals(status, 404)
+
+    def test_quoted(self):
+        from ..fs import OleFileFS
+        with OleFileFS(TEST_XLS_PATH) as fs:
+            expected = fs.getcontents('\x05SummaryInformation')
+        status, headers, body = self.request(
+            'GET', '/docs/test.xls/%05SummaryInformation')
+        self.assertEquals(status, 200)
+        self.assertEquals(body, expected)
+
+
+class CopyingContainerServerTest(ContainerServerTest):
+
+    use_sendfile = False
+
+
+class ParseRangeTest(TestCase):
+
+    def test_parse_range(self):
+        from ..server import parse_range
+        self.assertEquals(parse_range(None, 100), None)
+        self.assertEquals(parse_range('bytes=0-9', 100), (0, 10))
+        self.assertEquals(parse_range('bytes=90-', 100), (90, 100))
+        self.assertEquals(parse_range('bytes=-20', 100), (80, 100))
+        self.assertEquals(parse_range('bytes=-200', 100), (0, 100))
+        self.assertEquals(parse_range('bytes=0-1,5-6', 100), None)
+        self.assertEquals(parse_range('bytes=9-1', 100), None)
+        self.assertEquals(parse_range('bytes=a-b', 100), None)
+        self.assertEquals(parse_range('items=0-1', 100), None)
+        self.assertRaises(ValueError, parse_range, 'bytes=100-', 100)
+        self.assertRaises(ValueError, parse_range, 'bytes=-0', 100)
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+#
+#   mete0r.olefilefs : PyFilesystem interface to olefile
+#   Copyright (C) 2015 mete0r <mete0r@sarangbang.or.kr>
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU Lesser General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU Lesser General Public License for more details.
+#
+#   You should have received a copy of the GNU Lesser General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+from unittest import TestCase
+import os
+import os.path
+import shutil
+import tempfile
+
+
+FILES_DIR = os.path.join(os.path.dirname(__file__), 'files')
+TEST_XLS_PATH = os.path.join(FILES_DIR, 'test.xls')
+EXAMPLE_STG_PATH = os.path.join(FILES_DIR, 'example.stg')
+
+
+class IndexCacheTest(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.index_cache = os.path.join(self.directory, 'index')
+        self.path = os.path.join(self.directory, 'example.stg')
+        shutil.copy(EXAMPLE_STG_PATH, self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def snapshot(self, fs):
+        return [(path, fs.getinfo(path), fs.getextents(path),
+                 fs.getcontents(path))
+                for path in fs.walkfiles()] + [
+                    (path, fs.getinfo(path)) for path in fs.walkdirs()]
+
+    def test_reopen(self):
+        from ..fs import OleFileFS
+        from ..sidecar import IndexedOleFile
+        from ..sidecar import index_path
+        with OleFileFS(self.path) as fs:
+            expected = self.snapshot(fs)
+        with OleFileFS(self.path, index_cache=self.index_cache) as fs:
+            self.assertFalse(isinstance(fs._olefile, IndexedOleFile))
+            self.assertEquals(self.snapshot(fs), expected)
+        self.assertTrue(os.path.exists(index_path(self.index_cache,
+                                                  self.path)))
+        for kwargs in {}, {'thread_safe': True}, {'lazy': True}, \
+                {'use_mmap': True}, {'ministream_cache_size': 0}:
+            with OleFileFS(self.path, index_cache=self.index_cache,
+                           **kwargs) as fs:
+                self.assertTrue(isinstance(fs._olefile, IndexedOleFile))
+                self.assertEquals(self.snapshot(fs), expected)
+
+    def test_reopen_reads_header_only(self):
+        from ..fs import OleFileFS
+        OleFileFS(TEST_XLS_PATH, index_cache=self.index_cache).close()
+        with OleFileFS(TEST_XLS_PATH, index_cache=self.index_cache,
+                       instrument=True) as fs:
+            # the header, and the first directory sector
+            self.assertEquals(fs.stats()['bytes_read'], 1024)
+            self.assertTrue(fs.getcontents('Workbook'))
+
+    def test_lazy_does_not_save(self):
+        from ..fs import OleFileFS
+        OleFileFS(self.path, index_cache=self.index_cache, lazy=True).close()
+        self.assertFalse(os.path.exists(self.index_cache))
+
+    def test_changed(self):
+        from ..fs import OleFileFS
+        from ..sidecar import IndexedOleFile
+        OleFileFS(self.path, index_cache=self.index_cache).close()
+        stat = os.stat(self.path)
+        os.utime(self.path, (stat.st_atime, stat.st_mtime + 10))
+        with OleFileFS(self.path, index_cache=self.index_cache) as fs:
+            self.assertFalse(isinstance(fs._olefile, IndexedOleFile))
+        with OleFileFS(self.path, index_cache=self.index_cache) as fs:
+            self.assertTrue(isinstance(fs._olefile, IndexedOleFile))
+
+    def test_changed_header(self):
+        from ..fs import OleFileFS
+        from ..sidecar import IndexedOleFile
+        OleFileFS(self.path, index_cache=self.index_cache).close()
+        stat = os.stat(self.path)
+        with open(self.path, 'r+b') as f:
+            f.seek(8)
+            f.write(b'\1')
+        os.utime(self.path, (stat.st_atime, stat.st_mtime))
+        with OleFileFS(self.path, index_cache=self.index_cache) as fs:
+            self.assertFalse(isinstance(fs._olefile, IndexedOleFile))
+
+    def test_corrupt(self):
+        from ..fs import OleFileFS
+        from ..sidecar import IndexedOleFile
+        from ..sidecar import index_path
+        with OleFileFS(self.path) as fs:
+            expected = self.snapshot(fs)
+        OleFileFS(self.path, index_cache=self.index_cache).close()
+        path = index_path(self.index_cache, self.path)
+        with open(path, 'rb') as f:
+            data = f.read()
+        with open(path, 'wb') as f:
+            f.write(data[:-5])
+        with OleFileFS(self.path, index_cache=self.index_cache) as fs:
+            self.assertFalse(isinstance(fs._olefile, IndexedOleFile))
+            self.assertEquals(self.snapshot(fs), expected)
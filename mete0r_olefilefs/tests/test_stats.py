@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+#
+#   mete0r.olefilefs : PyFilesystem interface to olefile
+#   Copyright (C) 2015 mete0r <mete0r@sarangbang.or.kr>
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU Lesser General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU Lesser General Public License for more details.
+#
+#   You should have received a copy of the GNU Lesser General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+from unittest import TestCase
+import io
+
+
+class StatsTest(TestCase):
+
+    def test_add(self):
+        from ..stats import Stats
+        parent = Stats()
+        counted = []
+        stats = Stats(parent, lambda name, value: counted.append((name,
+                                                                  value)))
+        stats.add('reads')
+        stats.add('bytes_read', 512)
+        stats.hit('path_cache', True)
+        stats.hit('path_cache', False)
+        self.assertEquals(stats.snapshot(), {
+            'reads': 1, 'bytes_read': 512,
+            'path_cache.hits': 1, 'path_cache.misses': 1,
+        })
+        self.assertEquals(parent.snapshot(), stats.snapshot())
+        self.assertEquals(counted[:2], [('reads', 1), ('bytes_read', 512)])
+        stats.reset()
+        self.assertEquals(stats.snapshot(), {})
+        self.assertEquals(parent.snapshot()['reads'], 1)
+
+    def test_counting_source(self):
+        from ..source import FileSource
+        from ..stats import CountingSource
+        from ..stats import Stats
+        stats = Stats()
+        source = CountingSource(FileSource(io.BytesIO(b'x' * 2048)), stats,
+                                512, syscalls=2, seeks=1)
+        self.assertEquals(len(source.readat(500, 100)), 100)
+        buf = bytearray(512)
+        self.assertEquals(source.readinto(1024, buf), 512)
+        self.assertEquals(b''.join(view.tobytes()
+                                   for view in source.views(2000, 100)),
+                          b'x' * 48)
+        self.assertEquals(stats.snapshot(), {
+            'reads': 3, 'bytes_read': 660, 'sectors_read': 4,
+            'syscalls': 6, 'seeks': 3,
+        })
+
+    def test_counting_file(self):
+        from ..stats import CountingFile
+        from ..stats import Stats
+        stats = Stats()
+        f = CountingFile(io.BytesIO(b'x' * 2048), stats)
+        f.seek(1000)
+        self.assertEquals(len(f.read(100)), 100)
+        self.assertEquals(f.tell(), 1100)
+        self.assertEquals(stats.snapshot(), {
+            'reads': 1, 'bytes_read': 100, 'sectors_read': 2,
+            'syscalls': 2, 'seeks': 1,
+        })
+
+    def test_sectors_spanned(self):
+        from ..stats import sectors_spanned
+        self.assertEquals(sectors_spanned(0, 0, 512), 0)
+        self.assertEquals(sectors_spanned(0, 512, 512), 1)
+        self.assertEquals(sectors_spanned(511, 2, 512), 2)
+        self.assertEquals(sectors_spanned(512, 1025, 512), 3)
+
+    def test_timed(self):
+        from ..stats import Stats
+        from ..stats import timed
+        from ..stats import timed_generator
+
+        class Timed(object):
+            _stats = None
+
+            @timed('get')
+            def get(self):
+                return 1
+
+            @timed_generator('items')
+            def items(self):
+                yield 1
+                yield 2
+
+        timed_object = Timed()
+        self.assertEquals(timed_object.get(), 1)
+        self.assertEquals(list(timed_object.items()), [1, 2])
+        timed_object._stats = Stats()
+        self.assertEquals(timed_object.get(), 1)
+        self.assertEquals(list(timed_object.items()), [1, 2])
+        stats = timed_object._stats.snapshot()
+        self.assertEquals(stats['calls.get'], 1)
+        self.assertEquals(stats['calls.items'], 1)
+        self.assertTrue(stats['time.get'] >= 0)
+        self.assertTrue(stats['time.items'] >= 0)
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+#
+#   mete0r.olefilefs : PyFilesystem interface to olefile
+#   Copyright (C) 2015 mete0r <mete0r@sarangbang.or.kr>
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU Lesser General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU Lesser General Public License for more details.
+#
+#   You should have received a copy of the GNU Lesser General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+from unittest import TestCase
+
+
+ENDOFCHAIN = 0xFFFFFFFE
+
+
+class BytesSource(object):
+
+    def __init__(self, data):
+        self.data = data
+        self.reads = []
+
+    def readat(self, offset, size):
+        self.reads.append((offset, size))
+        return self.data[offset:offset + size]
+
+    def readinto(self, offset, buffer):
+        data = self.readat(offset, len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def views(self, offset, size):
+        yield memoryview(self.readat(offset, size))
+
+
+class OleStreamTest(TestCase):
+
+    def _createOne(self, data, fat, start, sector_size):
+        from ..extents import chain_extents
+        from ..stream import ExtentSource
+        from ..stream import OleStream
+        source = BytesSource(data)
+        extents = chain_extents(fat, start, sector_size, len(data))
+        return OleStream(ExtentSource(source, extents), len(data)), source
+
+    def test_read(self):
+        stream, source = self._createOne(b'0123456789abcdef',
+                                         [1, 2, 3, ENDOFCHAIN], 0, 4)
+        self.assertEquals(stream.read(3), b'012')
+        self.assertEquals(stream.read(), b'3456789abcdef')
+        self.assertEquals(stream.read(), b'')
+        self.assertEquals(source.reads, [(0, 3), (3, 13)])
+
+    def test_read_touches_only_requested_sectors(self):
+        stream, source = self._createOne(b'0123456789abcdef',
+                                         [1, 2, 3, ENDOFCHAIN], 0, 4)
+        stream.seek(9)
+        self.assertEquals(stream.read(2), b'9a')
+        self.assertEquals(source.reads, [(9, 2)])
+
+    def test_seek(self):
+        stream, source = self._createOne(b'0123456789abcdef',
+                                         [1, 2, 3, ENDOFCHAIN], 0, 4)
+        self.assertEquals(stream.seek(-2, 2), 14)
+        self.assertEquals(stream.read(), b'ef')
+        self.assertEquals(stream.seek(-4, 1), 12)
+        self.assertEquals(stream.tell(), 12)
+        self.assertRaises(IOError, stream.seek, -1)
+
+    def test_readinto(self):
+        stream, source = self._createOne(b'0123456789abcdef',
+                                         [1, 3, ENDOFCHAIN, 2], 0, 4)
+        stream.seek(2)
+        buf = bytearray(8)
+        self.assertEquals(stream.readinto(buf), 8)
+        self.assertEquals(bytes(buf), b'234567cd')
+        self.assertEquals(source.reads, [(2, 6), (12, 2)])
+
+    def test_closed(self):
+        stream, source = self._createOne(b'0123456789abcdef',
+                                         [1, 2, 3, ENDOFCHAIN], 0, 4)
+        stream.close()
+        self.assertRaises(ValueError, stream.readinto, bytearray(4))
+        self.assertRaises(ValueError, stream.read, 4)
+        self.assertRaises(ValueError, list, stream.views())
+        self.assertEquals(source.reads, [])
+
+    def test_views(self):
+        stream, source = self._createOne(b'0123456789abcdef',
+                                         [1, 3, ENDOFCHAIN, 2], 0, 4)
+        stream.seek(2)
+        views = list(stream.views(12))
+        self.assertEquals([view.tobytes() for view in views], [
+            b'234567',
+            b'cdef',
+            b'89',
+        ])
+        self.assertEquals(stream.tell(), 14)
+        self.assertEquals(list(stream.views()), [b'ab'])
+        self.assertEquals(list(stream.views()), [])
+
+
+class CachedSourceTest(TestCase):
+
+    def _createOne(self, data, capacity, block_size):
+        import threading
+        from ..cache import LRUCache
+        from ..source import CachedSource
+        source = BytesSource(data)
+        cache = LRUCache(capacity, weigh=len)
+        return CachedSource(source, len(data), cache, block_size,
+                            threading.Lock()), source
+
+    def test_readat(self):
+        cached, source = self._createOne(b'0123456789abcdef', 16, 4)
+        self.assertEquals(cached.readat(2, 8), b'23456789')
+        self.assertEquals(source.reads, [(0, 4), (4, 4), (8, 4)])
+        self.assertEquals(cached.readat(4, 4), b'4567')
+        self.assertEquals(cached.readat(14, 10), b'ef')
+        self.assertEquals(source.reads, [(0, 4), (4, 4), (8, 4), (12, 4)])
+
+    def test_readinto(self):
+        cached, source = self._createOne(b'0123456789abcdef', 16, 16)
+        buffer = bytearray(6)
+        self.assertEquals(cached.readinto(7, buffer), 6)
+        self.assertEquals(bytes(buffer), b'789abc')
+        self.assertEquals(source.reads, [(0, 16)])
+
+    def test_evict(self):
+        cached, source = self._createOne(b'0123456789abcdef', 8, 4)
+        self.assertEquals(cached.readat(0, 16), b'0123456789abcdef')
+        self.assertEquals(cached.cache.weight, 8)
+        del source.reads[:]
+        self.assertEquals(cached.readat(0, 4), b'0123')
+        self.assertEquals(source.reads, [(0, 4)])
@@ -126,6 +126,7 @@ setup_info = {
     },
     'entry_points': {
         'console_scripts': [
+            'olefilefs = mete0r_olefilefs.cli:main',
         ],
     },
     'classifiers': [